@@ -0,0 +1,354 @@
+import calendar
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, bindparam, case, cast, delete, func, insert, literal, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from cache import invalidate
+from models import Result, StudentStat, SubjectStat, GradeStat, ResultRollup
+from snapshots import snapshot_stale, snapshot_removed, rebuild_snapshots
+from events import results_resync
+
+# Tolerance used when comparing maintained float sums with a fresh aggregate
+SUM_TOLERANCE = 1e-6
+
+# Primary key columns of each summary table
+KEY_COLUMNS = {
+    StudentStat: ('student_id',),
+    SubjectStat: ('subject_id',),
+    GradeStat: ('grade',),
+    ResultRollup: ('granularity', 'bucket', 'subject_id'),
+}
+
+def _apply_delta(model, key, count_delta, percentage_delta):
+    """Add deltas to the summary row with key (a tuple in KEY_COLUMNS order), creating it on first use"""
+    key = dict(zip(KEY_COLUMNS[model], key))
+    values = {
+        'result_count': model.result_count + count_delta,
+        'percentage_sum': model.percentage_sum + percentage_delta,
+    }
+    if model is StudentStat:
+        new_count = model.result_count + count_delta
+        values['avg_percentage'] = case(
+            (new_count > 0, (model.percentage_sum + percentage_delta) / new_count),
+            else_=0.0
+        )
+
+    updated = db.session.execute(
+        update(model).where(*(getattr(model, name) == value for name, value in key.items())).values(**values)
+    ).rowcount
+    if updated or count_delta <= 0:
+        return
+
+    row = {**key, 'result_count': count_delta, 'percentage_sum': percentage_delta}
+    if model is StudentStat:
+        row['avg_percentage'] = percentage_delta / count_delta
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**row))
+    except IntegrityError:
+        # Another writer created the row first; fall back to incrementing it
+        _apply_delta(model, tuple(key.values()), count_delta, percentage_delta)
+
+def _apply_deltas(model, deltas):
+    """_apply_delta for many keys of one summary table ({key: (count delta, percentage delta)}).
+
+    Existing rows are updated by one executemany UPDATE; rows that do not exist yet
+    are created one by one through _apply_delta.
+    """
+    names = KEY_COLUMNS[model]
+    key_columns = [getattr(model, name) for name in names]
+    new_keys = [key for key, (count_delta, _) in deltas.items() if count_delta > 0]
+    existing = set()
+    for start in range(0, len(new_keys), 500):
+        existing.update(tuple(row) for row in db.session.execute(
+            select(*key_columns).where(tuple_(*key_columns).in_(new_keys[start:start + 500]))
+        ))
+    missing = [key for key in new_keys if key not in existing]
+
+    table = model.__table__
+    values = {
+        'result_count': table.c.result_count + bindparam('count_delta'),
+        'percentage_sum': table.c.percentage_sum + bindparam('percentage_delta'),
+    }
+    if model is StudentStat:
+        new_count = table.c.result_count + bindparam('count_delta')
+        values['avg_percentage'] = case(
+            (new_count > 0, (table.c.percentage_sum + bindparam('percentage_delta')) / new_count),
+            else_=0.0
+        )
+    skip = set(missing)
+    params = [
+        {**{f'key_{name}': value for name, value in zip(names, key)},
+         'count_delta': count_delta, 'percentage_delta': percentage_delta}
+        for key, (count_delta, percentage_delta) in deltas.items() if key not in skip
+    ]
+    if params:
+        db.session.execute(
+            update(table).where(*(table.c[name] == bindparam(f'key_{name}') for name in names)).values(**values),
+            params
+        )
+    for key in missing:
+        _apply_delta(model, key, *deltas[key])
+
+def _rollup_keys(created_at, subject_id):
+    day = created_at.date()
+    return [('day', day, subject_id), ('month', day.replace(day=1), subject_id)]
+
+def record_result(result, sign=1):
+    """Add (sign=1) or remove (sign=-1) a result's contribution to the summary tables.
+
+    Call with sign=-1 before changing or deleting a result and with sign=1 after
+    creating or changing it, inside the same transaction as the write.
+    """
+    percentage = result.percentage * sign
+    if result.created_at is None:
+        # Set now rather than at flush so the rollup bucket matches the stored value
+        result.created_at = datetime.utcnow()
+    snapshot_stale(result.student_id)
+    _apply_delta(StudentStat, (result.student_id,), sign, percentage)
+    _apply_delta(SubjectStat, (result.subject_id,), sign, percentage)
+    if result.grade:
+        _apply_delta(GradeStat, (result.grade,), sign, percentage)
+    for key in _rollup_keys(result.created_at, result.subject_id):
+        _apply_delta(ResultRollup, key, sign, percentage)
+
+def record_results_bulk(rows, sign=1):
+    """Apply many results to the summary tables with one batched update per table.
+
+    rows are mappings with student_id, subject_id, grade, percentage and created_at.
+    """
+    deltas = {model: {} for model in KEY_COLUMNS}
+    for row in rows:
+        snapshot_stale(row['student_id'])
+        keys = [(StudentStat, (row['student_id'],)), (SubjectStat, (row['subject_id'],))]
+        if row['grade'] is not None:
+            keys.append((GradeStat, (row['grade'],)))
+        keys.extend((ResultRollup, key) for key in _rollup_keys(row['created_at'], row['subject_id']))
+        for model, key in keys:
+            count, percentage_sum = deltas[model].get(key, (0, 0.0))
+            deltas[model][key] = (count + sign, percentage_sum + row['percentage'] * sign)
+
+    for model, by_key in deltas.items():
+        _apply_deltas(model, by_key)
+
+def record_results_where(*conditions, sign=1):
+    """Add (sign=1) or remove (sign=-1) the contribution of every result matching conditions.
+
+    Grouped queries give one delta per summary row, applied with one batched update
+    per table, so bulk updates and deletes never touch the summary tables per result. Call with sign=-1 before
+    the bulk write and, for updates, with sign=1 after it.
+    """
+    for model, query in _fresh_aggregates(*conditions).items():
+        width = len(KEY_COLUMNS[model])
+        deltas = {}
+        for row in db.session.execute(query).all():
+            key = tuple(row[:width])
+            if model is ResultRollup and isinstance(key[1], str):
+                # SQLite returns computed buckets as text
+                key = (key[0], date.fromisoformat(key[1]), key[2])
+            deltas[key] = (sign * row[width], sign * row[width + 1])
+        _apply_deltas(model, deltas)
+
+def forget_student(student_id):
+    """Remove every result of a student from the summary tables before the student is deleted"""
+    record_results_where(Result.student_id == student_id, sign=-1)
+    db.session.execute(delete(StudentStat).where(StudentStat.student_id == student_id))
+    snapshot_removed(student_id)
+    results_resync()
+
+def _bucket_expression(granularity):
+    """SQL for the first day of the UTC day or month of Result.created_at"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return cast(func.date_trunc(granularity, Result.created_at), Date)
+    if dialect == 'sqlite':
+        if granularity == 'month':
+            return func.date(Result.created_at, 'start of month')
+        return func.date(Result.created_at)
+    if dialect in ('mysql', 'mariadb'):
+        if granularity == 'month':
+            return cast(func.date_format(Result.created_at, '%Y-%m-01'), Date)
+        return func.date(Result.created_at)
+    raise ValueError(f'result rollups do not support {dialect} yet')
+
+def _fresh_rollups(count, percentage_sum, *conditions):
+    selects = []
+    for granularity in ('day', 'month'):
+        bucket = _bucket_expression(granularity)
+        selects.append(
+            select(literal(granularity), bucket, Result.subject_id, count, percentage_sum)
+            .where(*conditions)
+            .group_by(bucket, Result.subject_id)
+        )
+    return union_all(*selects)
+
+def _fresh_aggregates(*conditions):
+    """Aggregate queries computing the summary tables from the results (matching conditions)"""
+    count = func.count(Result.id)
+    percentage_sum = func.coalesce(func.sum(Result.percentage), 0.0)
+    return {
+        StudentStat: select(Result.student_id, count, percentage_sum, percentage_sum / count)
+            .where(*conditions)
+            .group_by(Result.student_id),
+        SubjectStat: select(Result.subject_id, count, percentage_sum)
+            .where(*conditions)
+            .group_by(Result.subject_id),
+        GradeStat: select(Result.grade, count, percentage_sum)
+            .where(Result.grade.isnot(None), *conditions)
+            .group_by(Result.grade),
+        ResultRollup: _fresh_rollups(count, percentage_sum, *conditions),
+    }
+
+SUMMARY_COLUMNS = {
+    StudentStat: ['student_id', 'result_count', 'percentage_sum', 'avg_percentage'],
+    SubjectStat: ['subject_id', 'result_count', 'percentage_sum'],
+    GradeStat: ['grade', 'result_count', 'percentage_sum'],
+    ResultRollup: ['granularity', 'bucket', 'subject_id', 'result_count', 'percentage_sum'],
+}
+
+def _rebuild_tables(models):
+    aggregates = _fresh_aggregates()
+    for model in models:
+        db.session.execute(delete(model))
+        db.session.execute(insert(model).from_select(SUMMARY_COLUMNS[model], aggregates[model]))
+
+def rebuild_stats():
+    """Recompute all summary tables and student snapshots from scratch in a single transaction"""
+    _rebuild_tables(SUMMARY_COLUMNS)
+    rebuild_snapshots()
+    results_resync()
+    db.session.commit()
+    invalidate('reports')
+
+def rebuild_grade_stats():
+    """Recompute the per-grade summary rows after grades were changed in bulk; the caller commits"""
+    _rebuild_tables([GradeStat])
+
+def check_stats():
+    """Compare the summary tables with a fresh aggregate and return a list of mismatches"""
+    problems = []
+    for model, query in _fresh_aggregates().items():
+        width = len(KEY_COLUMNS[model])
+        # Compare keys as text: SQLite returns fresh date buckets as strings
+        expected = {
+            ', '.join(map(str, row[:width])): (row[width], row[width + 1]) for row in db.session.execute(query)
+        }
+        stored = {
+            ', '.join(map(str, row[:width])): (row[width], row[width + 1])
+            for row in db.session.execute(
+                select(*(getattr(model, name) for name in KEY_COLUMNS[model]), model.result_count,
+                       model.percentage_sum)
+                .where(model.result_count != 0)
+            )
+        }
+        for key in expected.keys() | stored.keys():
+            want_count, want_sum = expected.get(key, (0, 0.0))
+            have_count, have_sum = stored.get(key, (0, 0.0))
+            if want_count != have_count or abs(want_sum - have_sum) > SUM_TOLERANCE * max(1.0, abs(want_sum)):
+                problems.append(
+                    f"{model.__tablename__}[{key}]: stored count={have_count} sum={have_sum:.4f}, "
+                    f"expected count={want_count} sum={want_sum:.4f}"
+                )
+    return problems
+
+def get_summary_totals():
+    """Global result count and average percentage from the grade summary rows"""
+    total_results, percentage_sum = db.session.execute(
+        select(func.coalesce(func.sum(GradeStat.result_count), 0),
+               func.coalesce(func.sum(GradeStat.percentage_sum), 0.0))
+    ).one()
+    avg_percentage = percentage_sum / total_results if total_results else 0
+    return total_results, avg_percentage
+
+# Granularities offered by results_timeseries and the stored rollup each is read from
+TIMESERIES_GRANULARITIES = {'day': 'day', 'week': 'day', 'month': 'month', 'year': 'month'}
+# Periods returned when no start is given, and the most allowed so a response stays small
+DEFAULT_TIMESERIES_PERIODS = {'day': 30, 'week': 12, 'month': 12, 'year': 5}
+MAX_TIMESERIES_BUCKETS = 1000
+
+def _period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+def _next_period(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return date(start.year + 1, 1, 1)
+
+def _periods_back(end, granularity, count):
+    """Start of the period count - 1 periods before the one containing end"""
+    start = _period_start(end, granularity)
+    if granularity == 'day':
+        return start - timedelta(days=count - 1)
+    if granularity == 'week':
+        return start - timedelta(weeks=count - 1)
+    if granularity == 'month':
+        months = start.year * 12 + start.month - count
+        return date(months // 12, months % 12 + 1, 1)
+    return date(start.year - count + 1, 1, 1)
+
+def _period_label(start, granularity):
+    if granularity == 'month':
+        return f'{calendar.month_abbr[start.month]} {start.year}'
+    if granularity == 'year':
+        return str(start.year)
+    if granularity == 'week':
+        return f'Week of {calendar.month_abbr[start.month]} {start.day}, {start.year}'
+    return start.isoformat()
+
+def results_timeseries(start, end, granularity='month', subject_id=None):
+    """Result count and average percentage per period from start to end (dates, inclusive).
+
+    Without start, the DEFAULT_TIMESERIES_PERIODS periods up to end are returned.
+
+    Reads only the rollup rows inside the window, so the cost does not grow with
+    the results table. Periods are UTC calendar days, ISO weeks starting Monday,
+    months or years; start is widened to the beginning of its period and month
+    and year periods always cover whole months. Periods without results are
+    included with a count of 0.
+    """
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(TIMESERIES_GRANULARITIES)}')
+    if start is None:
+        start = _periods_back(end, granularity, DEFAULT_TIMESERIES_PERIODS[granularity])
+    if start > end:
+        raise ValueError('start must not be after end')
+    first = _period_start(start, granularity)
+    periods = [first]
+    while _next_period(periods[-1], granularity) <= end:
+        periods.append(_next_period(periods[-1], granularity))
+        if len(periods) > MAX_TIMESERIES_BUCKETS:
+            raise ValueError(f'at most {MAX_TIMESERIES_BUCKETS} {granularity} periods per request')
+
+    query = (
+        select(ResultRollup.bucket, func.sum(ResultRollup.result_count), func.sum(ResultRollup.percentage_sum))
+        .where(ResultRollup.granularity == TIMESERIES_GRANULARITIES[granularity],
+               ResultRollup.bucket.between(first, end))
+        .group_by(ResultRollup.bucket)
+    )
+    if subject_id is not None:
+        query = query.where(ResultRollup.subject_id == subject_id)
+
+    totals = {period: [0, 0.0] for period in periods}
+    for bucket, count, percentage_sum in db.session.execute(query):
+        total = totals[_period_start(bucket, granularity)]
+        total[0] += count
+        total[1] += percentage_sum
+    return [
+        {
+            'start': period.isoformat(),
+            'label': _period_label(period, granularity),
+            'count': count,
+            'avg_percentage': round(percentage_sum / count, 2) if count else None,
+        }
+        for period, (count, percentage_sum) in totals.items()
+    ]
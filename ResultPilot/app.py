@@ -5,6 +5,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from engine_profiles import engine_options as get_engine_options, apply_sqlite_pragmas, replica_binds
+from replicas import RoutingSession, init_replicas
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,7 +15,7 @@ class Base(DeclarativeBase):
     pass
 
 # Initialize extensions
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 def create_app():
@@ -26,47 +28,82 @@ def create_app():
     
     # Database configuration
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
+    # Engine and pool tuning profile (see engine_profiles.py); DB_POOL_* variables override single settings
+    app.config["DB_PROFILE"] = os.environ.get("DB_PROFILE", "default")
+    engine_options, sqlite_pragmas = get_engine_options(app.config["DB_PROFILE"], app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     
+    # Read replicas (comma-separated URLs) serving read-only views and reports, checked every
+    # REPLICA_HEALTH_INTERVAL seconds; replicas further behind than REPLICA_MAX_LAG seconds are
+    # skipped, and for that long after a write the writer keeps reading from the primary
+    replica_urls = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(app.config["DB_PROFILE"], replica_urls)
+    app.config["REPLICA_HEALTH_INTERVAL"] = float(os.environ.get("REPLICA_HEALTH_INTERVAL", 10))
+    app.config["REPLICA_MAX_LAG"] = float(os.environ.get("REPLICA_MAX_LAG", 5))
+    
+    # Rows inserted per transaction by the bulk result import
+    app.config["IMPORT_CHUNK_SIZE"] = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))
+    # Results or students changed per UPDATE/DELETE (and transaction) by bulk edits
+    app.config["BULK_CHUNK_SIZE"] = int(os.environ.get("BULK_CHUNK_SIZE", 1000))
+    
+    # Report cache: in-process LRU unless CACHE_URL points at a Redis-compatible server
+    app.config["CACHE_URL"] = os.environ.get("CACHE_URL", "")
+    app.config["CACHE_TTL"] = int(os.environ.get("CACHE_TTL", 300))
+    # Seconds a logged-in user's identity is reused by a worker without a shared cache, i.e. how
+    # long other workers may still see a deleted or demoted user (0 loads it on every request)
+    app.config["IDENTITY_CACHE_TTL"] = int(os.environ.get("IDENTITY_CACHE_TTL", 5))
+    
+    # Requests slower than this are logged with their SQL statements (0 disables)
+    app.config["SLOW_REQUEST_MS"] = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+    # /metrics answers requests with this bearer token or from these comma-separated client
+    # addresses (none by default: behind a same-host proxy every client looks local)
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN", "")
+    app.config["METRICS_ALLOWED_IPS"] = [
+        ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()
+    ]
+    
+    # Live dashboard events: in-process pub/sub unless EVENTS_URL points at a Redis-compatible server
+    app.config["EVENTS_URL"] = os.environ.get("EVENTS_URL", "")
+    
+    # Above this many students the result form searches for a student instead of listing them all
+    app.config["STUDENT_SELECT_LIMIT"] = int(os.environ.get("STUDENT_SELECT_LIMIT", 500))
+    
+    # Report card jobs: output directory and rendering processes per job
+    app.config["REPORT_DIR"] = os.environ.get("REPORT_DIR", os.path.join(app.instance_path, "report_cards"))
+    app.config["REPORT_WORKERS"] = int(os.environ.get("REPORT_WORKERS", os.cpu_count() or 1))
+    
+    # Columnar results snapshot for interactive reports: directory and seconds before a background refresh
+    app.config["ANALYTICS_DIR"] = os.environ.get("ANALYTICS_DIR", os.path.join(app.instance_path, "analytics"))
+    app.config["ANALYTICS_MAX_AGE"] = float(os.environ.get("ANALYTICS_MAX_AGE", 60))
+    
+    # Password hashing for new and upgraded hashes: a werkzeug method such as "scrypt",
+    # "scrypt:16384:8:1" or "pbkdf2:sha256:600000"; older hashes are rehashed at login
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_SALT_LENGTH"] = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            apply_sqlite_pragmas(engine, sqlite_pragmas)
+        init_replicas(app, db.engines)
     login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
+    login_manager.login_view = 'login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    from instrumentation import init_instrumentation
+    from cache import init_cache
+    from events import init_events
+    init_instrumentation(app)
+    init_cache(app)
+    init_events(app)
+    
     @login_manager.user_loader
     def load_user(user_id):
-        from models import User
-        return User.query.get(int(user_id))
-    
-    # Create tables
-    with app.app_context():
-        import models
-        db.create_all()
-        logging.info("Database tables created")
-        
-        # Create default admin user if not exists
-        from models import User
-        from werkzeug.security import generate_password_hash
-        
-        admin = User.query.filter_by(email='admin@example.com').first()
-        if not admin:
-            admin = User(
-                username='admin',
-                email='admin@example.com',
-                password_hash=generate_password_hash('admin123'),
-                role='admin',
-                first_name='System',
-                last_name='Administrator'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            logging.info("Default admin user created: admin@example.com / admin123")
+        from auth import load_identity
+        return load_identity(int(user_id))
     
     return app
 
@@ -0,0 +1,96 @@
+from functools import lru_cache
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import select
+from werkzeug.security import check_password_hash, generate_password_hash
+from app import db
+from cache import get_or_set, invalidate, is_shared
+from models import User
+
+# Columns loaded for the logged-in user on every request; pages that edit the
+# profile load the full row themselves
+IDENTITY_COLUMNS = (User.id, User.username, User.email, User.role, User.first_name, User.last_name, User.student_id)
+
+def _namespace(user_id):
+    return f'user:{user_id}'
+
+class Identity(UserMixin):
+    """The logged-in user as seen by login_required, admin_required and the templates"""
+
+    def __init__(self, id, username, email, role, first_name, last_name, student_id):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.first_name = first_name
+        self.last_name = last_name
+        self.student_id = student_id
+
+    def __repr__(self):
+        return f'<Identity {self.username}>'
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def is_student(self):
+        return self.role == 'student'
+
+def _identity_row(user_id):
+    row = db.session.execute(select(*IDENTITY_COLUMNS).where(User.id == user_id)).first()
+    return dict(row._mapping) if row is not None else None
+
+def _identity_ttl():
+    # identity_changed only reaches other workers through a shared cache; with the
+    # per-process cache a role change or deletion takes effect there once this expires
+    return None if is_shared() else current_app.config['IDENTITY_CACHE_TTL']
+
+def load_identity(user_id):
+    """Identity of a user id from the session; None if the user is gone.
+
+    Cached until identity_changed with a shared cache, and for at most
+    IDENTITY_CACHE_TTL seconds (0: not cached) with the per-process one.
+    """
+    ttl = _identity_ttl()
+    if ttl == 0:
+        data = _identity_row(user_id)
+    else:
+        data = get_or_set(_namespace(user_id), 'identity', lambda: _identity_row(user_id), ttl)
+    if data is None:
+        # Drop the cached miss, so an id (re)used by a new account is found at once
+        invalidate(_namespace(user_id))
+        return None
+    return Identity(**data)
+
+def identity_changed(user_id):
+    """Forget the cached identity after a user's name, email, role or student ID changes, or on deletion"""
+    invalidate(_namespace(user_id))
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method, salt_length):
+    # Werkzeug expands short methods ('scrypt') to their full parameters ('scrypt:32768:8:1')
+    expanded, salt, _ = generate_password_hash('', method, salt_length).split('$', 2)
+    return expanded, len(salt)
+
+def hash_password(password):
+    """Hash a password with the configured PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH"""
+    return generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD'],
+                                  current_app.config['PASSWORD_SALT_LENGTH'])
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with a different method, cost or salt length than configured"""
+    method, salt, _ = (password_hash.split('$', 2) + ['', ''])[:3]
+    return (method, len(salt)) != _hash_prefix(current_app.config['PASSWORD_HASH_METHOD'],
+                                               current_app.config['PASSWORD_SALT_LENGTH'])
+
+def verify_password(user, password):
+    """Check a login password and upgrade the stored hash to the current policy when it matches"""
+    if not check_password_hash(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+        db.session.commit()
+    return True
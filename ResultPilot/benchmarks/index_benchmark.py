@@ -0,0 +1,149 @@
+"""Benchmark the results table indexes on a seeded database.
+
+Seeds users, subjects and results, then runs the queries behind add_result,
+admin_results, student_dashboard and the grade chart twice: once with the
+results indexes dropped and once after creating them, printing the query plan
+and median latency for each.
+
+Usage:
+    python benchmarks/index_benchmark.py [--rows 1000000] [--database-url URL]
+
+Without --database-url a temporary SQLite file is used. Point it at an empty
+scratch database only: the results, users and subjects tables are filled.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEMESTERS = ['Fall', 'Spring', 'Summer', 'Winter']
+EXAM_TYPES = ['Final', 'Mid-term', 'Quiz', 'Assignment', 'Project']
+GRADE_LADDER = [(90, 'A+'), (80, 'A'), (70, 'B+'), (60, 'B'), (50, 'C+'), (40, 'C'), (0, 'F')]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='results to seed')
+    parser.add_argument('--students', type=int, default=20_000)
+    parser.add_argument('--subjects', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20, help='runs per query')
+    parser.add_argument('--database-url', help='scratch database to use instead of a temporary SQLite file')
+    return parser.parse_args()
+
+def seed(db, args):
+    from sqlalchemy import insert
+    from models import User, Subject, Result
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password_hash': '-',
+         'role': 'student', 'first_name': f'First{i}', 'last_name': f'Last{i}',
+         'student_id': f'BEN{i:07d}', 'created_at': now, 'updated_at': now}
+        for i in range(args.students)
+    ])
+    db.session.execute(insert(Subject), [
+        {'name': f'Subject {i}', 'code': f'SUB{i:04d}', 'credits': rng.randint(1, 5), 'created_at': now}
+        for i in range(args.subjects)
+    ])
+    student_ids = [row[0] for row in db.session.execute(db.select(User.id).where(User.role == 'student'))]
+    subject_ids = [row[0] for row in db.session.execute(db.select(Subject.id))]
+
+    # Walk students fastest so every (student, subject, semester, exam type) key is unique
+    batch = []
+    for i in range(args.rows):
+        k = i // len(student_ids)
+        marks = min(100.0, max(0.0, rng.gauss(65, 15)))
+        batch.append({
+            'student_id': student_ids[i % len(student_ids)],
+            'subject_id': subject_ids[k % len(subject_ids)],
+            'marks_obtained': marks,
+            'total_marks': 100.0,
+            'grade': next(grade for bound, grade in GRADE_LADDER if marks >= bound),
+            'semester': SEMESTERS[(k // len(subject_ids)) % len(SEMESTERS)],
+            'academic_year': '2025',
+            'exam_type': EXAM_TYPES[(k // (len(subject_ids) * len(SEMESTERS))) % len(EXAM_TYPES)],
+            'created_at': now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+        })
+        if len(batch) == 10_000:
+            db.session.execute(insert(Result), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Result), batch)
+    db.session.commit()
+    return student_ids, subject_ids
+
+def benchmark_queries(db, student_ids, subject_ids):
+    from sqlalchemy import func, select
+    from models import Result
+
+    student_id = student_ids[len(student_ids) // 2]
+    return {
+        'add_result duplicate check': select(Result.id).where(
+            Result.student_id == student_id, Result.subject_id == subject_ids[0],
+            Result.semester == 'Fall', Result.exam_type == 'Final'),
+        'admin_results semester page': select(Result.id).where(Result.semester == 'Spring')
+            .order_by(Result.created_at.desc()).limit(15),
+        'admin_results latest page': select(Result.id).order_by(Result.created_at.desc()).limit(15),
+        'student_dashboard history': select(Result.id).where(Result.student_id == student_id)
+            .order_by(Result.created_at.desc()),
+        'grade count': select(func.count(Result.id)).where(Result.grade == 'A+'),
+    }
+
+def explain(db, query):
+    from sqlalchemy import text
+    compiled = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN'
+    rows = db.session.execute(text(f'{prefix} {compiled}')).all()
+    return [str(row[-1]) for row in rows]
+
+def run(db, queries, repeat, label):
+    print(f'\n== {label} ==')
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.session.execute(query).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f'{name:32s} median {statistics.median(timings):9.3f} ms')
+        for line in explain(db, query):
+            print(f'    {line}')
+
+def main():
+    args = parse_args()
+    if not args.database_url:
+        args.database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+
+    from app import app, db
+    from models import Result
+    from schema import init_db
+
+    with app.app_context():
+        init_db()
+        start = time.perf_counter()
+        student_ids, subject_ids = seed(db, args)
+        print(f'Seeded {args.rows} results in {time.perf_counter() - start:.1f} s ({args.database_url})')
+
+        indexes = list(Result.__table__.indexes)
+        for index in indexes:
+            index.drop(db.engine)
+        db.session.execute(db.text('ANALYZE'))
+        queries = benchmark_queries(db, student_ids, subject_ids)
+        run(db, queries, args.repeat, 'without indexes')
+
+        start = time.perf_counter()
+        for index in indexes:
+            index.create(db.engine)
+        db.session.execute(db.text('ANALYZE'))
+        print(f'\nCreated {len(indexes)} indexes in {time.perf_counter() - start:.1f} s')
+        run(db, queries, args.repeat, 'with indexes')
+
+if __name__ == '__main__':
+    main()
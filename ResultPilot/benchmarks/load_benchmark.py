@@ -0,0 +1,305 @@
+"""Load test the key pages and chart APIs over HTTP and save the results for comparison.
+
+Drives admin_dashboard, admin_results (first page, a later page and a search),
+student_dashboard and the /api/* chart routes with concurrent logged-in
+clients, one scenario at a time. For each it reports throughput, p50/p95/p99
+latency and the SQL statements per request, read from the server's /metrics.
+
+Usage:
+    python benchmarks/load_benchmark.py [--duration 10] [--concurrency 8] [--students 2000]
+                                        [--save results.json] [--compare baseline.json]
+    python benchmarks/load_benchmark.py --url http://localhost:5000 ...
+
+Without --url the app is served in this process by a threaded development
+server on a temporary SQLite database seeded with 'flask seed-synthetic'
+data (or --database-url, which must be empty or already seeded). With --url
+the target must already hold synthetic students with --prefix and the default
+admin account. The in-process server shares the interpreter with the load
+generator, so use --url against gunicorn for absolute numbers and the
+in-process mode for before/after comparisons. Queries per request are exact
+for a single server process; behind several gunicorn workers they come from
+whichever worker serves /metrics.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+ADMIN_EMAIL = 'admin@example.com'
+ADMIN_PASSWORD = 'admin123'
+STUDENT_PASSWORD = 'student123'
+
+# (name, role, path); paths with {next_cursor} or {semester} are filled in once before the run
+SCENARIOS = [
+    ('admin_dashboard', 'admin', '/admin/dashboard'),
+    ('admin_results', 'admin', '/admin/results'),
+    ('admin_results_page', 'admin', '/admin/results?after={next_cursor}'),
+    ('admin_results_search', 'admin', '/admin/results?search=Patel&semester={semester}'),
+    ('student_dashboard', 'student', '/student/dashboard'),
+    ('api_dashboard_stats', 'admin', '/api/dashboard-stats'),
+    ('api_grade_distribution', 'admin', '/api/grade-distribution'),
+    ('api_subject_performance', 'admin', '/api/subject-performance'),
+    ('api_monthly_results', 'admin', '/api/monthly-results'),
+]
+
+QUERIES_METRIC = re.compile(r'^srms_request_queries_(sum|count)\{endpoint="([^"]+)"\} (\S+)$', re.MULTILINE)
+CSRF_FIELD = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='running server to test instead of an in-process one')
+    parser.add_argument('--database-url', help='database for the in-process server (default: temporary SQLite)')
+    parser.add_argument('--students', type=int, default=2000, help='synthetic students to seed')
+    parser.add_argument('--subjects', type=int, default=40, help='synthetic subjects to seed')
+    parser.add_argument('--semesters', type=int, default=4, help='terms of synthetic history to seed')
+    parser.add_argument('--prefix', default='synth', help='prefix of the synthetic students to log in as')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients per scenario')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds measured per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per client first')
+    parser.add_argument('--scenario', action='append', help='run only these scenarios (repeatable)')
+    parser.add_argument('--metrics-token', default=os.environ.get('METRICS_TOKEN'),
+                        help="the server's METRICS_TOKEN, sent to read /metrics (default: $METRICS_TOKEN)")
+    parser.add_argument('--save', help='write the results as JSON to this path')
+    parser.add_argument('--compare', help='earlier --save output to compare against')
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help='percent slower p95 or lower throughput reported as a regression')
+    return parser.parse_args()
+
+class Client:
+    """One logged-in browser session"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def get(self, path):
+        with self.opener.open(self.base_url + path, timeout=60) as response:
+            return response.status, response.read()
+
+    def login(self, email, password):
+        _, body = self.get('/login')
+        form = {'email': email, 'password': password}
+        token = CSRF_FIELD.search(body.decode())
+        if token:
+            form['csrf_token'] = token.group(1)
+        data = urllib.parse.urlencode(form).encode()
+        with self.opener.open(self.base_url + '/login', data=data, timeout=60) as response:
+            if urllib.parse.urlparse(response.geturl()).path == '/login':
+                raise SystemExit(f'could not log in as {email}')
+        return self
+
+def start_local_server(args):
+    """Seed a database if needed and serve the app from a background thread; returns its URL"""
+    if not args.database_url:
+        args.database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+    env = dict(os.environ, DATABASE_URL=args.database_url)
+    env.setdefault('SESSION_SECRET', 'benchmark')
+    env.setdefault('SLOW_REQUEST_MS', '0')
+    # The in-process server requires the same token the load generator sends
+    env['METRICS_TOKEN'] = args.metrics_token
+    seed = subprocess.run(
+        [sys.executable, '-c',
+         'import logging, sys; logging.disable(logging.CRITICAL)\n'
+         'from main import app\nfrom schema import init_db, seed_admin\nfrom synthetic import seed_synthetic\n'
+         'with app.app_context():\n'
+         '    init_db(); seed_admin()\n'
+         '    try:\n'
+         f'        print(seed_synthetic({args.students}, {args.subjects}, {args.semesters}, prefix={args.prefix!r}))\n'
+         '    except ValueError as e:\n'
+         '        print(e)'],
+        cwd=APP_DIR, env=env, check=True, capture_output=True, text=True
+    )
+    print(f'Database {args.database_url}: {seed.stdout.strip()}')
+
+    os.environ.update(env)
+    import logging
+    logging.disable(logging.CRITICAL)
+    from werkzeug.serving import make_server
+    from main import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+def queries_by_endpoint(base_url, metrics_token):
+    request = urllib.request.Request(base_url + '/metrics')
+    if metrics_token:
+        request.add_header('Authorization', f'Bearer {metrics_token}')
+    with urllib.request.urlopen(request, timeout=60) as response:
+        text = response.read().decode()
+    totals = {}
+    for kind, endpoint, value in QUERIES_METRIC.findall(text):
+        totals.setdefault(endpoint, {'sum': 0.0, 'count': 0.0})[kind] = float(value)
+    return totals
+
+def scenario_endpoint(path):
+    # The Flask endpoint of a path is its function name, e.g. /api/grade-distribution -> api_grade_distribution
+    parts = urllib.parse.urlparse(path).path.strip('/').split('/')
+    return '_'.join(part.replace('-', '_') for part in parts)
+
+def fill_paths(base_url, admin):
+    _, body = admin.get('/api/results')
+    page = json.loads(body)
+    semesters = sorted({item['semester'] for item in page['items']}) or ['']
+    values = {'next_cursor': page.get('next_cursor') or '', 'semester': urllib.parse.quote(semesters[-1])}
+    return [(name, role, path.format(**values)) for name, role, path in SCENARIOS]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_scenario(base_url, clients, path, duration, warmup, metrics_token):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    # Clients warm up, wait while /metrics is read, then all start measuring together
+    warmed = threading.Barrier(len(clients) + 1)
+    go = threading.Barrier(len(clients) + 1)
+
+    def worker(client):
+        for _ in range(warmup):
+            client.get(path)
+        warmed.wait()
+        go.wait()
+        own, own_errors = [], []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status, _ = client.get(path)
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError as e:
+                status = type(e).__name__
+            if status == 200:
+                own.append(time.perf_counter() - start)
+            else:
+                own_errors.append(status)
+        with lock:
+            latencies.extend(own)
+            errors.extend(own_errors)
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    warmed.wait()
+    before = queries_by_endpoint(base_url, metrics_token)
+    go.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    after = queries_by_endpoint(base_url, metrics_token)
+
+    endpoint = scenario_endpoint(path)
+    counted = after.get(endpoint, {}).get('count', 0) - before.get(endpoint, {}).get('count', 0)
+    summed = after.get(endpoint, {}).get('sum', 0) - before.get(endpoint, {}).get('sum', 0)
+    result = {
+        'path': path,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / wall,
+        'queries_per_request': summed / counted if counted else None,
+    }
+    if latencies:
+        milliseconds = [latency * 1000 for latency in latencies]
+        result.update(mean_ms=statistics.mean(milliseconds), p50_ms=percentile(milliseconds, 0.50),
+                      p95_ms=percentile(milliseconds, 0.95), p99_ms=percentile(milliseconds, 0.99))
+    if errors:
+        result['error_statuses'] = sorted({str(status) for status in errors})
+    return result
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    print(f'\n{"scenario":26s} {"req/s":>8s} {"p50 ms":>8s} {"p95 ms":>8s} {"p99 ms":>8s} {"queries":>8s} {"errors":>7s}')
+    for name, result in results.items():
+        queries = result['queries_per_request']
+        print(f'{name:26s} {result["throughput"]:8.1f} {result.get("p50_ms", 0):8.1f} '
+              f'{result.get("p95_ms", 0):8.1f} {result.get("p99_ms", 0):8.1f} '
+              f'{"-" if queries is None else f"{queries:.1f}":>8s} {result["errors"]:7d}')
+
+def compare(results, baseline_path, tolerance):
+    """Print changes against a saved run; returns the names of regressed scenarios"""
+    with open(baseline_path) as stream:
+        baseline = json.load(stream)
+    print(f'\nCompared with {baseline_path} (revision {baseline["meta"].get("revision")}, '
+          f'{baseline["meta"]["timestamp"]}):')
+    regressions = []
+    for name, result in results.items():
+        old = baseline['scenarios'].get(name)
+        if not old or 'p95_ms' not in old or 'p95_ms' not in result:
+            continue
+        throughput_change = (result['throughput'] / old['throughput'] - 1) * 100 if old['throughput'] else 0.0
+        p95_change = (result['p95_ms'] / old['p95_ms'] - 1) * 100 if old['p95_ms'] else 0.0
+        queries_changed = result['queries_per_request'] != old.get('queries_per_request')
+        regressed = throughput_change < -tolerance or p95_change > tolerance or (
+            queries_changed and (result['queries_per_request'] or 0) > (old.get('queries_per_request') or 0))
+        if regressed:
+            regressions.append(name)
+        print(f'{name:26s} req/s {throughput_change:+6.1f}%   p95 {p95_change:+6.1f}%   '
+              f'queries {old.get("queries_per_request")} -> {result["queries_per_request"]}'
+              f'{"   REGRESSION" if regressed else ""}')
+    return regressions
+
+def main():
+    args = parse_args()
+    if not args.metrics_token:
+        args.metrics_token = secrets.token_urlsafe(16) if not args.url else ''
+    base_url = args.url.rstrip('/') if args.url else start_local_server(args)
+
+    admins = [Client(base_url).login(ADMIN_EMAIL, ADMIN_PASSWORD) for _ in range(args.concurrency)]
+    students = [Client(base_url).login(f'{args.prefix}_{i}@example.com', STUDENT_PASSWORD)
+                for i in range(args.concurrency)]
+    scenarios = fill_paths(base_url, admins[0])
+    if args.scenario:
+        unknown = set(args.scenario) - {name for name, _, _ in scenarios}
+        if unknown:
+            raise SystemExit(f'unknown scenarios: {", ".join(sorted(unknown))}')
+        scenarios = [scenario for scenario in scenarios if scenario[0] in args.scenario]
+
+    print(f'{len(scenarios)} scenarios against {base_url}, {args.concurrency} clients, {args.duration:g} s each')
+    results = {}
+    for name, role, path in scenarios:
+        results[name] = run_scenario(base_url, admins if role == 'admin' else students, path,
+                                     args.duration, args.warmup, args.metrics_token)
+    print_results(results)
+
+    if args.save:
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'url': args.url or args.database_url,
+                'concurrency': args.concurrency,
+                'duration': args.duration,
+                'students': args.students,
+            },
+            'scenarios': results,
+        }
+        with open(args.save, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        print(f'\nSaved to {args.save}')
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark application cold start from importing main.py to the first request served.
+
+Each run starts a fresh Python process that imports main (building the app,
+routes and CLI commands) and then serves GET /login through the test client,
+timing both steps. The database is initialised once beforehand, as
+'flask init-db' would in a deployment.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 20] [--database-url URL]
+
+Without --database-url a temporary SQLite file is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints the timings as one JSON line
+CHILD = '''
+import json, logging, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+logging.disable(logging.CRITICAL)
+response = main.app.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - start, 'first_request': served - imported, 'total': served - start}))
+'''
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='cold starts to measure')
+    parser.add_argument('--database-url', help='initialised database to use instead of a temporary SQLite file')
+    return parser.parse_args()
+
+def child_env(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env.setdefault('SESSION_SECRET', 'benchmark')
+    return env
+
+def init_database(database_url):
+    subprocess.run(
+        [sys.executable, '-c',
+         'import logging; logging.disable(logging.CRITICAL)\n'
+         'from main import app\nfrom schema import init_db, seed_admin\n'
+         'with app.app_context():\n    init_db()\n    seed_admin()'],
+        cwd=APP_DIR, env=child_env(database_url), check=True, capture_output=True
+    )
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def main():
+    args = parse_args()
+    if not args.database_url:
+        args.database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+        init_database(args.database_url)
+
+    timings = {'import': [], 'first_request': [], 'total': []}
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD], cwd=APP_DIR, env=child_env(args.database_url),
+            check=True, capture_output=True, text=True
+        ).stdout
+        for name, value in json.loads(output.strip().splitlines()[-1]).items():
+            timings[name].append(value * 1000)
+
+    print(f'{args.runs} cold starts against {args.database_url}')
+    for name, values in timings.items():
+        print(f'{name:14s} median {statistics.median(values):8.1f} ms   '
+              f'p95 {percentile(values, 0.95):8.1f} ms   max {max(values):8.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Stress test student ID allocation with parallel registrations.
+
+Several worker processes, released at the same moment, each register students
+through POST /register and reserve blocks of IDs as 'flask reserve-student-ids'
+does. The run fails unless every registration succeeded and no student ID was
+handed out twice, either to two students or to a student and a reserved block.
+
+Usage:
+    python benchmarks/student_id_stress.py [--workers 8] [--registrations 50] [--blocks 2]
+                                           [--block-size 25] [--database-url URL]
+
+Without --database-url a temporary SQLite file is used.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from sqlalchemy import create_engine, text
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in each worker process; prints its reserved IDs and failures as one JSON line
+CHILD = '''
+import json, logging, sys, time
+logging.disable(logging.CRITICAL)
+import main
+from app import db
+from student_ids import allocate_student_ids
+worker, registrations, blocks, block_size, start_at = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), float(sys.argv[5])
+main.app.config['WTF_CSRF_ENABLED'] = False
+client = main.app.test_client()
+reserved, failures = [], 0
+# Interleave block reservations with the registrations
+block_every = registrations // (blocks + 1) if blocks else 0
+time.sleep(max(0, start_at - time.time()))
+for i in range(registrations):
+    if block_every and i % block_every == 0 and len(reserved) < blocks * block_size:
+        with main.app.app_context():
+            reserved += allocate_student_ids(block_size)
+            db.session.commit()
+    name = f'stress{worker}x{i}'
+    response = client.post('/register', data={
+        'username': name, 'email': f'{name}@example.com', 'password': 'stress123',
+        'first_name': 'Stress', 'last_name': f'Worker{worker}', 'role': 'student',
+    })
+    failures += response.status_code != 302
+print(json.dumps({'reserved': reserved, 'failures': failures}))
+'''
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8, help='parallel processes')
+    parser.add_argument('--registrations', type=int, default=50, help='registrations per worker')
+    parser.add_argument('--blocks', type=int, default=2, help='ID blocks each worker reserves')
+    parser.add_argument('--block-size', type=int, default=25, help='IDs per reserved block')
+    parser.add_argument('--database-url', help='initialised database to use instead of a temporary SQLite file')
+    return parser.parse_args()
+
+def child_env(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env.setdefault('SESSION_SECRET', 'benchmark')
+    # Keep the run about ID allocation rather than password hashing
+    env.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    return env
+
+def init_database(database_url):
+    subprocess.run(
+        [sys.executable, '-c',
+         'import logging; logging.disable(logging.CRITICAL)\n'
+         'from main import app\nfrom schema import init_db\n'
+         'with app.app_context():\n    init_db()'],
+        cwd=APP_DIR, env=child_env(database_url), check=True, capture_output=True
+    )
+
+def main():
+    args = parse_args()
+    if not args.database_url:
+        args.database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'student_ids.db')
+        init_database(args.database_url)
+
+    # Give every worker time to import the app before they are released together
+    start_at = time.time() + 5
+    workers = [
+        subprocess.Popen(
+            [sys.executable, '-c', CHILD, str(worker), str(args.registrations), str(args.blocks),
+             str(args.block_size), str(start_at)],
+            cwd=APP_DIR, env=child_env(args.database_url), stdout=subprocess.PIPE, text=True
+        )
+        for worker in range(args.workers)
+    ]
+    reserved, failures = [], 0
+    for worker in workers:
+        output, _ = worker.communicate()
+        if worker.returncode:
+            sys.exit(f'worker exited with status {worker.returncode}')
+        outcome = json.loads(output.strip().splitlines()[-1])
+        reserved += outcome['reserved']
+        failures += outcome['failures']
+    elapsed = time.time() - start_at
+
+    engine = create_engine(args.database_url)
+    with engine.connect() as connection:
+        registered = connection.execute(
+            text("SELECT student_id FROM users WHERE username LIKE 'stress%'")
+        ).scalars().all()
+    counts = Counter(registered + reserved)
+    duplicates = sorted(student_id for student_id, count in counts.items() if count > 1)
+    missing = sum(student_id is None for student_id in registered)
+
+    expected = args.workers * args.registrations
+    print(f'{args.workers} workers against {args.database_url}')
+    print(f'{len(registered)} of {expected} registrations stored in {elapsed:.1f} s '
+          f'({len(registered) / elapsed:.0f}/s), {failures} failed')
+    print(f'{len(reserved)} IDs reserved in blocks of {args.block_size}')
+    print(f'{len(counts)} distinct student IDs, {len(duplicates)} duplicated, {missing} students without one')
+    if duplicates:
+        print('Duplicated: ' + ', '.join(str(student_id) for student_id in duplicates[:20]))
+    if duplicates or failures or missing or len(registered) != expected:
+        sys.exit(1)
+    print('OK: no student ID was handed out twice')
+
+if __name__ == '__main__':
+    main()
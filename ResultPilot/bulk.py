@@ -0,0 +1,262 @@
+from dataclasses import dataclass, field
+from sqlalchemy import case, delete, exists, func, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import db
+from models import User, Subject, Result, StudentStat
+from analytics import record_results_where
+from auth import identity_changed
+from cache import invalidate
+from choices import students_changed
+from events import results_resync
+from grading import grade_schemes
+from pagination import invalidate_counts
+from search import student_removed
+from snapshots import snapshot_stale, snapshots_removed
+
+DEFAULT_CHUNK_SIZE = 1000
+# Rows shown before and after the change in a preview
+SAMPLE_SIZE = 10
+
+RESULT_ACTIONS = [
+    ('scale_marks', 'Scale marks obtained by a factor'),
+    ('set_total_marks', 'Change total marks'),
+    ('set_semester', 'Move to another semester'),
+    ('delete', 'Delete results'),
+]
+
+@dataclass
+class BulkResultReport:
+    action: str
+    matched: int = 0
+    students: int = 0
+    changed: int = 0
+    applied: bool = False
+    grade_changes: list = field(default_factory=list)  # (old grade, new grade, results)
+    over_total: int = 0  # results that would have more marks than their total
+    conflicts: int = 0  # results that would duplicate another one in the new semester
+    sample: list = field(default_factory=list)  # rows with the current and the new values
+
+@dataclass
+class BulkStudentReport:
+    matched: int = 0
+    results: int = 0
+    deleted: int = 0
+    applied: bool = False
+    unknown: list = field(default_factory=list)  # identifiers that matched no student
+    sample: list = field(default_factory=list)
+
+def _check_expected(matched, expected, noun):
+    if expected is None:
+        raise ValueError(f'preview which {noun} match before applying the change')
+    if expected != matched:
+        raise ValueError(f'{matched} {noun} match now instead of the {expected} previewed; review the preview again')
+
+def result_conditions(semester='', academic_year='', exam_type='', subject_id=None):
+    """Conditions selecting the results of a bulk action; at least one filter is required"""
+    conditions = []
+    if semester:
+        conditions.append(Result.semester == semester)
+    if academic_year:
+        conditions.append(Result.academic_year == academic_year)
+    if exam_type:
+        conditions.append(Result.exam_type == exam_type)
+    if subject_id:
+        conditions.append(Result.subject_id == subject_id)
+    if not conditions:
+        raise ValueError('choose at least one of semester, academic year, exam type or subject')
+    return conditions
+
+def _changes(action, value):
+    """New column values of an action, as SQL expressions over the current row"""
+    if action == 'delete':
+        return {}
+    if action == 'set_semester':
+        value = (value or '').strip()
+        if not value or len(value) > 20:
+            raise ValueError('the new semester must be 1 to 20 characters')
+        return {'semester': literal(value)}
+    if action == 'scale_marks':
+        if value is None or value <= 0:
+            raise ValueError('the scale factor must be greater than 0')
+        marks = Result.marks_obtained * value
+        changes = {'marks_obtained': marks}
+        percentage = case((Result.total_marks > 0, marks * 100.0 / Result.total_marks), else_=0.0)
+    elif action == 'set_total_marks':
+        if value is None or value < 1:
+            raise ValueError('total marks must be at least 1')
+        changes = {'total_marks': literal(float(value))}
+        percentage = Result.marks_obtained * 100.0 / float(value)
+    else:
+        raise ValueError(f'unknown bulk action {action!r}')
+    # Grades follow the new percentage in the same UPDATE
+    changes['grade'] = grade_schemes().grade_expression(percentage)
+    return changes
+
+def _preview(report, conditions, changes):
+    report.matched, report.students = db.session.execute(
+        select(func.count(Result.id), func.count(Result.student_id.distinct())).where(*conditions)
+    ).one()
+    new = {name: changes.get(name, getattr(Result, name))
+           for name in ('marks_obtained', 'total_marks', 'grade', 'semester')}
+
+    if 'grade' in changes:
+        # Group on a subquery: Postgres does not match parametrized CASE expressions across clauses
+        regraded = select(Result.grade.label('old'), new['grade'].label('new')).where(*conditions).subquery()
+        report.grade_changes = [tuple(row) for row in db.session.execute(
+            select(regraded.c.old, regraded.c.new, func.count())
+            .where(or_(regraded.c.old.is_(None), regraded.c.old != regraded.c.new))
+            .group_by(regraded.c.old, regraded.c.new).order_by(regraded.c.old, regraded.c.new)
+        )]
+        report.over_total = db.session.execute(
+            select(func.count(Result.id)).where(*conditions, new['marks_obtained'] > new['total_marks'])
+        ).scalar()
+
+    if 'semester' in changes:
+        existing = aliased(Result)
+        report.conflicts = db.session.execute(
+            select(func.count(Result.id)).where(*conditions, exists().where(
+                existing.student_id == Result.student_id, existing.subject_id == Result.subject_id,
+                existing.exam_type == Result.exam_type, existing.semester == new['semester'],
+                existing.id != Result.id,
+            ))
+        ).scalar()
+        # Matched results from different semesters can also collide with each other
+        groups = select(func.count(Result.id).label('results')).where(*conditions).group_by(
+            Result.student_id, Result.subject_id, Result.exam_type
+        ).subquery()
+        report.conflicts += db.session.execute(
+            select(func.coalesce(func.sum(groups.c.results - 1), 0))
+        ).scalar()
+
+    report.sample = db.session.execute(
+        select(Result.id, User.student_id, User.first_name, User.last_name, Subject.code,
+               Result.marks_obtained, Result.total_marks, Result.grade, Result.semester,
+               new['marks_obtained'].label('new_marks_obtained'), new['total_marks'].label('new_total_marks'),
+               new['grade'].label('new_grade'), new['semester'].label('new_semester'))
+        .join(User, Result.student_id == User.id).join(Subject, Result.subject_id == Subject.id)
+        .where(*conditions).order_by(Result.id).limit(SAMPLE_SIZE)
+    ).all()
+
+def bulk_update_results(action, conditions, value=None, apply=False, expected=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Preview, or with apply carry out, a RESULT_ACTIONS action on the results matching conditions.
+
+    value is the scale factor, the new total marks or the new semester. Changes are
+    applied as one UPDATE or DELETE per chunk_size results, each committed with the
+    matching summary table deltas; grades are recomputed by the UPDATE itself.
+    Applying requires expected, the previewed count, and nothing is applied if the
+    match changed or marks would exceed their total.
+    Raises ValueError for invalid input, semester collisions, or a conflicting
+    concurrent write, in which case the chunks committed before it stay applied.
+    """
+    changes = _changes(action, value)
+    report = BulkResultReport(action)
+    _preview(report, conditions, changes)
+    if not apply or not report.matched:
+        return report
+    _check_expected(report.matched, expected, 'results')
+    if report.conflicts:
+        raise ValueError(f'{report.conflicts} results would duplicate another result in semester {value.strip()}')
+    if report.over_total:
+        raise ValueError(f'{report.over_total} results would have more marks than their total; '
+                         'narrow the filter or change the value')
+
+    # A semester move leaves every summary table unchanged
+    affects_stats = action != 'set_semester'
+    ids = db.session.execute(select(Result.id).where(*conditions).order_by(Result.id)).scalars().all()
+    try:
+        for start in range(0, len(ids), chunk_size):
+            in_chunk = Result.id.in_(ids[start:start + chunk_size])
+            student_ids = db.session.execute(select(Result.student_id).where(in_chunk).distinct()).scalars().all()
+            if affects_stats:
+                record_results_where(in_chunk, sign=-1)
+            if action == 'delete':
+                statement = delete(Result).where(in_chunk)
+            else:
+                statement = update(Result).where(in_chunk).values(**changes)
+            changed = db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+            if affects_stats and action != 'delete':
+                record_results_where(in_chunk, sign=1)
+            for student_id in student_ids:
+                snapshot_stale(student_id)
+            db.session.commit()
+            report.changed += changed
+    except IntegrityError as e:
+        db.session.rollback()
+        if report.changed:
+            results_resync()
+            db.session.commit()
+        raise ValueError(f'stopped after {report.changed} results: {e.orig}')
+    else:
+        if report.changed:
+            results_resync()
+            db.session.commit()
+    finally:
+        # Chunks committed before a failure stay applied
+        if report.changed:
+            invalidate('reports')
+            invalidate_counts('results')
+    report.applied = True
+    return report
+
+def bulk_delete_students(identifiers=(), student_id_prefix='', apply=False, expected=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Preview, or with apply carry out, deleting students and all their results.
+
+    Students are chosen by student ID or username (identifiers) and/or by student
+    ID prefix, e.g. a cohort's 'STU2024'. Each chunk of students is removed with
+    one DELETE per table and committed with its summary table deltas. Applying
+    requires expected, the previewed count of students.
+    """
+    identifiers = [identifier for identifier in dict.fromkeys(identifiers) if identifier]
+    conditions = [User.role == 'student']
+    if identifiers:
+        conditions.append(or_(User.student_id.in_(identifiers), User.username.in_(identifiers)))
+    if student_id_prefix:
+        conditions.append(User.student_id.startswith(student_id_prefix, autoescape=True))
+    if len(conditions) == 1:
+        raise ValueError('choose students by student ID, username or student ID prefix')
+
+    report = BulkStudentReport()
+    students = db.session.execute(
+        select(User.id, User.student_id, User.username, User.first_name, User.last_name)
+        .where(*conditions).order_by(User.id)
+    ).all()
+    found = {row.student_id for row in students} | {row.username for row in students}
+    report.unknown = [identifier for identifier in identifiers if identifier not in found]
+    report.matched = len(students)
+    report.sample = students[:SAMPLE_SIZE]
+    student_ids = [row.id for row in students]
+    for start in range(0, len(student_ids), chunk_size):
+        report.results += db.session.execute(
+            select(func.count(Result.id)).where(Result.student_id.in_(student_ids[start:start + chunk_size]))
+        ).scalar()
+    if not apply or not students:
+        return report
+    _check_expected(report.matched, expected, 'students')
+
+    try:
+        for start in range(0, len(student_ids), chunk_size):
+            chunk = student_ids[start:start + chunk_size]
+            record_results_where(Result.student_id.in_(chunk), sign=-1)
+            db.session.execute(delete(StudentStat).where(StudentStat.student_id.in_(chunk)))
+            snapshots_removed(chunk)
+            db.session.execute(delete(Result).where(Result.student_id.in_(chunk)),
+                               execution_options={'synchronize_session': False})
+            deleted = db.session.execute(delete(User).where(User.id.in_(chunk), User.role == 'student'),
+                                         execution_options={'synchronize_session': False}).rowcount
+            db.session.commit()
+            report.deleted += deleted
+            for student_id in chunk:
+                student_removed(student_id)
+                identity_changed(student_id)
+        if report.deleted:
+            results_resync()
+            db.session.commit()
+    finally:
+        if report.deleted:
+            invalidate('reports')
+            invalidate_counts('students')
+            invalidate_counts('results')
+            students_changed()
+    report.applied = True
+    return report
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, request
+from replicas import reading_from_replicas, replica_cache_ttl
+
+try:
+    import redis
+except ImportError:  # optional, only needed when CACHE_URL points at a Redis server
+    redis = None
+
+KEY_PREFIX = 'srms:'
+
+class MemoryCache:
+    """Per-process LRU cache with a TTL on every entry"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+class RedisCache:
+    """Cache shared by all workers through a Redis-compatible server"""
+
+    def __init__(self, url, ttl=300):
+        if redis is None:
+            raise RuntimeError('CACHE_URL points at Redis but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(KEY_PREFIX + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(KEY_PREFIX + key, value, ex=ttl or self.ttl)
+
+    def get_version(self, namespace):
+        return int(self.client.get(f'{KEY_PREFIX}version:{namespace}') or 0)
+
+    def bump_version(self, namespace):
+        self.client.incr(f'{KEY_PREFIX}version:{namespace}')
+
+cache = MemoryCache()
+
+def init_cache(app):
+    """Pick the cache backend from CACHE_URL (redis://... or empty for in-process)"""
+    global cache
+    url = app.config.get('CACHE_URL')
+    ttl = app.config.get('CACHE_TTL', 300)
+    if url:
+        cache = RedisCache(url, ttl)
+    else:
+        cache = MemoryCache(app.config.get('CACHE_MAXSIZE', 1024), ttl)
+
+def is_shared():
+    """True when every worker sees the same entries and versions, so invalidate() reaches them all"""
+    return isinstance(cache, RedisCache)
+
+def invalidate(namespace):
+    """Make every entry cached under namespace stale by moving to a new version"""
+    cache.bump_version(namespace)
+
+def version(namespace):
+    """Current version of namespace, shared between workers when the cache is"""
+    return cache.get_version(namespace)
+
+def _versioned_key(namespace, *parts):
+    return f'{namespace}:v{version(namespace)}:' + ':'.join(str(part) for part in parts)
+
+def _placement(namespace, *parts, ttl=None):
+    """Cache key and TTL of a value; values read from a replica may lag behind the latest
+    version, so they get keys of their own (readers of their own writes never see them)
+    and expire once replicas have caught up"""
+    if reading_from_replicas():
+        return _versioned_key(namespace, *parts, 'replica'), replica_cache_ttl(ttl)
+    return _versioned_key(namespace, *parts), ttl
+
+def get_or_set(namespace, key, compute, ttl=None):
+    """JSON-serializable value cached under key until namespace is invalidated, computed on a miss"""
+    full_key, ttl = _placement(namespace, key, ttl=ttl)
+    hit = cache.get(full_key)
+    if hit is not None:
+        return json.loads(hit)
+    value = compute()
+    cache.set(full_key, json.dumps(value, default=str), ttl)
+    return value
+
+def cached(namespace, ttl=None):
+    """Cache a function's JSON-serializable return value per arguments until namespace is invalidated"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = f'{f.__name__}:' + json.dumps([args, kwargs], sort_keys=True, default=str)
+            return get_or_set(namespace, key, lambda: f(*args, **kwargs), ttl)
+        return decorated_function
+    return decorator
+
+def cached_json_response(namespace, ttl=None):
+    """Cache a JSON view's body per query string and answer If-None-Match with 304"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            params = json.dumps([sorted(request.args.items(multi=True)), kwargs], default=str)
+            key, key_ttl = _placement(namespace, request.endpoint, params, ttl=ttl)
+            body = cache.get(key)
+            if body is None:
+                body = f(*args, **kwargs).get_data(as_text=True)
+                cache.set(key, body, key_ttl)
+            response = Response(body, mimetype='application/json')
+            response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+            # Admin data: browsers may keep it but must revalidate with the ETag
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
@@ -0,0 +1,69 @@
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from cache import get_or_set, invalidate
+from models import User, Subject
+
+# Cache namespaces bumped by student and subject writes
+STUDENT_CHOICES = 'choices:students'
+SUBJECT_CHOICES = 'choices:subjects'
+
+STUDENT_LABEL_COLUMNS = (User.id, User.first_name, User.last_name, User.student_id, User.username)
+
+def student_label(first_name, last_name, student_id, username):
+    return f"{first_name} {last_name} ({student_id or username})"
+
+def subject_label(name, code):
+    return f"{name} ({code})"
+
+def _student_choices():
+    return [
+        (row.id, student_label(row.first_name, row.last_name, row.student_id, row.username))
+        for row in db.session.execute(
+            select(*STUDENT_LABEL_COLUMNS).where(User.role == 'student').order_by(User.first_name, User.last_name)
+        )
+    ]
+
+def _subject_choices():
+    return [
+        (row.id, subject_label(row.name, row.code))
+        for row in db.session.execute(select(Subject.id, Subject.name, Subject.code).order_by(Subject.name))
+    ]
+
+def student_choices():
+    """(id, label) of every student for a select, cached until a student is added, changed or removed"""
+    return [tuple(choice) for choice in get_or_set(STUDENT_CHOICES, 'all', _student_choices)]
+
+def subject_choices():
+    """(id, label) of every subject for a select, cached until a subject is added or changed"""
+    return [tuple(choice) for choice in get_or_set(SUBJECT_CHOICES, 'all', _subject_choices)]
+
+def student_count():
+    return get_or_set(STUDENT_CHOICES, 'count', lambda: db.session.execute(
+        select(func.count(User.id)).where(User.role == 'student')
+    ).scalar())
+
+def use_student_search():
+    """True when there are too many students for a select and forms search for them instead"""
+    return student_count() > current_app.config['STUDENT_SELECT_LIMIT']
+
+def student_choice(student_id):
+    """(id, label) of one student by primary key, or None if there is no such student"""
+    row = db.session.execute(
+        select(*STUDENT_LABEL_COLUMNS).where(User.id == student_id, User.role == 'student')
+    ).first()
+    return (row.id, student_label(*row[1:])) if row is not None else None
+
+def student_exists(student_id):
+    return db.session.execute(
+        select(User.id).where(User.id == student_id, User.role == 'student')
+    ).first() is not None
+
+def subject_exists(subject_id):
+    return db.session.execute(select(Subject.id).where(Subject.id == subject_id)).first() is not None
+
+def students_changed():
+    invalidate(STUDENT_CHOICES)
+
+def subjects_changed():
+    invalidate(SUBJECT_CHOICES)
@@ -0,0 +1,473 @@
+import array
+import bisect
+import fcntl
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from models import Subject, Result
+
+# Column name -> array typecode; dimension columns hold indexes into the snapshot's dictionaries
+COLUMNS = {
+    'id': 'q',
+    'semester': 'H',
+    'subject': 'H',
+    'exam_type': 'H',
+    'academic_year': 'H',
+    'grade': 'H',
+    'percentage': 'f',
+    # 0 once the result has been deleted; dropped by the next full rebuild
+    'live': 'B',
+}
+DIMENSIONS = ('semester', 'subject', 'exam_type', 'academic_year', 'grade')
+METRICS = ('count', 'avg_percentage', 'pass_rate')
+DEFAULT_PASS_MARK = 40
+# Results re-read before the watermark, so writes that committed late are not missed
+WATERMARK_OVERLAP = timedelta(minutes=5)
+# A refresh rebuilds from scratch once this share of the rows are deleted results
+MAX_DEAD_SHARE = 0.2
+ROW_BATCH = 10000
+# Rows per column segment file; a refresh rewrites only the segments it changes and
+# hard-links the others from the previous version
+SEGMENT_ROWS = 1 << 16
+# Files of the aggregated cells: dimension codes, whole percentage, count and percentage sum
+CELL_FIELDS = {**{dimension: 'H' for dimension in DIMENSIONS}, 'bucket': 'B', 'count': 'q', 'sum': 'd'}
+
+# Stale snapshots are refreshed one at a time per web process, off the request thread
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics-refresh')
+_refresh_queued = threading.Event()
+_stores = {}
+
+def _dimension_values(row):
+    return (row.semester, row.subject_id, row.exam_type or '', row.academic_year, row.grade or '')
+
+def _result_rows(*conditions):
+    return db.session.execute(
+        select(Result.id, Result.semester, Result.subject_id, Result.exam_type, Result.academic_year,
+               Result.grade, Result.percentage, Result.updated_at)
+        .where(*conditions).order_by(Result.id).execution_options(yield_per=ROW_BATCH)
+    )
+
+def _single(value):
+    """value rounded to the single precision the percentage column stores"""
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+def _bucket(percentage):
+    return min(max(int(percentage), 0), 100)
+
+def _map(file_path, typecode):
+    if not os.path.getsize(file_path):
+        # Empty files cannot be mapped
+        return memoryview(array.array(typecode))
+    with open(file_path, 'rb') as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
+
+class ResultColumns:
+    """One immutable version of the snapshot, memory-mapped from its directory.
+
+    Rows are stored as column segments of SEGMENT_ROWS rows. Queries read the
+    cells, live rows already aggregated per dimension codes and whole percentage,
+    which each refresh maintains from the rows it changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta['rows']
+        self.segments = self.meta.get('segments')  # None in snapshots written before segments
+        self.dictionaries = self.meta['dictionaries']
+        self._segments = {}
+        self._cells = None
+
+    def segment_path(self, name, index):
+        return os.path.join(self.path, f'{name}.{index}.bin')
+
+    def segment(self, name, index):
+        values = self._segments.get((name, index))
+        if values is None:
+            values = self._segments[name, index] = _map(self.segment_path(name, index), COLUMNS[name])
+        return values
+
+    @property
+    def live_rows(self):
+        return self.meta['live_rows']
+
+    def label(self, dimension, code):
+        value = self.dictionaries[dimension][code]
+        if dimension == 'subject':
+            return self.meta['subjects'].get(str(value), {}).get('code', str(value))
+        return value
+
+    def codes(self, dimension, labels):
+        """Dictionary codes of the given labels; unknown labels match nothing"""
+        wanted = set(labels)
+        return {code for code in range(len(self.dictionaries[dimension])) if self.label(dimension, code) in wanted}
+
+    def cells(self):
+        """Live rows aggregated per (dimension codes..., whole percentage) into [count, percentage sum]"""
+        if self._cells is None:
+            fields = {name: _map(os.path.join(self.path, f'cells.{name}.bin'), typecode)
+                      for name, typecode in CELL_FIELDS.items()}
+            keys = zip(*(fields[dimension] for dimension in DIMENSIONS), fields['bucket'])
+            self._cells = {key: [count, percentage_sum]
+                           for key, count, percentage_sum in zip(keys, fields['count'], fields['sum'])}
+        return self._cells
+
+class _Draft:
+    """The next version being built: the base version plus copies of the segments it changes"""
+
+    def __init__(self, base=None):
+        self.base = base
+        self.rows = base.rows if base else 0
+        self.live_rows = base.live_rows if base else 0
+        self.dictionaries = {dimension: list(base.dictionaries[dimension]) if base else []
+                             for dimension in DIMENSIONS}
+        self.lookups = {dimension: {value: code for code, value in enumerate(values)}
+                        for dimension, values in self.dictionaries.items()}
+        self.cells = {key: list(cell) for key, cell in base.cells().items()} if base else {}
+        self.changed = {}  # segment index -> {column name: writable array}
+        # Lowest id of each segment, to find a row's segment before bisecting within it
+        self.first_ids = [base.segment('id', index)[0] for index in range(base.segments)] if base else []
+
+    def _writable(self, index):
+        columns = self.changed.get(index)
+        if columns is None:
+            columns = {name: array.array(typecode) for name, typecode in COLUMNS.items()}
+            if self.base is not None and index < self.base.segments:
+                for name, values in columns.items():
+                    values.frombytes(self.base.segment(name, index).cast('B'))
+            self.changed[index] = columns
+        return columns
+
+    def column(self, name, index):
+        columns = self.changed.get(index)
+        return columns[name] if columns is not None else self.base.segment(name, index)
+
+    def value(self, name, position):
+        index, offset = divmod(position, SEGMENT_ROWS)
+        return self.column(name, index)[offset]
+
+    def _codes(self, row):
+        codes = []
+        for dimension, value in zip(DIMENSIONS, _dimension_values(row)):
+            code = self.lookups[dimension].get(value)
+            if code is None:
+                code = self.lookups[dimension][value] = len(self.dictionaries[dimension])
+                self.dictionaries[dimension].append(value)
+            codes.append(code)
+        return tuple(codes)
+
+    def _count(self, codes, percentage, sign):
+        key = codes + (_bucket(percentage),)
+        cell = self.cells.setdefault(key, [0, 0.0])
+        cell[0] += sign
+        cell[1] += sign * percentage
+        if not cell[0]:
+            del self.cells[key]
+
+    def _stored(self, position):
+        """Dimension codes and percentage of the row at position"""
+        index, offset = divmod(position, SEGMENT_ROWS)
+        codes = tuple(self.column(dimension, index)[offset] for dimension in DIMENSIONS)
+        return codes, self.column('percentage', index)[offset]
+
+    def append(self, row):
+        codes = self._codes(row)
+        if not self.rows % SEGMENT_ROWS:
+            self.first_ids.append(row.id)
+        columns = self._writable(self.rows // SEGMENT_ROWS)
+        columns['id'].append(row.id)
+        for dimension, code in zip(DIMENSIONS, codes):
+            columns[dimension].append(code)
+        columns['percentage'].append(row.percentage)
+        columns['live'].append(1)
+        # Counted with the stored single-precision value, which later updates subtract
+        self._count(codes, columns['percentage'][-1], 1)
+        self.rows += 1
+        self.live_rows += 1
+
+    def find(self, result_id):
+        """Position of result_id, self.rows when it is newer than every row, or None when it was never seen"""
+        if not self.rows or result_id > self.value('id', self.rows - 1):
+            return self.rows
+        index = bisect.bisect_right(self.first_ids, result_id) - 1
+        if index < 0:
+            return None
+        ids = self.column('id', index)
+        offset = bisect.bisect_left(ids, result_id)
+        if offset < len(ids) and ids[offset] == result_id:
+            return index * SEGMENT_ROWS + offset
+        return None
+
+    def update(self, position, row):
+        if not self.value('live', position):
+            return
+        old_codes, old_percentage = self._stored(position)
+        codes, percentage = self._codes(row), _single(row.percentage)
+        # Rows re-read only because of the watermark overlap leave their segment untouched
+        if codes == old_codes and percentage == old_percentage:
+            return
+        index, offset = divmod(position, SEGMENT_ROWS)
+        columns = self._writable(index)
+        for dimension, code in zip(DIMENSIONS, codes):
+            columns[dimension][offset] = code
+        columns['percentage'][offset] = percentage
+        self._count(old_codes, old_percentage, -1)
+        self._count(codes, percentage, 1)
+
+    def drop_missing(self, existing):
+        """Mark rows whose ids are not in existing as deleted"""
+        for index in range(len(self.first_ids)):
+            ids = self.column('id', index)
+            for result_id in sorted(set(ids) - existing):
+                offset = bisect.bisect_left(ids, result_id)
+                if self.column('live', index)[offset]:
+                    self._count(*self._stored(index * SEGMENT_ROWS + offset), -1)
+                    self._writable(index)['live'][offset] = 0
+                    self.live_rows -= 1
+
+class ColumnStore:
+    """Versioned snapshot directories under one path; CURRENT names the version readers use"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._versions = {}
+
+    def current(self):
+        try:
+            with open(os.path.join(self.directory, 'CURRENT')) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        snapshot = self._versions.get(version)
+        if snapshot is None:
+            snapshot = ResultColumns(os.path.join(self.directory, version))
+            if snapshot.segments is None:
+                # Unsegmented layout of an older release; the next refresh rebuilds it
+                return None
+            # Older versions stay mapped until their last reader lets go of them
+            self._versions = {version: snapshot}
+        return snapshot
+
+    def refresh(self, full=False, wait=True):
+        """Bring the snapshot up to date with the results table; returns the new version or None.
+
+        Results updated since the last refresh are upserted by id and deleted ones
+        marked dead; the snapshot is rebuilt from scratch with full, when ids arrive
+        out of order, or once too many rows are dead. Without wait, returns None at
+        once if another thread or process is already refreshing.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'refresh.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return None
+            base = None if full else self.current()
+            update = None
+            if base is not None and base.rows - base.live_rows <= MAX_DEAD_SHARE * base.rows:
+                update = self._update(base)
+            draft, watermark = update or self._rebuild()
+            return self._write(draft, watermark)
+
+    def _rebuild(self):
+        draft = _Draft()
+        watermark = None
+        for row in _result_rows():
+            draft.append(row)
+            if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                watermark = row.updated_at
+        return draft, watermark
+
+    def _update(self, base):
+        draft = _Draft(base)
+        watermark = datetime.fromisoformat(base.meta['watermark']) if base.meta['watermark'] else None
+        conditions = [Result.updated_at >= watermark - WATERMARK_OVERLAP] if watermark else []
+        for row in _result_rows(*conditions):
+            position = draft.find(row.id)
+            if position is None:
+                # An id below the newest one that the snapshot never saw
+                return None
+            if position == draft.rows:
+                draft.append(row)
+            else:
+                draft.update(position, row)
+            if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                watermark = row.updated_at
+
+        # Deletions leave no updated_at behind; a count mismatch means some ids are gone
+        if draft.live_rows != db.session.execute(select(func.count(Result.id))).scalar():
+            draft.drop_missing(set(db.session.execute(select(Result.id)).scalars()))
+        return draft, watermark
+
+    def _write(self, draft, watermark):
+        versions = sorted(int(name[1:]) for name in os.listdir(self.directory)
+                          if name.startswith('v') and name[1:].isdigit())
+        version = f'v{versions[-1] + 1 if versions else 1}'
+        staging = os.path.join(self.directory, f'.{version}')
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        segments = -(-draft.rows // SEGMENT_ROWS)
+        for index in range(segments):
+            for name in COLUMNS:
+                target = os.path.join(staging, f'{name}.{index}.bin')
+                if index in draft.changed:
+                    with open(target, 'wb') as f:
+                        draft.changed[index][name].tofile(f)
+                else:
+                    # Unchanged segments are shared with the previous version
+                    try:
+                        os.link(draft.base.segment_path(name, index), target)
+                    except OSError:
+                        shutil.copyfile(draft.base.segment_path(name, index), target)
+        cells = {name: array.array(typecode) for name, typecode in CELL_FIELDS.items()}
+        for key, (count, percentage_sum) in draft.cells.items():
+            for name, code in zip((*DIMENSIONS, 'bucket'), key):
+                cells[name].append(code)
+            cells['count'].append(count)
+            cells['sum'].append(percentage_sum)
+        for name, values in cells.items():
+            with open(os.path.join(staging, f'cells.{name}.bin'), 'wb') as f:
+                values.tofile(f)
+        subjects = {
+            str(subject_id): {'code': code, 'name': name}
+            for subject_id, code, name in db.session.execute(select(Subject.id, Subject.code, Subject.name))
+        }
+        meta = {
+            'rows': draft.rows, 'live_rows': draft.live_rows, 'segments': segments,
+            'dictionaries': draft.dictionaries, 'subjects': subjects,
+            'watermark': watermark.isoformat() if watermark else None,
+            'refreshed_at': time.time(),
+        }
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(staging, os.path.join(self.directory, version))
+
+        pointer = os.path.join(self.directory, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.directory, 'CURRENT'))
+        # Keep the previous version for readers that just loaded it; mapped files survive removal
+        for old in versions[:-1]:
+            shutil.rmtree(os.path.join(self.directory, f'v{old}'), ignore_errors=True)
+        return version
+
+def get_store():
+    directory = current_app.config['ANALYTICS_DIR']
+    store = _stores.get(directory)
+    if store is None:
+        store = _stores[directory] = ColumnStore(directory)
+    return store
+
+def _refresh_in_background(app):
+    with app.app_context():
+        try:
+            get_store().refresh(wait=False)
+        except Exception:
+            logging.exception('Analytics snapshot refresh failed')
+        finally:
+            _refresh_queued.clear()
+            db.session.remove()
+
+def result_columns():
+    """The current snapshot: built on first use, refreshed in the background once older than ANALYTICS_MAX_AGE"""
+    store = get_store()
+    snapshot = store.current()
+    if snapshot is None:
+        store.refresh()
+        return store.current()
+    if time.time() - snapshot.meta['refreshed_at'] > current_app.config['ANALYTICS_MAX_AGE'] \
+            and not _refresh_queued.is_set():
+        _refresh_queued.set()
+        _runner.submit(_refresh_in_background, current_app._get_current_object())
+    return snapshot
+
+def _check_dimensions(dimensions):
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f'unknown dimension {dimension!r}; use one of {", ".join(DIMENSIONS)}')
+
+def _matching_cells(snapshot, filters):
+    """Cells whose dimension codes pass filters ({dimension: [labels]}; empty lists are ignored)"""
+    _check_dimensions(filters)
+    allowed = [(DIMENSIONS.index(dimension), snapshot.codes(dimension, labels))
+               for dimension, labels in filters.items() if labels]
+    for key, cell in snapshot.cells().items():
+        if all(key[index] in codes for index, codes in allowed):
+            yield key, cell
+
+def _metrics(count, percentage_sum, passed):
+    return {
+        'count': count,
+        'avg_percentage': round(percentage_sum / count, 2) if count else 0.0,
+        'pass_rate': round(passed * 100.0 / count, 2) if count else 0.0,
+    }
+
+def group_results(group_by=(), filters=None, pass_mark=DEFAULT_PASS_MARK):
+    """Count, average percentage and pass rate of the filtered results per combination of group_by.
+
+    pass_mark is a whole percentage; results at or above it pass.
+    """
+    _check_dimensions(group_by)
+    snapshot = result_columns()
+    indexes = [DIMENSIONS.index(dimension) for dimension in group_by]
+    groups = {}
+    for key, (count, percentage_sum) in _matching_cells(snapshot, filters or {}):
+        group = groups.setdefault(tuple(key[index] for index in indexes), [0, 0.0, 0])
+        group[0] += count
+        group[1] += percentage_sum
+        if key[-1] >= pass_mark:
+            group[2] += count
+    rows = []
+    for codes, (count, percentage_sum, passed) in groups.items():
+        row = {dimension: snapshot.label(dimension, code) for dimension, code in zip(group_by, codes)}
+        row.update(_metrics(count, percentage_sum, passed))
+        rows.append(row)
+    rows.sort(key=lambda row: tuple(str(row[dimension]) for dimension in group_by))
+    return rows
+
+def pivot_results(rows, columns, metric='count', filters=None, pass_mark=DEFAULT_PASS_MARK):
+    """One metric of the filtered results as a table with a row per value of rows and a column per value of columns"""
+    if metric not in METRICS:
+        raise ValueError(f'unknown metric {metric!r}; use one of {", ".join(METRICS)}')
+    if rows == columns:
+        raise ValueError('rows and columns must be different dimensions')
+    groups = group_results((rows, columns), filters, pass_mark)
+    row_labels = sorted({group[rows] for group in groups}, key=str)
+    column_labels = sorted({group[columns] for group in groups}, key=str)
+    values = [[None] * len(column_labels) for _ in row_labels]
+    row_index = {label: index for index, label in enumerate(row_labels)}
+    column_index = {label: index for index, label in enumerate(column_labels)}
+    for group in groups:
+        values[row_index[group[rows]]][column_index[group[columns]]] = group[metric]
+    return {'rows': row_labels, 'columns': column_labels, 'metric': metric, 'values': values}
+
+def percentage_histogram(bin_width=10, filters=None):
+    """Result counts per percentage bin of bin_width whole percent; the last bin includes 100"""
+    if not 1 <= bin_width <= 100:
+        raise ValueError('bin_width must be between 1 and 100')
+    counts = [0] * -(-100 // bin_width)
+    for key, (count, _) in _matching_cells(result_columns(), filters or {}):
+        counts[min(key[-1] // bin_width, len(counts) - 1)] += count
+    return [
+        {'min': index * bin_width, 'max': min((index + 1) * bin_width, 100), 'count': count}
+        for index, count in enumerate(counts)
+    ]
+
+def snapshot_info():
+    snapshot = result_columns()
+    return {
+        'rows': snapshot.rows, 'live_rows': snapshot.live_rows,
+        'watermark': snapshot.meta['watermark'],
+        'refreshed_at': datetime.utcfromtimestamp(snapshot.meta['refreshed_at']).isoformat(),
+    }
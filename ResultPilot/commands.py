@@ -0,0 +1,240 @@
+import time
+import click
+
+from app import app, db
+from analytics import rebuild_stats, check_stats
+from columnar import get_store
+from importer import import_results, DEFAULT_CHUNK_SIZE
+from models import Subject, Result, GradeScheme, ReportJob
+from replicas import get_replicas, sync_sqlite_replicas
+from report_jobs import run_report_job
+from grading import parse_scale, save_scheme, delete_scheme, regrade
+from schema import (init_db, migrate, seed_admin,
+                    DEFAULT_ADMIN_EMAIL, DEFAULT_ADMIN_PASSWORD)
+from search import create_trigram_indexes
+from student_ids import allocate_student_ids
+from synthetic import seed_synthetic, SYNTHETIC_PASSWORD
+
+@app.cli.command('init-db')
+@click.option('--seed-admin/--no-seed-admin', 'with_admin', default=True, show_default=True,
+              help='Also create the default admin account if it does not exist.')
+def init_db_command(with_admin):
+    """Create the database tables; run once per new database instead of on every boot."""
+    tables = init_db()
+    click.echo(f'{len(tables)} tables created.')
+    if with_admin:
+        user, created = seed_admin()
+        if created:
+            click.echo(f'Admin user created: {DEFAULT_ADMIN_EMAIL} / {DEFAULT_ADMIN_PASSWORD} (change the password)')
+
+@app.cli.command('seed-admin')
+@click.option('--email', default=DEFAULT_ADMIN_EMAIL, show_default=True)
+@click.option('--password', default=DEFAULT_ADMIN_PASSWORD, show_default=True)
+@click.option('--username', default='admin', show_default=True)
+def seed_admin_command(email, password, username):
+    """Create an admin account unless a user with the email already exists."""
+    user, created = seed_admin(email, password, username)
+    click.echo(f'Admin user {"created" if created else "already exists"}: {user.email}')
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Add the tables, nullable columns and indexes the models declare to an existing database."""
+    try:
+        tables, columns, skipped, indexes = migrate()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for name in tables + columns + indexes:
+        click.echo(f'Created {name}')
+    for name in skipped:
+        click.echo(f'Cannot add NOT NULL column {name} automatically; migrate it by hand.', err=True)
+    click.echo(f'{len(tables)} tables, {len(columns)} columns and {len(indexes)} indexes created.')
+
+# Older name of the command from when it only added indexes
+app.cli.add_command(migrate_command, 'migrate-indexes')
+
+@app.cli.command('replica-status')
+def replica_status_command():
+    """Check every read replica now and show whether it is in rotation."""
+    replicas = get_replicas()
+    if replicas is None:
+        raise click.ClickException('No read replicas configured; set DATABASE_REPLICA_URLS.')
+    for replica in replicas.replicas:
+        healthy = replicas.check(replica)
+        lag = f', {replica.lag:.1f} s behind' if replica.lag is not None else ''
+        click.echo(f'{replica.name} {replica.engine.url.render_as_string(hide_password=True)}: '
+                   f'{"healthy" if healthy else "out of rotation"}{lag}{"" if healthy else f" ({replica.error})"}')
+
+@app.cli.command('sync-replicas')
+def sync_replicas_command():
+    """Copy a SQLite primary over its SQLite replicas, for trying out read replicas locally."""
+    replicas = get_replicas()
+    if replicas is None:
+        raise click.ClickException('No read replicas configured; set DATABASE_REPLICA_URLS.')
+    try:
+        sync_sqlite_replicas(db.engine, replicas.replicas)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'{len(replicas.replicas)} replicas synced from {db.engine.url.database}.')
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard summary tables and student snapshots from the results table."""
+    rebuild_stats()
+    click.echo('Summary tables and student snapshots rebuilt.')
+
+@app.cli.command('refresh-analytics')
+@click.option('--full', is_flag=True, help='Rebuild the snapshot from scratch instead of applying changes.')
+def refresh_analytics_command(full):
+    """Bring the columnar analytics snapshot up to date with the results table."""
+    start = time.perf_counter()
+    store = get_store()
+    version = store.refresh(full=full)
+    snapshot = store.current()
+    click.echo(f'Snapshot {version}: {snapshot.live_rows} results ({snapshot.rows - snapshot.live_rows} deleted) '
+               f'in {time.perf_counter() - start:.1f} s.')
+
+@app.cli.command('check-stats')
+def check_stats_command():
+    """Verify the dashboard summary tables against the results table."""
+    problems = check_stats()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise SystemExit(f'{len(problems)} summary rows are inconsistent; run "flask rebuild-stats".')
+    click.echo('Summary tables are consistent.')
+
+@app.cli.command('import-results')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']),
+              help='Input format; guessed from the file extension when omitted.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+              help='Rows inserted per transaction.')
+def import_results_command(path, fmt, chunk_size):
+    """Bulk import results from a CSV or JSON mark sheet."""
+    if fmt is None:
+        fmt = 'json' if path.lower().endswith(('.json', '.jsonl')) else 'csv'
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_results(stream, fmt, chunk_size)
+    for number, message in report.errors:
+        click.echo(f'row {number}: {message}', err=True)
+    click.echo(f'{report.inserted} results imported, {report.duplicates} duplicates, '
+               f'{len(report.errors)} rows skipped.')
+    if report.parse_error:
+        raise click.ClickException(f'The file could not be parsed: {report.parse_error}')
+
+@app.cli.command('init-search')
+def init_search_command():
+    """Install pg_trgm and the trigram indexes used by search on PostgreSQL."""
+    try:
+        names = create_trigram_indexes()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Trigram search ready ({len(names)} indexes).')
+
+@app.cli.command('generate-report-cards')
+@click.argument('semester')
+def generate_report_cards_command(semester):
+    """Render the report cards of every student with results in SEMESTER."""
+    job = ReportJob(semester=semester)
+    db.session.add(job)
+    db.session.commit()
+    job = run_report_job(job.id)
+    if job.status != 'completed':
+        raise click.ClickException(f'Report job {job.id} failed: {job.error}')
+    click.echo(f'{job.processed_students} report cards written to {job.artifact_path}')
+
+@app.cli.command('seed-synthetic')
+@click.option('--students', default=1000, show_default=True)
+@click.option('--subjects', default=40, show_default=True)
+@click.option('--semesters', default=4, show_default=True, help='Terms of history, ending with the current one.')
+@click.option('--courses', default=5, show_default=True, help='Subjects each student takes per term.')
+@click.option('--midterm-share', default=0.6, show_default=True, help='Share of courses that also have a mid-term.')
+@click.option('--prefix', default='synth', show_default=True, help='Username and email prefix of the students.')
+@click.option('--seed', default=42, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per bulk INSERT.')
+def seed_synthetic_command(students, subjects, semesters, courses, midterm_share, prefix, seed, batch_size):
+    """Generate synthetic students, subjects, semesters and results for development and load tests."""
+    start = time.perf_counter()
+    try:
+        counts = seed_synthetic(students, subjects, semesters, courses, midterm_share, prefix, seed, batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{counts['students']} students, {counts['subjects']} new subjects, {counts['semesters']} new semesters "
+               f"and {counts['results']} results created in {time.perf_counter() - start:.1f} s.")
+    click.echo(f'Students log in as {prefix}_<n>@example.com / {SYNTHETIC_PASSWORD}')
+
+@app.cli.command('reserve-student-ids')
+@click.argument('count', type=click.IntRange(min=1))
+@click.option('--year', type=int, help='Enrollment year of the IDs; defaults to the current year.')
+@click.option('--output', type=click.File('w'), default='-', help='File to write the IDs to, one per line.')
+def reserve_student_ids_command(count, year, output):
+    """Reserve a block of student IDs for a bulk enrollment; registrations never reuse them."""
+    student_ids = allocate_student_ids(count, year)
+    db.session.commit()
+    for student_id in student_ids:
+        output.write(f'{student_id}\n')
+    click.echo(f'{len(student_ids)} student IDs reserved, {student_ids[0]} to {student_ids[-1]}.', err=True)
+
+def _subject_id(subject_code):
+    if not subject_code:
+        return None
+    subject = Subject.query.filter_by(code=subject_code).first()
+    if subject is None:
+        raise click.ClickException(f'Unknown subject code {subject_code!r}')
+    return subject.id
+
+def _regrade_conditions(subject_code, academic_year):
+    conditions = []
+    if subject_code:
+        conditions.append(Result.subject_id == _subject_id(subject_code))
+    if academic_year:
+        conditions.append(Result.academic_year == academic_year)
+    return conditions
+
+@app.cli.command('list-grade-schemes')
+def list_grade_schemes_command():
+    """Show the grade schemes stored in the database."""
+    for scheme in GradeScheme.query.order_by(GradeScheme.name).all():
+        scope = ', '.join(filter(None, [
+            f'subject {scheme.subject.code}' if scheme.subject else None,
+            f'year {scheme.academic_year}' if scheme.academic_year else None,
+        ])) or 'default'
+        scale = ', '.join(f'{b.grade}:{b.min_percentage:g}:{b.points:g}' for b in scheme.boundaries)
+        click.echo(f'{scheme.name} ({scope}): {scale}')
+
+@app.cli.command('set-grade-scheme')
+@click.argument('name')
+@click.argument('scale')
+@click.option('--subject', 'subject_code', help='Subject code the scheme applies to.')
+@click.option('--year', 'academic_year', help='Academic year the scheme applies to.')
+@click.option('--regrade', 'regrade_now', is_flag=True, help='Re-grade the results the scheme covers.')
+def set_grade_scheme_command(name, scale, subject_code, academic_year, regrade_now):
+    """Create or replace a grade scheme, e.g. 'A:85:4,B:70:3,C:50:2,F:0:0'.
+
+    Without --subject or --year the scheme replaces the default scale.
+    """
+    conditions = _regrade_conditions(subject_code, academic_year)
+    try:
+        save_scheme(name, parse_scale(scale), _subject_id(subject_code), academic_year)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Grade scheme {name} saved.')
+    if regrade_now:
+        click.echo(f'{regrade(*conditions)} grades changed.')
+
+@app.cli.command('delete-grade-scheme')
+@click.argument('name')
+def delete_grade_scheme_command(name):
+    """Remove a grade scheme; run regrade-results afterwards to apply the fallback scale."""
+    if not delete_scheme(name):
+        raise click.ClickException(f'No grade scheme named {name!r}')
+    click.echo(f'Grade scheme {name} deleted.')
+
+@app.cli.command('regrade-results')
+@click.option('--subject', 'subject_code', help='Only results of this subject code.')
+@click.option('--year', 'academic_year', help='Only results of this academic year.')
+@click.option('--chunk-size', type=int, help='Update this many result ids per transaction instead of all at once.')
+def regrade_results_command(subject_code, academic_year, chunk_size):
+    """Recompute stored grades under the current grade schemes."""
+    changed = regrade(*_regrade_conditions(subject_code, academic_year), chunk_size=chunk_size)
+    click.echo(f'{changed} grades changed.')
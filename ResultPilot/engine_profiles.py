@@ -0,0 +1,110 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from instrumentation import instrumented_pool
+
+# Named engine and pool settings, picked with DB_PROFILE. Size pool_size + max_overflow
+# so that (gunicorn workers x threads) connections fit within the server's max_connections.
+ENGINE_PROFILES = {
+    # Settings used before profiles existed: default pool, ping on every checkout
+    'default': {
+        'dialect': None,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+    },
+    # Local development against a SQLite file: WAL lets readers run while one thread writes
+    'sqlite-dev': {
+        'dialect': 'sqlite',
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 30,
+        'connect_args': {'check_same_thread': False, 'timeout': 30},
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'foreign_keys': 'ON',
+            'busy_timeout': 30000,
+        },
+    },
+    # One or two sync gunicorn workers on a small PostgreSQL instance
+    'postgres-small': {
+        'dialect': 'postgresql',
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        # Recycling replaces stale connections; skip the per-checkout ping round trip
+        'pool_pre_ping': False,
+        'query_cache_size': 500,
+        'connect_args': {'connect_timeout': 5, 'options': '-c statement_timeout=30000'},
+    },
+    # Many threaded workers: larger pool, fail fast when saturated, LIFO so idle extras time out
+    'postgres-high-concurrency': {
+        'dialect': 'postgresql',
+        'pool_size': 20,
+        'max_overflow': 20,
+        'pool_timeout': 5,
+        'pool_recycle': 1800,
+        'pool_pre_ping': False,
+        'pool_use_lifo': True,
+        'query_cache_size': 2000,
+        'connect_args': {'connect_timeout': 5, 'options': '-c statement_timeout=15000'},
+    },
+}
+
+# Environment variables overriding single settings of the chosen profile
+ENV_OVERRIDES = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', int),
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'DB_QUERY_CACHE_SIZE': ('query_cache_size', int),
+}
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(profile_name, database_url, environ=os.environ):
+    """SQLAlchemy engine options and SQLite pragmas for a profile, with environment overrides applied"""
+    if profile_name not in ENGINE_PROFILES:
+        raise ValueError(f'unknown DB_PROFILE {profile_name!r}; choose one of {", ".join(ENGINE_PROFILES)}')
+    options = dict(ENGINE_PROFILES[profile_name])
+    dialect = options.pop('dialect')
+    pragmas = options.pop('sqlite_pragmas', {})
+
+    for variable, (option, convert) in ENV_OVERRIDES.items():
+        if environ.get(variable):
+            options[option] = convert(environ[variable])
+
+    if database_url:
+        url = make_url(database_url)
+        if dialect and url.get_backend_name() != dialect:
+            raise ValueError(f'DB_PROFILE {profile_name!r} is meant for {dialect} databases, '
+                             f'DATABASE_URL is {url.get_backend_name()}')
+        # In-memory SQLite keeps its single-connection pool
+        if not _is_memory_sqlite(url):
+            options['poolclass'] = instrumented_pool(profile_name)
+    return options, pragmas
+
+def replica_binds(profile_name, replica_urls, environ=os.environ):
+    """SQLALCHEMY_BINDS entries (replica0, replica1, ...) for read replicas, tuned like the primary"""
+    binds = {}
+    for number, url in enumerate(replica_urls):
+        options, _ = engine_options(profile_name, url, environ)
+        if 'poolclass' in options:
+            options['poolclass'] = instrumented_pool(f'{profile_name}:replica{number}')
+        binds[f'replica{number}'] = dict(options, url=url)
+    return binds
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run PRAGMA statements on every new SQLite connection of engine"""
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
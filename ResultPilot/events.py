@@ -0,0 +1,196 @@
+import json
+import queue
+import threading
+from sqlalchemy import event
+from app import db
+
+try:
+    import redis
+except ImportError:  # optional, only needed when EVENTS_URL points at a Redis server
+    redis = None
+
+CHANNEL_PREFIX = 'srms:events:'
+# Dashboard deltas published when result writes commit
+RESULTS_CHANNEL = 'results'
+# Frames buffered per subscriber; one that falls further behind is told to resync instead
+SUBSCRIBER_QUEUE_SIZE = 100
+# Seconds between keepalive comments on an idle stream, and browser reconnect delay
+HEARTBEAT_SECONDS = 15
+RECONNECT_MS = 5000
+
+def sse_frame(event_name, data):
+    """One server-sent event; serialized once and shared by every subscriber"""
+    return f'event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n'
+
+RESYNC_FRAME = sse_frame('resync', {})
+
+class LocalSubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            # Dropping deltas would leave the dashboard wrong; replace the backlog with a resync
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(RESYNC_FRAME)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class LocalBroker:
+    """In-process pub/sub: reaches the streams served by this worker process only"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def publish(self, channel, frame):
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.channel == channel]
+        for subscription in subscriptions:
+            subscription.deliver(frame)
+
+    def subscribe(self, channel):
+        subscription = LocalSubscription(self, channel)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(CHANNEL_PREFIX + channel)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        return message['data'].decode() if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+class RedisBroker:
+    """Pub/sub through a Redis-compatible server, so every worker's streams see every write"""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('EVENTS_URL points at Redis but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, frame):
+        self.client.publish(CHANNEL_PREFIX + channel, frame)
+
+    def subscribe(self, channel):
+        return RedisSubscription(self.client, channel)
+
+broker = LocalBroker()
+
+def init_events(app):
+    """Pick the pub/sub backend from EVENTS_URL (redis://... or empty for in-process)"""
+    global broker
+    url = app.config.get('EVENTS_URL')
+    broker = RedisBroker(url) if url else LocalBroker()
+
+def publish(channel, event_name, data):
+    broker.publish(channel, sse_frame(event_name, data))
+
+def subscribe(channel):
+    return broker.subscribe(channel)
+
+def event_stream(subscription):
+    """Yield SSE frames from a subscription until the client disconnects"""
+    try:
+        yield f'retry: {RECONNECT_MS}\n\n'
+        while True:
+            frame = subscription.get(timeout=HEARTBEAT_SECONDS)
+            yield frame if frame is not None else ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+def publish_after_commit(channel, event_name, data):
+    """Publish an event when the current transaction commits; dropped if it rolls back"""
+    db.session.info.setdefault('pending_events', []).append((channel, event_name, data))
+
+def _grade_and_percentage(result):
+    return result.grade, result.percentage
+
+def result_changed(kind, result, previous=None):
+    """Queue the dashboard delta of a result 'added', 'updated' or 'deleted' in this transaction.
+
+    previous is the (grade, percentage) of an updated result before the change.
+    """
+    before = _grade_and_percentage(result) if kind == 'deleted' else previous
+    after = _grade_and_percentage(result) if kind != 'deleted' else None
+    grade_delta = {}
+    percentage_delta = 0.0
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        grade, percentage = state
+        if grade:
+            grade_delta[grade] = grade_delta.get(grade, 0) + sign
+        percentage_delta += sign * percentage
+    if result.id is None:
+        # Flush so a new result has its id
+        db.session.flush()
+    publish_after_commit(RESULTS_CHANNEL, 'result', {
+        'kind': kind,
+        'count_delta': {'added': 1, 'deleted': -1}.get(kind, 0),
+        'percentage_delta': percentage_delta,
+        'grade_delta': {grade: delta for grade, delta in grade_delta.items() if delta},
+        'result': {
+            'id': result.id,
+            'student_name': result.student.full_name,
+            'subject_name': result.subject.name,
+            'grade': result.grade,
+            'percentage': round(result.percentage, 2),
+            'created_at': result.created_at.isoformat() if result.created_at else None,
+        },
+    })
+
+def results_imported(rows):
+    """Queue one aggregate delta for bulk-inserted results (mappings with grade and percentage)"""
+    grade_delta = {}
+    percentage_delta = 0.0
+    count = 0
+    for row in rows:
+        count += 1
+        percentage_delta += row['percentage']
+        if row['grade']:
+            grade_delta[row['grade']] = grade_delta.get(row['grade'], 0) + 1
+    publish_after_commit(RESULTS_CHANNEL, 'result', {
+        'kind': 'imported', 'count_delta': count, 'percentage_delta': percentage_delta,
+        'grade_delta': grade_delta, 'result': None,
+    })
+
+def results_resync():
+    """Tell open dashboards to reload their aggregates after a change too broad for a delta"""
+    publish_after_commit(RESULTS_CHANNEL, 'resync', {})
+
+# Savepoints (begin_nested) fire the commit events too; only the outer transaction counts
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_pending_events(session):
+    if session.in_nested_transaction():
+        return
+    for channel, event_name, data in session.info.pop('pending_events', ()):
+        publish(channel, event_name, data)
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _drop_rolled_back_events(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('pending_events', None)
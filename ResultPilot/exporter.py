@@ -0,0 +1,75 @@
+import csv
+import io
+from datetime import datetime
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+from app import db
+from models import User, Subject, Result
+
+# Rows fetched from the server-side cursor per round-trip
+EXPORT_BATCH_SIZE = 1000
+
+# Leading characters that make spreadsheets evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_COLUMNS = [
+    ('Student ID', User.student_id),
+    ('First Name', User.first_name),
+    ('Last Name', User.last_name),
+    ('Subject Code', Subject.code),
+    ('Subject', Subject.name),
+    ('Credits', Subject.credits),
+    ('Marks Obtained', Result.marks_obtained),
+    ('Total Marks', Result.total_marks),
+    ('Percentage', Result.percentage),
+    ('Grade', Result.grade),
+    ('Semester', Result.semester),
+    ('Academic Year', Result.academic_year),
+    ('Exam Type', Result.exam_type),
+    ('Date', Result.created_at),
+]
+
+def export_query(*conditions):
+    """Plain column select over results joined to users and subjects, newest first"""
+    return select(*(column for _, column in EXPORT_COLUMNS)).select_from(Result).join(
+        User, Result.student_id == User.id
+    ).join(
+        Subject, Result.subject_id == Subject.id
+    ).where(*conditions).order_by(Result.created_at.desc(), Result.id.desc())
+
+def _format(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Names are user-entered; keep them as text when the file is opened in a spreadsheet
+        return "'" + value
+    return value
+
+def iter_csv(query):
+    """Yield CSV text a batch of rows at a time without materializing the result set"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue()
+
+    rows = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for batch in rows.partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            writer.writerow(_format(value) for value in row)
+        yield buffer.getvalue()
+
+def csv_response(query, filename):
+    """Streaming CSV download; the first bytes are sent before any result row is read.
+
+    filename may contain usernames; it is reduced to letters, digits, '_', '.' and '-'.
+    """
+    return Response(
+        stream_with_context(iter_csv(query)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename) or "export.csv"}"'}
+    )
@@ -1,8 +1,13 @@
+import re
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, FloatField, TextAreaField, DateField, IntegerField
-from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import (StringField, PasswordField, SelectField, FloatField, TextAreaField, DateField, IntegerField,
+                     HiddenField, SubmitField)
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, ValidationError
 from wtforms.widgets import TextArea
-from models import Subject, User
+from bulk import RESULT_ACTIONS
+from choices import (student_choice, student_choices, subject_choices, student_exists, subject_exists,
+                     use_student_search)
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -32,28 +37,87 @@ class SubjectForm(FlaskForm):
     description = TextAreaField('Description', validators=[Optional()])
     credits = IntegerField('Credits', validators=[Optional(), NumberRange(min=1, max=10)], default=3)
 
+EXAM_TYPES = [
+    ('Final', 'Final Exam'),
+    ('Mid-term', 'Mid-term Exam'),
+    ('Quiz', 'Quiz'),
+    ('Assignment', 'Assignment'),
+    ('Project', 'Project')
+]
+
 class ResultForm(FlaskForm):
-    student_id = SelectField('Student', coerce=int, validators=[DataRequired()])
-    subject_id = SelectField('Subject', coerce=int, validators=[DataRequired()])
+    # Ids are checked with a primary key lookup instead of against the choices: with
+    # many students the form only carries the selected one and searches for others
+    student_id = SelectField('Student', coerce=int, validators=[DataRequired()], validate_choice=False)
+    subject_id = SelectField('Subject', coerce=int, validators=[DataRequired()], validate_choice=False)
     marks_obtained = FloatField('Marks Obtained', validators=[DataRequired(), NumberRange(min=0)])
     total_marks = FloatField('Total Marks', validators=[DataRequired(), NumberRange(min=1)], default=100.0)
     semester = StringField('Semester', validators=[DataRequired(), Length(max=20)])
     academic_year = StringField('Academic Year', validators=[DataRequired(), Length(max=20)])
-    exam_type = SelectField('Exam Type', choices=[
-        ('Final', 'Final Exam'),
-        ('Mid-term', 'Mid-term Exam'),
-        ('Quiz', 'Quiz'),
-        ('Assignment', 'Assignment'),
-        ('Project', 'Project')
-    ], default='Final')
+    exam_type = SelectField('Exam Type', choices=EXAM_TYPES, default='Final')
     remarks = TextAreaField('Remarks', validators=[Optional()])
     
     def __init__(self, *args, **kwargs):
         super(ResultForm, self).__init__(*args, **kwargs)
-        self.student_id.choices = [(s.id, f"{s.full_name} ({s.student_id or s.username})") 
-                                  for s in User.query.filter_by(role='student').all()]
-        self.subject_id.choices = [(s.id, f"{s.name} ({s.code})") 
-                                  for s in Subject.query.all()]
+        self.student_search = use_student_search()
+        if self.student_search:
+            selected = student_choice(self.student_id.data) if self.student_id.data else None
+            self.student_id.choices = [selected] if selected else []
+        else:
+            self.student_id.choices = student_choices()
+        self.subject_id.choices = subject_choices()
+    
+    def validate_student_id(self, field):
+        if not student_exists(field.data):
+            raise ValidationError('Choose an existing student.')
+    
+    def validate_subject_id(self, field):
+        if not subject_exists(field.data):
+            raise ValidationError('Choose an existing subject.')
+
+class ResultImportForm(FlaskForm):
+    file = FileField('Results File', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'json', 'jsonl'], 'Upload a CSV or JSON file.')
+    ])
+
+class BulkResultForm(FlaskForm):
+    semester = StringField('Semester', validators=[Optional(), Length(max=20)])
+    academic_year = StringField('Academic Year', validators=[Optional(), Length(max=20)])
+    exam_type = SelectField('Exam Type', choices=[('', 'Any Exam Type')] + EXAM_TYPES, default='')
+    subject_id = SelectField('Subject', coerce=int, default=0)
+    action = SelectField('Action', choices=RESULT_ACTIONS)
+    factor = FloatField('Scale Factor', validators=[Optional(), NumberRange(min=0.01)])
+    total_marks = FloatField('New Total Marks', validators=[Optional(), NumberRange(min=1)])
+    new_semester = StringField('New Semester', validators=[Optional(), Length(max=20)])
+    expected = HiddenField()  # matched count of the preview being applied
+    preview = SubmitField('Preview')
+    apply = SubmitField('Apply')
+    
+    def __init__(self, *args, **kwargs):
+        super(BulkResultForm, self).__init__(*args, **kwargs)
+        self.subject_id.choices = [(0, 'Any Subject')] + subject_choices()
+    
+    def action_value(self):
+        """The factor, total marks or semester the chosen action needs"""
+        return {
+            'scale_marks': self.factor.data,
+            'set_total_marks': self.total_marks.data,
+            'set_semester': self.new_semester.data,
+        }.get(self.action.data)
+
+class BulkStudentDeleteForm(FlaskForm):
+    identifiers = TextAreaField('Student IDs or Usernames', validators=[Optional()])
+    student_id_prefix = StringField('Student ID Prefix', validators=[Optional(), Length(max=20)])
+    expected = HiddenField()
+    preview = SubmitField('Preview')
+    apply = SubmitField('Delete Students')
+    
+    def identifier_list(self):
+        return re.split(r'[\s,;]+', (self.identifiers.data or '').strip()) if self.identifiers.data else []
+
+class ReportCardForm(FlaskForm):
+    semester = SelectField('Semester', validators=[DataRequired()])
 
 class ProfileForm(FlaskForm):
     first_name = StringField('First Name', validators=[DataRequired(), Length(max=50)])
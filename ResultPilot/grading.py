@@ -0,0 +1,251 @@
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, or_, select, update
+from app import db
+from analytics import rebuild_grade_stats
+from cache import invalidate, version
+from models import Result, GradeScheme, GradeBoundary, DEFAULT_GRADE_SCALE
+from snapshots import snapshot_stale
+from events import results_resync
+
+# Cache namespace bumped whenever grade schemes change; with a per-process cache
+# only the writing process sees the bump
+SCHEMES_NAMESPACE = 'grade-schemes'
+
+# Seconds between checks for scheme changes made by other processes, e.g. the CLI
+SCHEMES_CHECK_INTERVAL = 5
+
+class CompiledScheme:
+    """A grade scale compiled into ascending thresholds for bisect lookups"""
+
+    def __init__(self, scale):
+        ordered = sorted(scale)
+        if not ordered:
+            raise ValueError('a grade scheme needs at least one boundary')
+        self.thresholds = [minimum for minimum, _, _ in ordered]
+        self.grades = [grade for _, grade, _ in ordered]
+        self.points = {grade: points for _, grade, points in ordered}
+
+    def grade(self, percentage):
+        # Percentages below the lowest boundary get the lowest grade
+        return self.grades[max(bisect_right(self.thresholds, percentage) - 1, 0)]
+
+    def grade_expression(self, percentage):
+        whens = [(percentage >= minimum, grade)
+                 for minimum, grade in zip(reversed(self.thresholds[1:]), reversed(self.grades[1:]))]
+        return case(*whens, else_=self.grades[0]) if whens else literal(self.grades[0])
+
+    def points_expression(self, grade):
+        return case(self.points, value=grade, else_=0.0)
+
+def _scope(subject_id, academic_year):
+    conditions = []
+    if subject_id is not None:
+        conditions.append(Result.subject_id == subject_id)
+    if academic_year is not None:
+        conditions.append(Result.academic_year == academic_year)
+    return and_(*conditions)
+
+class SchemeSet:
+    """The default scale plus schemes scoped to a subject, an academic year or both.
+
+    The most specific scheme wins: subject and year, then subject, then year.
+    """
+
+    def __init__(self, default, scoped):
+        self.default = default
+        self.scoped = scoped  # (subject_id, academic_year) -> CompiledScheme
+
+    def scheme_for(self, subject_id=None, academic_year=None):
+        for key in ((subject_id, academic_year), (subject_id, None), (None, academic_year)):
+            scheme = self.scoped.get(key)
+            if scheme is not None:
+                return scheme
+        return self.default
+
+    def grade(self, percentage, subject_id=None, academic_year=None):
+        return self.scheme_for(subject_id, academic_year).grade(percentage)
+
+    def points(self, grade, subject_id=None, academic_year=None):
+        return self.scheme_for(subject_id, academic_year).points.get(grade, 0.0)
+
+    def grade_letters(self):
+        """Default grades best first, followed by any grades only scoped schemes use"""
+        letters = list(reversed(self.default.grades))
+        for scheme in self.scoped.values():
+            letters.extend(grade for grade in reversed(scheme.grades) if grade not in letters)
+        return letters
+
+    def _by_specificity(self):
+        return sorted(self.scoped.items(), key=lambda item: (item[0][0] is not None, item[0][1] is not None),
+                      reverse=True)
+
+    def grade_expression(self, percentage=None):
+        """SQL CASE giving each result its grade under the scheme that applies to it.
+
+        percentage defaults to the stored percentage; bulk edits pass the new one.
+        """
+        percentage = Result.percentage if percentage is None else percentage
+        default = self.default.grade_expression(percentage)
+        if not self.scoped:
+            return default
+        return case(*((_scope(*key), scheme.grade_expression(percentage))
+                      for key, scheme in self._by_specificity()), else_=default)
+
+    def points_expression(self):
+        """SQL CASE giving each result the grade points of its stored grade"""
+        default = self.default.points_expression(Result.grade)
+        if not self.scoped:
+            return default
+        return case(*((_scope(*key), scheme.points_expression(Result.grade))
+                      for key, scheme in self._by_specificity()), else_=default)
+
+_compiled = None  # (schemes version, table signature, checked at, SchemeSet)
+_lock = threading.Lock()
+
+def _schemes_signature():
+    return tuple(db.session.execute(select(func.count(GradeScheme.id), func.max(GradeScheme.updated_at))).one())
+
+def _compile_schemes():
+    default = CompiledScheme(DEFAULT_GRADE_SCALE)
+    scoped = {}
+    for scheme in GradeScheme.query.all():
+        compiled = CompiledScheme(
+            (boundary.min_percentage, boundary.grade, boundary.points) for boundary in scheme.boundaries
+        )
+        if scheme.subject_id is None and scheme.academic_year is None:
+            default = compiled
+        else:
+            scoped[(scheme.subject_id, scheme.academic_year)] = compiled
+    return SchemeSet(default, scoped)
+
+def grade_schemes():
+    """The compiled grade schemes.
+
+    Changes made through this process are seen at once; changes made by other
+    processes, such as 'flask set-grade-scheme', are picked up by comparing the
+    grade_schemes table signature at most every SCHEMES_CHECK_INTERVAL seconds.
+    """
+    global _compiled
+    current = version(SCHEMES_NAMESPACE)
+    now = time.monotonic()
+    with _lock:
+        if _compiled is not None and _compiled[0] == current and now - _compiled[2] < SCHEMES_CHECK_INTERVAL:
+            return _compiled[3]
+        signature = _schemes_signature()
+        if _compiled is not None and _compiled[:2] == (current, signature):
+            schemes = _compiled[3]
+        else:
+            schemes = _compile_schemes()
+        _compiled = (current, signature, now, schemes)
+        return schemes
+
+def grade_for(percentage, subject_id=None, academic_year=None):
+    return grade_schemes().grade(percentage, subject_id, academic_year)
+
+def parse_scale(text):
+    """Parse 'A+:90:4.0,A:80:3.7,...,F:0:0' into (minimum, grade, points) tuples"""
+    scale = []
+    for part in text.split(','):
+        fields = [field.strip() for field in part.split(':')]
+        if len(fields) not in (2, 3) or not fields[0]:
+            raise ValueError(f'boundary {part.strip()!r} is not GRADE:MIN_PERCENTAGE[:POINTS]')
+        try:
+            minimum = float(fields[1])
+            points = float(fields[2]) if len(fields) == 3 else 0.0
+        except ValueError:
+            raise ValueError(f'boundary {part.strip()!r} has a non-numeric percentage or points')
+        scale.append((minimum, fields[0], points))
+    return scale
+
+def save_scheme(name, scale, subject_id=None, academic_year=None):
+    """Create or replace the scheme for a scope; scale is (minimum, grade, points) tuples"""
+    grades = [grade for _, grade, _ in scale]
+    minimums = [minimum for minimum, _, _ in scale]
+    if not scale:
+        raise ValueError('a grade scheme needs at least one boundary')
+    if len(set(grades)) != len(grades) or len(set(minimums)) != len(minimums):
+        raise ValueError('grades and minimum percentages must be unique')
+    if any(minimum < 0 or minimum > 100 for minimum in minimums):
+        raise ValueError('minimum percentages must be between 0 and 100')
+    if min(minimums) != 0:
+        raise ValueError('the lowest boundary must start at 0%')
+    if any(len(grade) > 5 for grade in grades):
+        raise ValueError('grades are at most 5 characters')
+
+    scheme = GradeScheme.query.filter_by(subject_id=subject_id, academic_year=academic_year).first()
+    if scheme is None:
+        scheme = GradeScheme(subject_id=subject_id, academic_year=academic_year)
+        db.session.add(scheme)
+    scheme.name = name
+    # Replacing only the boundaries would not update the row itself
+    scheme.updated_at = datetime.utcnow()
+    scheme.boundaries = [
+        GradeBoundary(grade=grade, min_percentage=minimum, points=points) for minimum, grade, points in scale
+    ]
+    db.session.commit()
+    invalidate(SCHEMES_NAMESPACE)
+    return scheme
+
+def delete_scheme(name):
+    """Remove a scheme; its results fall back to the next most specific scheme"""
+    scheme = GradeScheme.query.filter_by(name=name).first()
+    if scheme is None:
+        return False
+    db.session.delete(scheme)
+    db.session.commit()
+    invalidate(SCHEMES_NAMESPACE)
+    return True
+
+def _regraded(student_ids):
+    """Bring grade_stats, snapshots and live dashboards in line with rewritten grades, and commit"""
+    rebuild_grade_stats()
+    for student_id in student_ids:
+        snapshot_stale(student_id)
+    results_resync()
+    db.session.commit()
+    invalidate('reports')
+
+def regrade(*conditions, chunk_size=None):
+    """Recompute the stored grade of results matching conditions under the current schemes.
+
+    Runs a single set-based UPDATE, or with chunk_size one UPDATE per id range of
+    that width, each committed, to keep locks short on large tables. Only rows
+    whose grade changes are written. If a chunk fails, the summary tables are
+    still rebuilt for the chunks committed before it. Returns the number of
+    changed results.
+    """
+    new_grade = grade_schemes().grade_expression()
+    changed = [*conditions, or_(Result.grade.is_(None), Result.grade != new_grade)]
+    student_ids = db.session.execute(select(Result.student_id).where(*changed).distinct()).scalars().all()
+
+    id_ranges = [None]
+    if chunk_size:
+        low, high = db.session.execute(select(func.min(Result.id), func.max(Result.id)).where(*conditions)).one()
+        id_ranges = [] if low is None else [
+            (start, start + chunk_size - 1) for start in range(low, high + 1, chunk_size)
+        ]
+
+    total = committed = 0
+    try:
+        for id_range in id_ranges:
+            statement = update(Result).where(*changed).values(grade=new_grade)
+            if id_range is not None:
+                statement = statement.where(Result.id.between(*id_range))
+            total += db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+            if id_range is not None:
+                db.session.commit()
+                committed = total
+    except Exception:
+        db.session.rollback()
+        if committed:
+            _regraded(student_ids)
+        raise
+
+    if total:
+        _regraded(student_ids)
+    else:
+        db.session.commit()
+    return total
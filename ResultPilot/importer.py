@@ -0,0 +1,207 @@
+import csv
+import io
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from models import User, Subject, Result
+from analytics import record_results_bulk
+from events import results_imported
+from cache import invalidate
+from grading import grade_schemes
+
+DEFAULT_CHUNK_SIZE = 1000
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    duplicates: int = 0
+    errors: list = field(default_factory=list)  # (row number, message), including duplicates
+    parse_error: str = None  # why reading the file stopped early, e.g. malformed JSON or bad encoding
+
+def iter_records(stream, fmt):
+    """Yield (row number, record dict) from a text stream of CSV, JSON Lines or a JSON array"""
+    if fmt == 'csv':
+        # Row 1 is the header, so data rows start at 2 like in a spreadsheet
+        for number, record in enumerate(csv.DictReader(stream), start=2):
+            yield number, record
+        return
+
+    first = stream.read(1)
+    while first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        # A JSON array has to be parsed whole; JSON Lines files are streamed
+        for number, record in enumerate(json.loads(first + stream.read()), start=1):
+            yield number, record
+        return
+    for number, line in enumerate(_prepend(first, stream), start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError:
+                yield number, None
+
+def _prepend(first, stream):
+    lines = iter(stream)
+    yield first + next(lines, '')
+    yield from lines
+
+def _lookup_maps():
+    """Student ID -> users.id, username -> users.id and subject code -> subjects.id, loading only key columns"""
+    by_student_id, by_username = {}, {}
+    for user_id, student_id, username in db.session.execute(
+        select(User.id, User.student_id, User.username).where(User.role == 'student')
+    ):
+        by_username[username] = user_id
+        if student_id:
+            by_student_id[student_id] = user_id
+    subjects = dict(db.session.execute(select(Subject.code, Subject.id)).all())
+    return (by_student_id, by_username), subjects
+
+def _student(key, students):
+    """users.id for a student ID or username; a key that is one student's ID and another's username is refused"""
+    by_student_id, by_username = students
+    matches = {by_student_id.get(key), by_username.get(key)} - {None}
+    if not matches:
+        raise ValueError(f'unknown student {key!r}')
+    if len(matches) > 1:
+        raise ValueError(f'student {key!r} is both a student ID and another student\'s username')
+    return matches.pop()
+
+def _text(record, key, default=None):
+    value = record.get(key)
+    if value is None or str(value).strip() == '':
+        return default
+    return str(value).strip()
+
+def _parse(record, students, subjects, schemes):
+    """Turn one input record into a results row, raising ValueError with a readable message"""
+    if not isinstance(record, dict):
+        raise ValueError('row is not a valid JSON object')
+    student_key = _text(record, 'student')
+    subject_key = _text(record, 'subject')
+    student_id = _student(student_key, students)
+    if subject_key not in subjects:
+        raise ValueError(f'unknown subject {subject_key!r}')
+
+    try:
+        marks_obtained = float(_text(record, 'marks_obtained'))
+        total_marks = float(_text(record, 'total_marks', 100.0))
+    except (TypeError, ValueError):
+        raise ValueError('marks_obtained and total_marks must be numbers')
+    if not (math.isfinite(marks_obtained) and math.isfinite(total_marks)):
+        raise ValueError('marks_obtained and total_marks must be finite numbers')
+    if marks_obtained < 0 or total_marks < 1:
+        raise ValueError('marks_obtained must be >= 0 and total_marks >= 1')
+
+    semester = _text(record, 'semester')
+    academic_year = _text(record, 'academic_year')
+    if not semester or not academic_year:
+        raise ValueError('semester and academic_year are required')
+
+    percentage = marks_obtained * 100.0 / total_marks
+    now = datetime.utcnow()
+    return {
+        'student_id': student_id,
+        'subject_id': subjects[subject_key],
+        'marks_obtained': marks_obtained,
+        'total_marks': total_marks,
+        'grade': schemes.grade(percentage, subjects[subject_key], academic_year),
+        'semester': semester,
+        'academic_year': academic_year,
+        'exam_type': _text(record, 'exam_type', 'Final'),
+        'remarks': _text(record, 'remarks'),
+        'created_at': now,
+        'updated_at': now,
+    }
+
+def _result_key(row):
+    return (row['student_id'], row['subject_id'], row['semester'], row['exam_type'])
+
+def _insert_chunk(rows, report):
+    """Drop rows whose key already exists, insert the rest with one executemany and commit"""
+    keys = {_result_key(row) for row in rows.values()}
+    existing = set(db.session.execute(
+        select(Result.student_id, Result.subject_id, Result.semester, Result.exam_type)
+        .where(tuple_(Result.student_id, Result.subject_id, Result.semester, Result.exam_type).in_(keys))
+    ).tuples())
+
+    new_rows = []
+    for number, row in rows.items():
+        if _result_key(row) in existing:
+            report.duplicates += 1
+            report.errors.append((number, 'result already exists for this student, subject, semester and exam type'))
+        else:
+            new_rows.append(row)
+    if not new_rows:
+        return
+
+    db.session.execute(insert(Result), new_rows)
+    # Same operation order as _parse and Result.percentage, so the summary sums match
+    rows_with_percentage = [{**row, 'percentage': row['marks_obtained'] * 100.0 / row['total_marks']}
+                            for row in new_rows]
+    record_results_bulk(rows_with_percentage)
+    results_imported(rows_with_percentage)
+    db.session.commit()
+    report.inserted += len(new_rows)
+
+def import_results(stream, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import results from a CSV or JSON text stream in chunks, returning an ImportReport.
+
+    Records need student (student ID or username), subject (code), marks_obtained,
+    semester and academic_year; total_marks, exam_type and remarks are optional.
+    Each chunk is committed on its own, so earlier chunks stay imported if a later
+    one fails.
+    """
+    if fmt not in ('csv', 'json'):
+        raise ValueError(f'unsupported format {fmt!r}')
+
+    report = ImportReport()
+    students, subjects = _lookup_maps()
+    schemes = grade_schemes()
+    seen = set()
+    records = iter_records(stream, fmt)
+
+    while True:
+        try:
+            chunk = list(islice(records, chunk_size))
+        except (ValueError, csv.Error) as e:
+            # JSONDecodeError and UnicodeDecodeError are ValueErrors; chunks already read stay imported
+            report.parse_error = f'{e.__class__.__name__}: {e}'
+            break
+        if not chunk:
+            break
+        rows = {}
+        for number, record in chunk:
+            try:
+                row = _parse(record, students, subjects, schemes)
+            except ValueError as e:
+                report.errors.append((number, str(e)))
+                continue
+            if _result_key(row) in seen:
+                report.duplicates += 1
+                report.errors.append((number, 'duplicate of an earlier row in this file'))
+                continue
+            seen.add(_result_key(row))
+            rows[number] = row
+        if rows:
+            try:
+                _insert_chunk(rows, report)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                report.errors.extend((number, f'chunk not imported: {e.__class__.__name__}') for number in rows)
+
+    if report.inserted:
+        invalidate('reports')
+    return report
+
+def import_results_file(file_storage, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import an uploaded file, picking the format from its extension"""
+    fmt = 'json' if file_storage.filename.lower().endswith(('.json', '.jsonl')) else 'csv'
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return import_results(stream, fmt, chunk_size)
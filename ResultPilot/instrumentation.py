@@ -0,0 +1,216 @@
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from flask import Response, abort, current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+# Statements kept per request for the slow request log
+MAX_LOGGED_STATEMENTS = 100
+
+class Histogram:
+    """Cumulative Prometheus-style histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{label_text}}} {series["count"]}')
+        return lines
+
+# Metrics are kept per process; with several gunicorn workers each one is scraped separately
+REQUEST_LATENCY = Histogram('srms_request_duration_seconds', 'Total request latency',
+                            ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+REQUEST_QUERIES = Histogram('srms_request_queries', 'SQL statements issued per request',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram('srms_request_db_seconds', 'Time spent executing SQL per request',
+                            ('endpoint',), LATENCY_BUCKETS)
+REQUEST_TEMPLATE_TIME = Histogram('srms_request_template_seconds', 'Time spent rendering templates per request',
+                                  ('endpoint',), LATENCY_BUCKETS)
+POOL_CHECKOUT_WAIT = Histogram('srms_db_pool_checkout_wait_seconds',
+                               'Time to obtain a pooled connection, including opening a new one',
+                               ('profile',), POOL_WAIT_BUCKETS)
+HISTOGRAMS = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, REQUEST_TEMPLATE_TIME, POOL_CHECKOUT_WAIT]
+
+_pool_timeouts = {}
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited and how often it timed out"""
+
+    profile = 'default'
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            _pool_timeouts[self.profile] = _pool_timeouts.get(self.profile, 0) + 1
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe((self.profile,), time.perf_counter() - start)
+
+def instrumented_pool(profile):
+    """Pool class for an engine whose metrics are labelled with profile"""
+    return type('InstrumentedQueuePool', (InstrumentedQueuePool,), {'profile': profile})
+
+def _pool_gauges(pool):
+    """Point-in-time pool occupancy; saturation is checked out connections over pool_size + max_overflow"""
+    if not isinstance(pool, InstrumentedQueuePool):
+        return []
+    capacity = pool.size() + pool._max_overflow if pool._max_overflow >= 0 else 0
+    label = f'{{profile="{pool.profile}"}}'
+    values = [
+        ('srms_db_pool_size', 'gauge', 'Configured pool size', pool.size()),
+        ('srms_db_pool_checked_out', 'gauge', 'Connections currently checked out', pool.checkedout()),
+        ('srms_db_pool_overflow', 'gauge', 'Connections open beyond the pool size', max(pool.overflow(), 0)),
+        ('srms_db_pool_saturation', 'gauge', 'Checked out connections as a share of the pool capacity',
+         round(pool.checkedout() / capacity, 4) if capacity else 0),
+        ('srms_db_pool_checkout_timeouts_total', 'counter', 'Checkouts that gave up waiting',
+         _pool_timeouts.get(pool.profile, 0)),
+    ]
+    lines = []
+    for name, kind, help_text, value in values:
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name}{label} {value}'])
+    return lines
+
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and conn.info.get('query_start'):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        g.db_time = g.get('db_time', 0.0) + elapsed
+        if current_app.config.get('SLOW_REQUEST_MS'):
+            statements = g.setdefault('statements', [])
+            if len(statements) < MAX_LOGGED_STATEMENTS:
+                statements.append((elapsed, statement))
+
+def _statement_failed(context):
+    # A failed statement gets no after_cursor_execute; drop its start time
+    if has_request_context() and context.connection is not None and context.statement is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+def _before_render(sender, template, context, **extra):
+    g.template_start = time.perf_counter()
+
+def _after_render(sender, template, context, **extra):
+    start = g.pop('template_start', None)
+    if start is not None:
+        g.template_time = g.get('template_time', 0.0) + time.perf_counter() - start
+
+def query_budget(limit):
+    """Declare the maximum number of SQL statements a view may issue per request"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return f(*args, **kwargs)
+        decorated_function.query_budget = limit
+        return decorated_function
+    return decorator
+
+def render_metrics(pool=None):
+    """All histograms, plus occupancy gauges for pool, in Prometheus text exposition format"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    if pool is not None:
+        lines.extend(_pool_gauges(pool))
+    return '\n'.join(lines) + '\n'
+
+def metrics_allowed():
+    """True when the request presents METRICS_TOKEN as a bearer token or comes from METRICS_ALLOWED_IPS"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if token and authorization.startswith('Bearer ') and hmac.compare_digest(authorization[7:].encode(), token.encode()):
+        return True
+    return request.remote_addr in current_app.config.get('METRICS_ALLOWED_IPS', ())
+
+def init_instrumentation(app):
+    """Record per-request SQL, template and latency metrics and enforce query budgets"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_statement):
+        event.listen(Engine, 'before_cursor_execute', _before_statement)
+        event.listen(Engine, 'after_cursor_execute', _after_statement)
+        event.listen(Engine, 'handle_error', _statement_failed)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        elapsed = time.perf_counter() - start
+        count = g.get('query_count', 0)
+        db_time = g.get('db_time', 0.0)
+        REQUEST_LATENCY.observe((endpoint, request.method, str(response.status_code)), elapsed)
+        REQUEST_QUERIES.observe((endpoint,), count)
+        REQUEST_DB_TIME.observe((endpoint,), db_time)
+        REQUEST_TEMPLATE_TIME.observe((endpoint,), g.get('template_time', 0.0))
+
+        threshold = app.config.get('SLOW_REQUEST_MS')
+        if threshold and elapsed * 1000 >= threshold:
+            statements = '\n'.join(
+                f'  [{duration * 1000:.1f} ms] {statement}' for duration, statement in g.get('statements', [])
+            )
+            logging.warning('Slow request %s %s: %.1f ms total, %d queries, %.1f ms in database\n%s',
+                            request.method, request.full_path, elapsed * 1000, count, db_time * 1000, statements)
+
+        if app.config.get('ENFORCE_QUERY_BUDGET', app.testing):
+            view = app.view_functions.get(request.endpoint)
+            limit = getattr(view, 'query_budget', None)
+            if limit is not None and count > limit:
+                raise AssertionError(
+                    f'{request.endpoint} issued {count} SQL statements, budget is {limit}'
+                )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if not metrics_allowed():
+            abort(403)
+        pool = app.extensions['sqlalchemy'].engine.pool
+        return Response(render_metrics(pool), mimetype='text/plain; version=0.0.4')
@@ -1,5 +1,11 @@
 from app import app
 import routes
+import commands
 
 if __name__ == "__main__":
+    # Development server only: production runs 'flask init-db' once instead of on every boot
+    from schema import init_db, seed_admin
+    with app.app_context():
+        init_db()
+        seed_admin()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -1,9 +1,23 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import case
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import contains_eager, joinedload
 from app import db
 
+# Default grade scale as (minimum percentage, grade, grade points); GradeScheme
+# rows override it per subject and/or academic year (see grading.py)
+DEFAULT_GRADE_SCALE = [
+    (90, 'A+', 4.0), (80, 'A', 3.7), (70, 'B+', 3.3), (60, 'B', 3.0),
+    (50, 'C+', 2.7), (40, 'C', 2.3), (0, 'F', 0.0),
+]
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset pagination of the students listing by (last_name, id)
+        db.Index('ix_users_role_last_name', 'role', 'last_name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -53,6 +67,18 @@ class Subject(db.Model):
 
 class Result(db.Model):
     __tablename__ = 'results'
+    __table_args__ = (
+        # One result per student, subject, semester and exam type; also serves lookups by student
+        db.Index('uq_results_student_subject_semester_exam',
+                 'student_id', 'subject_id', 'semester', 'exam_type', unique=True),
+        db.Index('ix_results_student_created', 'student_id', 'created_at'),
+        db.Index('ix_results_semester_created', 'semester', 'created_at'),
+        db.Index('ix_results_subject_id', 'subject_id'),
+        db.Index('ix_results_created_id', 'created_at', 'id'),
+        db.Index('ix_results_grade', 'grade'),
+        # Incremental refresh of the columnar analytics snapshot
+        db.Index('ix_results_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -70,32 +96,42 @@ class Result(db.Model):
     def __repr__(self):
         return f'<Result {self.student.username} - {self.subject.name}>'
     
-    @property
+    @hybrid_property
     def percentage(self):
-        return (self.marks_obtained / self.total_marks) * 100 if self.total_marks > 0 else 0
+        # Same operation order as the SQL expression so both agree on grade boundaries
+        return self.marks_obtained * 100.0 / self.total_marks if self.total_marks > 0 else 0
+    
+    @percentage.expression
+    def percentage(cls):
+        return case((cls.total_marks > 0, cls.marks_obtained * 100.0 / cls.total_marks), else_=0.0)
     
     def calculate_grade(self):
-        percentage = self.percentage
-        if percentage >= 90:
-            return 'A+'
-        elif percentage >= 80:
-            return 'A'
-        elif percentage >= 70:
-            return 'B+'
-        elif percentage >= 60:
-            return 'B'
-        elif percentage >= 50:
-            return 'C+'
-        elif percentage >= 40:
-            return 'C'
-        else:
-            return 'F'
+        from grading import grade_for
+        return grade_for(self.percentage, self.subject_id, self.academic_year)
     
     def save(self):
+        from analytics import record_result
+        from events import result_changed
+        is_new = self.id is None
         self.grade = self.calculate_grade()
         db.session.add(self)
+        if is_new:
+            record_result(self)
+            result_changed('added', self)
         db.session.commit()
 
+# Named eager-loading profiles for queries whose rows render related objects
+RESULT_LOAD_PROFILES = {
+    # Query already joined to users and subjects (admin results listing)
+    'joined_listing': lambda: (contains_eager(Result.student), contains_eager(Result.subject)),
+    # A few rows showing student and subject names (dashboard recent results)
+    'with_student_and_subject': lambda: (joinedload(Result.student), joinedload(Result.subject)),
+}
+
+def load_profile(name):
+    """Loader options for a named profile, for use with query.options(*...)"""
+    return RESULT_LOAD_PROFILES[name]()
+
 class Semester(db.Model):
     __tablename__ = 'semesters'
     
@@ -108,3 +144,144 @@ class Semester(db.Model):
     
     def __repr__(self):
         return f'<Semester {self.name}>'
+
+class GradeScheme(db.Model):
+    __tablename__ = 'grade_schemes'
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'academic_year', name='uq_grade_schemes_scope'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    # Scope: a subject, an academic year, both, or neither for the default scale
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'))
+    academic_year = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set whenever the scheme or its boundaries are saved; workers reload schemes when it moves
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    subject = db.relationship('Subject')
+    boundaries = db.relationship('GradeBoundary', backref='scheme', lazy='selectin',
+                                 cascade='all, delete-orphan',
+                                 order_by='GradeBoundary.min_percentage.desc()')
+    
+    def __repr__(self):
+        return f'<GradeScheme {self.name}>'
+
+class GradeBoundary(db.Model):
+    __tablename__ = 'grade_boundaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scheme_id = db.Column(db.Integer, db.ForeignKey('grade_schemes.id', ondelete='CASCADE'), nullable=False)
+    grade = db.Column(db.String(5), nullable=False)
+    min_percentage = db.Column(db.Float, nullable=False)
+    points = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f'<GradeBoundary {self.grade} >= {self.min_percentage}>'
+
+class ReportJob(db.Model):
+    __tablename__ = 'report_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    semester = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    total_students = db.Column(db.Integer, nullable=False, default=0)
+    processed_students = db.Column(db.Integer, nullable=False, default=0)
+    artifact_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+    
+    @property
+    def progress(self):
+        if not self.total_students:
+            return 100 if self.status == 'completed' else 0
+        return round(self.processed_students / self.total_students * 100)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'semester': self.semester,
+            'status': self.status,
+            'total_students': self.total_students,
+            'processed_students': self.processed_students,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+    
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.semester} {self.status}>'
+
+class StudentStat(db.Model):
+    __tablename__ = 'student_stats'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    result_count = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    avg_percentage = db.Column(db.Float, nullable=False, default=0.0, index=True)
+    
+    def __repr__(self):
+        return f'<StudentStat {self.student_id}>'
+
+class StudentSnapshot(db.Model):
+    __tablename__ = 'student_snapshots'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    data = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StudentSnapshot {self.student_id}>'
+
+class SubjectStat(db.Model):
+    __tablename__ = 'subject_stats'
+    
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True)
+    result_count = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f'<SubjectStat {self.subject_id}>'
+
+class GradeStat(db.Model):
+    __tablename__ = 'grade_stats'
+    
+    grade = db.Column(db.String(5), primary_key=True)
+    result_count = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f'<GradeStat {self.grade}>'
+
+class ResultRollup(db.Model):
+    __tablename__ = 'result_rollups'
+    
+    # Results per UTC day or month of created_at and subject, for time-series charts
+    granularity = db.Column(db.String(5), primary_key=True)  # 'day' or 'month'
+    bucket = db.Column(db.Date, primary_key=True)  # first day of the bucket
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), primary_key=True)
+    result_count = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def __repr__(self):
+        return f'<ResultRollup {self.granularity} {self.bucket} {self.subject_id}>'
+
+class StudentIdCounter(db.Model):
+    __tablename__ = 'student_id_counters'
+    
+    # Next number of the year's STU<year><number> student IDs (databases without sequences)
+    year = db.Column(db.Integer, primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<StudentIdCounter {self.year} {self.next_value}>'
@@ -0,0 +1,109 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+from replicas import reading_from_replicas, replica_cache_ttl
+
+# Seconds a listing total is reused before being counted again
+COUNT_CACHE_TTL = 60
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+def encode_cursor(values):
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor into key values typed like columns; None if it is malformed"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(payload) != len(columns):
+            return None
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for value, column in zip(payload, columns)
+        ]
+    except (ValueError, TypeError):
+        return None
+
+def cached_count(query, cache_key, ttl=COUNT_CACHE_TTL):
+    """Row count of query, recomputed at most once per ttl seconds for the same cache_key"""
+    if reading_from_replicas():
+        # Counted on a replica: kept apart from primary counts and only until replicas catch up
+        cache_key, ttl = cache_key + ('replica',), replica_cache_ttl(ttl)
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(cache_key)
+    if cached and now - cached[1] < ttl:
+        return cached[0]
+    total = query.order_by(None).count()
+    with _count_lock:
+        _count_cache[cache_key] = (total, now)
+    return total
+
+def invalidate_counts(listing):
+    """Forget cached totals for a listing ('students' or 'results') after its rows change"""
+    with _count_lock:
+        for key in [key for key in _count_cache if key[0] == listing]:
+            del _count_cache[key]
+
+class KeysetPage:
+    """One page of a keyset-paginated query plus cursors for its neighbours"""
+
+    def __init__(self, items, per_page, total, next_cursor, prev_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def keyset_paginate(query, key_columns, per_page, after=None, before=None, descending=False,
+                    count_key=None):
+    """Paginate query by seeking past the key of the last row seen instead of using OFFSET.
+
+    key_columns must uniquely order the rows (end with the primary key) and share
+    one direction. after/before are cursors from a previous page's next_cursor and
+    prev_cursor. When count_key is given the total is counted and cached under it.
+    """
+    key = tuple_(*key_columns)
+    forward = before is None
+    cursor = decode_cursor(after if forward else before, key_columns) if (after or before) else None
+
+    page_query = query
+    if cursor is not None:
+        # Moving forward in a descending listing means smaller keys, and vice versa
+        if forward == descending:
+            page_query = page_query.filter(key < tuple_(*cursor))
+        else:
+            page_query = page_query.filter(key > tuple_(*cursor))
+    reverse_order = forward == descending
+    order = [column.desc() if reverse_order else column.asc() for column in key_columns]
+    rows = page_query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    def row_cursor(row):
+        return encode_cursor([getattr(row, column.key) for column in key_columns])
+
+    has_next = has_more if forward else cursor is not None
+    has_prev = cursor is not None if forward else has_more
+    total = cached_count(query, count_key) if count_key is not None else None
+    return KeysetPage(
+        rows, per_page, total,
+        next_cursor=row_cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=row_cursor(rows[0]) if rows and has_prev else None,
+    )
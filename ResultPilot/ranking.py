@@ -0,0 +1,128 @@
+import math
+from bisect import bisect_left, bisect_right
+from sqlalchemy import case, func, select
+from app import db
+from models import Subject, Result, StudentStat
+from grading import grade_schemes
+
+def gpa_totals(*conditions):
+    """Credit-weighted grade points per (student, semester) in one grouped query.
+
+    Returns rows of (student_id, semester, weighted points, credits); conditions
+    filter the results taken into account.
+    """
+    credits = func.coalesce(Subject.credits, 0)
+    return db.session.execute(
+        select(
+            Result.student_id,
+            Result.semester,
+            func.sum(grade_schemes().points_expression() * credits),
+            func.sum(credits),
+        ).join(Subject, Result.subject_id == Subject.id)
+        .where(*conditions)
+        .group_by(Result.student_id, Result.semester)
+    ).all()
+
+# Added before rounding GPAs half up to hundredths, so sums that differ only by
+# floating point noise (e.g. summed per semester or in SQL) round the same way
+ROUNDING_EPSILON = 1e-9
+
+def _gpa(points, credits):
+    return math.floor(points / credits * 100 + 0.5 + ROUNDING_EPSILON) / 100 if credits else 0.0
+
+def cohort_gpas(*conditions):
+    """Per-semester GPA and cumulative GPA for every student with results.
+
+    Returns {student_id: {'semesters': {semester: gpa}, 'cgpa': cgpa, 'credits': credits}}.
+    """
+    students = {}
+    for student_id, semester, points, credits in gpa_totals(*conditions):
+        entry = students.setdefault(student_id, {'semesters': {}, 'points': 0.0, 'credits': 0})
+        entry['semesters'][semester] = _gpa(points or 0.0, credits)
+        entry['points'] += points or 0.0
+        entry['credits'] += credits or 0
+    for entry in students.values():
+        entry['cgpa'] = _gpa(entry.pop('points'), entry['credits'])
+    return students
+
+def cohort_rankings(*conditions):
+    """Every student ranked by cumulative GPA, best first.
+
+    Ties share a rank (1, 2, 2, 4). percentile is the share of the cohort with a
+    strictly lower CGPA.
+    """
+    students = cohort_gpas(*conditions)
+    ascending = sorted(entry['cgpa'] for entry in students.values())
+    size = len(ascending)
+    ranked = sorted(students.items(), key=lambda item: (-item[1]['cgpa'], item[0]))
+
+    rankings = []
+    for student_id, entry in ranked:
+        below = bisect_left(ascending, entry['cgpa'])
+        rankings.append({
+            'student_id': student_id,
+            'cgpa': entry['cgpa'],
+            'credits': entry['credits'],
+            'semesters': entry['semesters'],
+            'rank': size - bisect_right(ascending, entry['cgpa']) + 1,
+            'percentile': round(below / size * 100, 2),
+        })
+    return rankings
+
+def top_performers(limit=5):
+    """The limit students with the best average percentage, with their CGPA.
+
+    Reads the indexed student_stats summary instead of ranking the whole cohort;
+    rank is by average percentage, ties sharing a rank.
+    """
+    leaders = db.session.execute(
+        select(StudentStat.student_id, StudentStat.avg_percentage)
+        .where(StudentStat.result_count > 0)
+        .order_by(StudentStat.avg_percentage.desc(), StudentStat.student_id)
+        .limit(limit)
+    ).all()
+    if not leaders:
+        return []
+    gpas = cohort_gpas(Result.student_id.in_([row.student_id for row in leaders]))
+    performers = []
+    for position, row in enumerate(leaders):
+        if position and row.avg_percentage == leaders[position - 1].avg_percentage:
+            rank = performers[-1]['rank']
+        else:
+            rank = position + 1
+        performers.append({
+            'student_id': row.student_id,
+            'avg_percentage': round(row.avg_percentage, 2),
+            'cgpa': gpas.get(row.student_id, {}).get('cgpa', 0.0),
+            'rank': rank,
+        })
+    return performers
+
+def student_gpa(student_id, *conditions):
+    """Per-semester GPA and CGPA of one student, plus their rank and percentile within the cohort.
+
+    The student's GPA comes from their own results; rank and percentile from one
+    query counting the students whose rounded CGPA is higher or lower.
+    Returns None when the student has no matching results.
+    """
+    entry = cohort_gpas(Result.student_id == student_id, *conditions).get(student_id)
+    if entry is None:
+        return None
+
+    credits = func.coalesce(Subject.credits, 0)
+    totals = select(
+        func.sum(grade_schemes().points_expression() * credits).label('points'),
+        func.sum(credits).label('credits'),
+    ).join(Subject, Result.subject_id == Subject.id).where(*conditions).group_by(Result.student_id).subquery()
+    # Every student's CGPA in hundredths, rounded like _gpa
+    hundredths = func.floor(case(
+        (totals.c.credits > 0, func.coalesce(totals.c.points, 0.0) * 100.0 / totals.c.credits),
+        else_=0.0,
+    ) + 0.5 + ROUNDING_EPSILON)
+    own = round(entry['cgpa'] * 100)
+    size, above, below = db.session.execute(select(
+        func.count(),
+        func.coalesce(func.sum(case((hundredths > own, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((hundredths < own, 1), else_=0)), 0),
+    ).select_from(totals)).one()
+    return dict(entry, student_id=student_id, rank=above + 1, percentile=round(below / size * 100, 2))
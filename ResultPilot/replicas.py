@@ -0,0 +1,189 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import Select
+
+# Bind keys of replica engines in SQLALCHEMY_BINDS: replica0, replica1, ...
+REPLICA_BIND_PREFIX = 'replica'
+
+# Seconds a PostgreSQL standby is behind; 0 when it has replayed everything it received
+# and NULL on a server that is not a standby
+POSTGRES_LAG_QUERY = '''
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+'''
+
+class Replica:
+    """A replica engine and the outcome of its last health check"""
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self.checked_at = None  # time.monotonic() of the last check
+        self._checking = threading.Lock()
+
+class ReplicaSet:
+    """Replica engines handed out round-robin, skipping those that failed their last health check.
+
+    A replica is checked again once check_interval seconds have passed since its
+    last check, by the thread that happens to choose it; replicas more than
+    max_lag seconds behind the primary count as unhealthy.
+    """
+
+    def __init__(self, engines, check_interval, max_lag):
+        self.replicas = [Replica(name, engine) for name, engine in sorted(engines.items())]
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._turn = itertools.count()
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error', self._failure_handler(replica))
+
+    def _failure_handler(self, replica):
+        def mark_unhealthy(context):
+            # A lost connection takes the replica out of rotation until its next check
+            if context.is_disconnect:
+                replica.healthy = False
+                replica.error = str(context.original_exception)
+                replica.checked_at = time.monotonic()
+        return mark_unhealthy
+
+    def check(self, replica):
+        try:
+            with replica.engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    lag = connection.execute(text(POSTGRES_LAG_QUERY)).scalar()
+                else:
+                    connection.execute(text('SELECT 1'))
+                    lag = None
+            replica.lag = float(lag) if lag is not None else None
+            replica.healthy = replica.lag is None or replica.lag <= self.max_lag
+            replica.error = None if replica.healthy else f'{replica.lag:.1f} s behind the primary'
+        except SQLAlchemyError as e:
+            replica.healthy = False
+            replica.error = str(getattr(e, 'orig', None) or e)
+        if not replica.healthy:
+            logging.warning('Replica %s is out of rotation: %s', replica.name, replica.error)
+        replica.checked_at = time.monotonic()
+        return replica.healthy
+
+    def _is_healthy(self, replica):
+        due = replica.checked_at is None or time.monotonic() - replica.checked_at >= self.check_interval
+        # Threads that find another one checking the replica use its previous state
+        if due and replica._checking.acquire(blocking=False):
+            try:
+                return self.check(replica)
+            finally:
+                replica._checking.release()
+        return replica.healthy
+
+    def choose(self):
+        """Engine of the next healthy replica, or None when none is healthy"""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._turn) % len(self.replicas)]
+            if self._is_healthy(replica):
+                return replica.engine
+        return None
+
+def init_replicas(app, engines):
+    """Route replica_reads to the replica engines among engines (the Flask-SQLAlchemy binds)"""
+    replicas = {key: engine for key, engine in engines.items()
+                if key is not None and key.startswith(REPLICA_BIND_PREFIX)}
+    app.extensions['replicas'] = ReplicaSet(
+        replicas, app.config['REPLICA_HEALTH_INTERVAL'], app.config['REPLICA_MAX_LAG']
+    ) if replicas else None
+
+def get_replicas():
+    return current_app.extensions.get('replicas')
+
+def _reads_own_writes():
+    """True when this context, or this browser within REPLICA_MAX_LAG seconds, wrote to the primary"""
+    if g.get('primary_reads'):
+        return True
+    return has_request_context() and flask_session.get('primary_until', 0) > time.time()
+
+def reading_from_replicas():
+    """True when reads in the current context may be served by a replica"""
+    return (has_app_context() and g.get('replica_reads', False) and get_replicas() is not None
+            and not _reads_own_writes())
+
+def replica_reads(f):
+    """Serve the reads of a view or helper from a replica while it runs.
+
+    Writes, SELECT ... FOR UPDATE and every read after a write in the same
+    request stay on the primary. Put it above caching decorators so cached
+    values computed on a replica are kept apart (see cache.py).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        outer = g.get('replica_reads', False)
+        g.replica_reads = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.replica_reads = outer
+    return decorated_function
+
+def replica_cache_ttl(ttl):
+    """TTL for a value computed from a replica: no longer than a replica may lag behind"""
+    max_lag = current_app.config['REPLICA_MAX_LAG']
+    return min(ttl, max_lag) if ttl else max_lag
+
+class RoutingSession(Session):
+    """Session that sends reads made under replica_reads to a healthy replica, the rest to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and clause._for_update_arg is None and reading_from_replicas()):
+            # One replica per request, so related queries (a page and its count) agree
+            engine = g.get('replica_engine')
+            if engine is None:
+                engine = g.replica_engine = get_replicas().choose()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+def _wrote():
+    if not has_app_context():
+        return
+    g.primary_reads = True
+    if has_request_context() and get_replicas() is not None:
+        # The writer's next requests read from the primary until replicas have caught up
+        flask_session['primary_until'] = time.time() + current_app.config['REPLICA_MAX_LAG']
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush(session, flush_context):
+    _wrote()
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _wrote()
+
+def sync_sqlite_replicas(primary, replicas):
+    """Copy a SQLite primary over SQLite replica files, for trying out replicas locally"""
+    if primary.dialect.name != 'sqlite' or any(replica.engine.dialect.name != 'sqlite' for replica in replicas):
+        raise ValueError('only SQLite replicas can be synced; use streaming replication for other databases')
+    try:
+        source = sqlite3.connect(primary.url.database)
+        try:
+            for replica in replicas:
+                replica.engine.dispose()
+                target = sqlite3.connect(replica.engine.url.database)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+    except sqlite3.Error as e:
+        raise ValueError(f'cannot copy {primary.url.database}: {e}')
@@ -0,0 +1,31 @@
+import os
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+# Runs inside report worker processes: keep this module free of app and database imports
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+TEMPLATE_NAME = 'reports/report_card.html'
+
+_environment = None
+
+def _template():
+    global _environment
+    if _environment is None:
+        _environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(['html']))
+    return _environment.get_template(TEMPLATE_NAME)
+
+def card_filename(card):
+    """File name of a rendered card, unique per student"""
+    student = card['student']
+    label = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in (student['student_id'] or student['username']))
+    return f"{label}-{student['id']}.html"
+
+def render_report_card(card, output_dir):
+    """Render one student's report card into output_dir and return the file name.
+
+    card is a plain dict (see report_jobs.build_card) so it can be pickled to a worker.
+    """
+    name = card_filename(card)
+    with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as output:
+        output.write(_template().render(card=card))
+    return name
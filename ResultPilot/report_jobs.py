@@ -0,0 +1,138 @@
+import logging
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from models import User, Subject, Result, ReportJob
+from ranking import cohort_gpas
+from report_cards import render_report_card
+
+# Students rendered between two progress updates of the job row
+PROGRESS_BATCH = 100
+
+# Jobs run one at a time per web process, off the request thread; each job fans
+# the rendering out over its own process pool
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-jobs')
+
+def _student_ids(semester):
+    return list(db.session.execute(
+        select(Result.student_id).where(Result.semester == semester)
+        .group_by(Result.student_id).order_by(Result.student_id)
+    ).scalars())
+
+def _card_rows(semester, student_ids):
+    return db.session.execute(
+        select(User.id, User.student_id, User.username, User.first_name, User.last_name, User.email,
+               Subject.name, Subject.code, Subject.credits,
+               Result.marks_obtained, Result.total_marks, Result.percentage, Result.grade,
+               Result.exam_type, Result.academic_year, Result.remarks)
+        .join(User, Result.student_id == User.id)
+        .join(Subject, Result.subject_id == Subject.id)
+        .where(Result.semester == semester, Result.student_id.in_(student_ids))
+        .order_by(User.id, Subject.code, Result.exam_type)
+    ).all()
+
+def build_card(semester, rows, gpa_entry, generated_at):
+    """Plain-dict report card for one student from their result rows for semester"""
+    student_pk, student_id, username, first_name, last_name, email = rows[0][:6]
+    results = []
+    grade_counts = {}
+    for row in rows:
+        name, code, credits, marks, total, percentage, grade, exam_type, academic_year, remarks = row[6:]
+        results.append({
+            'subject_name': name, 'subject_code': code, 'credits': credits or 0,
+            'marks_obtained': marks, 'total_marks': total, 'percentage': round(percentage, 1),
+            'grade': grade, 'exam_type': exam_type, 'academic_year': academic_year, 'remarks': remarks,
+        })
+        grade_counts[grade] = grade_counts.get(grade, 0) + 1
+    return {
+        'student': {
+            'id': student_pk, 'student_id': student_id, 'username': username,
+            'full_name': f"{first_name} {last_name}", 'email': email,
+        },
+        'semester': semester,
+        'results': results,
+        'total_subjects': len({result['subject_code'] for result in results}),
+        'total_exams': len(results),
+        'avg_percentage': round(sum(result['percentage'] for result in results) / len(results), 2),
+        'grade_distribution': grade_counts,
+        'gpa': gpa_entry['semesters'].get(semester, 0.0) if gpa_entry else 0.0,
+        'credits': gpa_entry['credits'] if gpa_entry else 0,
+        'generated_at': generated_at,
+    }
+
+def _cards(semester, student_ids, gpas, generated_at):
+    cards = []
+    current, rows = None, []
+    for row in _card_rows(semester, student_ids):
+        if row[0] != current and rows:
+            cards.append(build_card(semester, rows, gpas.get(current), generated_at))
+            rows = []
+        current = row[0]
+        rows.append(row)
+    if rows:
+        cards.append(build_card(semester, rows, gpas.get(current), generated_at))
+    return cards
+
+def _archive(output_dir, archive_path):
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(os.listdir(output_dir)):
+            archive.write(os.path.join(output_dir, name), name)
+
+def run_report_job(job_id):
+    """Render every report card of a job's semester and zip them; needs an app context.
+
+    Progress is committed to the job row after every PROGRESS_BATCH students so
+    status polls see it move. Jobs interrupted by a restart stay 'running'.
+    """
+    job = db.session.get(ReportJob, job_id)
+    report_dir = current_app.config['REPORT_DIR']
+    output_dir = os.path.join(report_dir, f'job-{job.id}')
+    try:
+        student_ids = _student_ids(job.semester)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        job.total_students = len(student_ids)
+        db.session.commit()
+
+        os.makedirs(output_dir, exist_ok=True)
+        gpas = cohort_gpas(Result.semester == job.semester)
+        generated_at = datetime.utcnow().strftime('%b %d, %Y')
+        with ProcessPoolExecutor(max_workers=current_app.config['REPORT_WORKERS']) as pool:
+            for start in range(0, len(student_ids), PROGRESS_BATCH):
+                batch = _cards(job.semester, student_ids[start:start + PROGRESS_BATCH], gpas, generated_at)
+                list(pool.map(render_report_card, batch, repeat(output_dir), chunksize=10))
+                job.processed_students += len(batch)
+                db.session.commit()
+
+        archive_path = os.path.join(report_dir, f'report-cards-{job.id}.zip')
+        _archive(output_dir, archive_path)
+        job.artifact_path = archive_path
+        job.status = 'completed'
+    except Exception as exc:
+        logging.exception('Report job %s failed', job_id)
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(exc)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+def _run_in_background(app, job_id):
+    with app.app_context():
+        run_report_job(job_id)
+
+def start_report_job(semester, requested_by=None):
+    """Queue report card generation for semester and return the job without waiting for it"""
+    job = ReportJob(semester=semester, requested_by=requested_by)
+    db.session.add(job)
+    db.session.commit()
+    _runner.submit(_run_in_background, current_app._get_current_object(), job.id)
+    return job
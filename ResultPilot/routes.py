@@ -1,14 +1,34 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import Response, render_template, request, redirect, url_for, flash, jsonify, abort, send_file
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
-import calendar
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime
+import os
 
 from app import app, db
-from models import User, Subject, Result, Semester
-from forms import LoginForm, RegisterForm, StudentForm, SubjectForm, ResultForm, ProfileForm
-from utils import admin_required, get_dashboard_stats, get_grade_distribution
+from models import User, Subject, Result, Semester, ReportJob
+from forms import (LoginForm, RegisterForm, StudentForm, SubjectForm, ResultForm, ResultImportForm, ReportCardForm, ProfileForm,
+                   BulkResultForm, BulkStudentDeleteForm)
+from utils import (admin_required, get_dashboard_stats, get_grade_distribution, get_subject_performance,
+                   report_filters, result_filters, result_search_conditions, student_listing_page, result_listing_page,
+                   page_to_dict, serialize_student, serialize_result, snapshot_query)
+from analytics import record_result, forget_student, results_timeseries
+from events import RESULTS_CHANNEL, event_stream, result_changed, subscribe
+from auth import hash_password, verify_password, identity_changed
+from instrumentation import query_budget
+from replicas import replica_reads
+from importer import import_results_file
+from bulk import bulk_update_results, bulk_delete_students, result_conditions
+from exporter import export_query, csv_response
+from pagination import invalidate_counts
+from choices import STUDENT_LABEL_COLUMNS, student_label, students_changed, subjects_changed
+from cache import invalidate, cached_json_response
+from report_jobs import start_report_job
+from ranking import cohort_rankings, student_gpa
+from snapshots import get_snapshot, RECENT_RESULTS
+from student_ids import next_student_id
+from columnar import group_results, pivot_results, percentage_histogram, snapshot_info
+from search import search_students, search_subjects, student_changed, student_removed, subject_changed
 
 # Authentication Routes
 @app.route('/')
@@ -28,7 +48,7 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and check_password_hash(user.password_hash, form.password.data):
+        if user and verify_password(user, form.password.data):
             login_user(user)
             next_page = request.args.get('next')
             flash(f'Welcome back, {user.first_name}!', 'success')
@@ -54,7 +74,7 @@ def register():
         user = User(
             username=form.username.data,
             email=form.email.data,
-            password_hash=generate_password_hash(form.password.data),
+            password_hash=hash_password(form.password.data),
             first_name=form.first_name.data,
             last_name=form.last_name.data,
             role=form.role.data
@@ -62,12 +82,14 @@ def register():
         
         # Generate student ID for students
         if user.role == 'student':
-            year = datetime.now().year
-            student_count = User.query.filter_by(role='student').count() + 1
-            user.student_id = f"STU{year}{student_count:04d}"
+            user.student_id = next_student_id()
         
         db.session.add(user)
         db.session.commit()
+        invalidate_counts('students')
+        invalidate('reports')
+        student_changed(user)
+        students_changed()
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -85,6 +107,8 @@ def logout():
 @app.route('/admin/dashboard')
 @login_required
 @admin_required
+@replica_reads
+@query_budget(7)
 def admin_dashboard():
     stats = get_dashboard_stats()
     return render_template('admin/dashboard.html', stats=stats)
@@ -92,22 +116,10 @@ def admin_dashboard():
 @app.route('/admin/students')
 @login_required
 @admin_required
+@replica_reads
 def admin_students():
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
-    
-    query = User.query.filter_by(role='student')
-    if search:
-        query = query.filter(
-            (User.first_name.contains(search)) |
-            (User.last_name.contains(search)) |
-            (User.email.contains(search)) |
-            (User.student_id.contains(search))
-        )
-    
-    students = query.paginate(
-        page=page, per_page=10, error_out=False
-    )
+    students = student_listing_page(search)
     
     return render_template('admin/students.html', students=students, search=search)
 
@@ -129,7 +141,7 @@ def add_student():
         user = User(
             username=form.username.data,
             email=form.email.data,
-            password_hash=generate_password_hash('student123'),  # Default password
+            password_hash=hash_password('student123'),  # Default password
             first_name=form.first_name.data,
             last_name=form.last_name.data,
             role='student',
@@ -145,12 +157,14 @@ def add_student():
                 return render_template('admin/add_student.html', form=form)
             user.student_id = form.student_id.data
         else:
-            year = datetime.now().year
-            student_count = User.query.filter_by(role='student').count() + 1
-            user.student_id = f"STU{year}{student_count:04d}"
+            user.student_id = next_student_id()
         
         db.session.add(user)
         db.session.commit()
+        invalidate_counts('students')
+        invalidate('reports')
+        student_changed(user)
+        students_changed()
         
         flash(f'Student {user.full_name} added successfully! Default password: student123', 'success')
         return redirect(url_for('admin_students'))
@@ -180,6 +194,11 @@ def edit_student(student_id):
         form.populate_obj(student)
         student.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_counts('students')
+        invalidate('reports')
+        student_changed(student)
+        students_changed()
+        identity_changed(student.id)
         
         flash(f'Student {student.full_name} updated successfully!', 'success')
         return redirect(url_for('admin_students'))
@@ -195,35 +214,51 @@ def delete_student(student_id):
         flash('User is not a student.', 'danger')
         return redirect(url_for('admin_students'))
     
+    forget_student(student.id)
     db.session.delete(student)
     db.session.commit()
+    invalidate_counts('students')
+    invalidate_counts('results')
+    invalidate('reports')
+    student_removed(student_id)
+    students_changed()
+    identity_changed(student_id)
     flash(f'Student {student.full_name} deleted successfully!', 'success')
     return redirect(url_for('admin_students'))
 
+@app.route('/admin/students/bulk-delete', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_delete_students_view():
+    form = BulkStudentDeleteForm()
+    report = None
+    if form.validate_on_submit():
+        try:
+            report = bulk_delete_students(
+                form.identifier_list(), (form.student_id_prefix.data or '').strip(), apply=form.apply.data,
+                expected=int(form.expected.data) if form.apply.data and form.expected.data else None,
+                chunk_size=app.config['BULK_CHUNK_SIZE']
+            )
+        except ValueError as e:
+            flash(str(e), 'danger')
+        else:
+            if report.applied:
+                flash(f'{report.deleted} students and their results deleted.', 'success')
+                return redirect(url_for('admin_students'))
+            form.expected.data = report.matched
+    
+    return render_template('admin/bulk_students.html', form=form, report=report)
+
 @app.route('/admin/results')
 @login_required
 @admin_required
+@replica_reads
+# 4 statements, plus up to 4 when a search first loads or refreshes the search indexes
+@query_budget(8)
 def admin_results():
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     semester = request.args.get('semester', '')
-    
-    query = Result.query.join(User).join(Subject)
-    
-    if search:
-        query = query.filter(
-            (User.first_name.contains(search)) |
-            (User.last_name.contains(search)) |
-            (Subject.name.contains(search)) |
-            (Subject.code.contains(search))
-        )
-    
-    if semester:
-        query = query.filter(Result.semester == semester)
-    
-    results = query.order_by(desc(Result.created_at)).paginate(
-        page=page, per_page=15, error_out=False
-    )
+    results = result_listing_page(search, semester)
     
     semesters = db.session.query(Result.semester).distinct().all()
     semester_list = [s[0] for s in semesters]
@@ -231,24 +266,29 @@ def admin_results():
     return render_template('admin/results.html', results=results, search=search, 
                          semester=semester, semester_list=semester_list)
 
+@app.route('/admin/results/export.csv')
+@login_required
+@admin_required
+def export_results():
+    search = request.args.get('search', '')
+    semester = request.args.get('semester', '')
+    query = export_query(*result_search_conditions(search, semester))
+    return csv_response(query, f"results-{datetime.now():%Y%m%d}.csv")
+
+@app.route('/admin/students/<int:student_id>/transcript.csv')
+@login_required
+@admin_required
+def export_student_transcript(student_id):
+    student = User.query.get_or_404(student_id)
+    query = export_query(Result.student_id == student.id)
+    return csv_response(query, f"transcript-{student.student_id or student.username}.csv")
+
 @app.route('/admin/results/add', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def add_result():
     form = ResultForm()
     if form.validate_on_submit():
-        # Check if result already exists
-        existing_result = Result.query.filter_by(
-            student_id=form.student_id.data,
-            subject_id=form.subject_id.data,
-            semester=form.semester.data,
-            exam_type=form.exam_type.data
-        ).first()
-        
-        if existing_result:
-            flash('Result already exists for this student, subject, and exam type.', 'danger')
-            return render_template('admin/add_result.html', form=form)
-        
         result = Result(
             student_id=form.student_id.data,
             subject_id=form.subject_id.data,
@@ -259,13 +299,91 @@ def add_result():
             exam_type=form.exam_type.data,
             remarks=form.remarks.data
         )
-        result.save()
+        try:
+            result.save()
+        except IntegrityError:
+            # The unique index on (student, subject, semester, exam type) rejected a duplicate
+            db.session.rollback()
+            flash('Result already exists for this student, subject, and exam type.', 'danger')
+            return render_template('admin/add_result.html', form=form)
+        invalidate_counts('results')
+        invalidate('reports')
         
         flash('Result added successfully!', 'success')
         return redirect(url_for('admin_results'))
     
     return render_template('admin/add_result.html', form=form)
 
+@app.route('/admin/results/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_results():
+    form = ResultImportForm()
+    report = None
+    if form.validate_on_submit():
+        report = import_results_file(form.file.data, app.config['IMPORT_CHUNK_SIZE'])
+        invalidate_counts('results')
+        if report.parse_error:
+            flash(f'The file could not be parsed ({report.parse_error}); '
+                  f'{report.inserted} results imported before the problem.', 'danger')
+        else:
+            flash(f'{report.inserted} results imported, {len(report.errors)} rows skipped.',
+                  'success' if not report.errors else 'warning')
+    
+    return render_template('admin/import_results.html', form=form, report=report)
+
+@app.route('/admin/results/bulk', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_results():
+    form = BulkResultForm()
+    report = None
+    if form.validate_on_submit():
+        try:
+            conditions = result_conditions((form.semester.data or '').strip(), (form.academic_year.data or '').strip(),
+                                           form.exam_type.data, form.subject_id.data)
+            report = bulk_update_results(
+                form.action.data, conditions, form.action_value(), apply=form.apply.data,
+                expected=int(form.expected.data) if form.apply.data and form.expected.data else None,
+                chunk_size=app.config['BULK_CHUNK_SIZE']
+            )
+        except ValueError as e:
+            flash(str(e), 'danger')
+        else:
+            if report.applied:
+                flash(f'{report.changed} results updated.' if form.action.data != 'delete'
+                      else f'{report.changed} results deleted.', 'success')
+                return redirect(url_for('admin_results'))
+            form.expected.data = report.matched
+    
+    return render_template('admin/bulk_results.html', form=form, report=report)
+
+@app.route('/admin/report-cards', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def report_cards():
+    form = ReportCardForm()
+    semesters = db.session.query(Result.semester).distinct().order_by(Result.semester).all()
+    form.semester.choices = [(s[0], s[0]) for s in semesters]
+    
+    if form.validate_on_submit():
+        job = start_report_job(form.semester.data, current_user.id)
+        flash(f'Generating report cards for {job.semester}. This page updates as they are rendered.', 'info')
+        return redirect(url_for('report_cards'))
+    
+    jobs = ReportJob.query.order_by(ReportJob.created_at.desc()).limit(20).all()
+    return render_template('admin/report_cards.html', form=form, jobs=jobs)
+
+@app.route('/admin/report-cards/<int:job_id>/download')
+@login_required
+@admin_required
+def download_report_cards(job_id):
+    job = ReportJob.query.get_or_404(job_id)
+    if job.status != 'completed' or not job.artifact_path or not os.path.exists(job.artifact_path):
+        abort(404)
+    return send_file(job.artifact_path, as_attachment=True,
+                     download_name=f"report-cards-{job.semester.replace(' ', '-')}-{job.id}.zip")
+
 @app.route('/admin/results/<int:result_id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -274,10 +392,21 @@ def edit_result(result_id):
     form = ResultForm(obj=result)
     
     if form.validate_on_submit():
+        record_result(result, sign=-1)
+        previous = (result.grade, result.percentage)
         form.populate_obj(result)
         result.grade = result.calculate_grade()
         result.updated_at = datetime.utcnow()
-        db.session.commit()
+        try:
+            record_result(result)
+            result_changed('updated', result, previous)
+            db.session.commit()
+            invalidate_counts('results')
+            invalidate('reports')
+        except IntegrityError:
+            db.session.rollback()
+            flash('Result already exists for this student, subject, and exam type.', 'danger')
+            return render_template('admin/add_result.html', form=form, result=result)
         
         flash('Result updated successfully!', 'success')
         return redirect(url_for('admin_results'))
@@ -289,14 +418,19 @@ def edit_result(result_id):
 @admin_required
 def delete_result(result_id):
     result = Result.query.get_or_404(result_id)
+    record_result(result, sign=-1)
+    result_changed('deleted', result)
     db.session.delete(result)
     db.session.commit()
+    invalidate_counts('results')
+    invalidate('reports')
     flash('Result deleted successfully!', 'success')
     return redirect(url_for('admin_results'))
 
 @app.route('/admin/subjects')
 @login_required
 @admin_required
+@replica_reads
 def admin_subjects():
     subjects = Subject.query.all()
     return render_template('admin/subjects.html', subjects=subjects)
@@ -323,6 +457,9 @@ def add_subject():
         )
         db.session.add(subject)
         db.session.commit()
+        invalidate('reports')
+        subject_changed(subject)
+        subjects_changed()
         
         flash('Subject added successfully!', 'success')
         return redirect(url_for('admin_subjects'))
@@ -332,34 +469,27 @@ def add_subject():
 # Student Routes
 @app.route('/student/dashboard')
 @login_required
+@query_budget(3)
 def student_dashboard():
     if current_user.is_admin():
         return redirect(url_for('admin_dashboard'))
     
-    # Get student's results
-    results = Result.query.filter_by(student_id=current_user.id).order_by(desc(Result.created_at)).all()
-    
-    # Calculate statistics
-    total_subjects = len(set(r.subject_id for r in results))
-    avg_percentage = sum(r.percentage for r in results) / len(results) if results else 0
-    
-    # Grade distribution
-    grade_counts = {}
-    for result in results:
-        grade = result.grade
-        grade_counts[grade] = grade_counts.get(grade, 0) + 1
-    
-    recent_results = results[:5]  # Last 5 results
+    # Summary and recent results come from the snapshot maintained on result writes
+    stats = get_snapshot(current_user.id)
+    for result in stats['results']:
+        result['created_at'] = datetime.fromisoformat(result['created_at']) if result['created_at'] else None
+    stats['recent_results'] = stats['results'][:RECENT_RESULTS]
     
-    stats = {
-        'total_subjects': total_subjects,
-        'total_exams': len(results),
-        'avg_percentage': round(avg_percentage, 2),
-        'grade_distribution': grade_counts,
-        'recent_results': recent_results
-    }
+    return render_template('student/dashboard.html', stats=stats, results=stats['results'])
+
+@app.route('/student/transcript.csv')
+@login_required
+def student_transcript():
+    if current_user.is_admin():
+        return redirect(url_for('admin_dashboard'))
     
-    return render_template('student/dashboard.html', stats=stats, results=results)
+    query = export_query(Result.student_id == current_user.id)
+    return csv_response(query, f"transcript-{current_user.student_id or current_user.username}.csv")
 
 @app.route('/student/profile', methods=['GET', 'POST'])
 @login_required
@@ -367,20 +497,27 @@ def student_profile():
     if current_user.is_admin():
         return redirect(url_for('admin_dashboard'))
     
-    form = ProfileForm(obj=current_user)
+    # current_user only carries the identity columns; the form needs the full row
+    user = db.session.get(User, current_user.id)
+    form = ProfileForm(obj=user)
     if form.validate_on_submit():
-        form.populate_obj(current_user)
-        current_user.updated_at = datetime.utcnow()
+        form.populate_obj(user)
+        user.updated_at = datetime.utcnow()
         db.session.commit()
+        identity_changed(user.id)
+        student_changed(user)
+        students_changed()
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('student_profile'))
     
-    return render_template('student/profile.html', form=form)
+    return render_template('student/profile.html', form=form, user=user)
 
 # API Routes for Charts
 @app.route('/api/dashboard-stats')
 @login_required
 @admin_required
+@replica_reads
+@cached_json_response('reports')
 def api_dashboard_stats():
     stats = get_dashboard_stats()
     return jsonify(stats)
@@ -388,42 +525,176 @@ def api_dashboard_stats():
 @app.route('/api/grade-distribution')
 @login_required
 @admin_required
+@replica_reads
+@cached_json_response('reports')
 def api_grade_distribution():
-    distribution = get_grade_distribution()
+    distribution = get_grade_distribution(**report_filters())
     return jsonify(distribution)
 
+@app.route('/api/subject-performance')
+@login_required
+@admin_required
+@replica_reads
+@cached_json_response('reports')
+def api_subject_performance():
+    performance = get_subject_performance(**report_filters())
+    return jsonify(performance)
+
 @app.route('/api/monthly-results')
 @login_required
 @admin_required
+@replica_reads
+@cached_json_response('reports')
 def api_monthly_results():
-    # Get results for the last 12 months
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365)
-    
-    results = db.session.query(
-        func.extract('month', Result.created_at).label('month'),
-        func.extract('year', Result.created_at).label('year'),
-        func.count(Result.id).label('count')
-    ).filter(
-        Result.created_at >= start_date
-    ).group_by(
-        func.extract('year', Result.created_at),
-        func.extract('month', Result.created_at)
-    ).order_by(
-        func.extract('year', Result.created_at),
-        func.extract('month', Result.created_at)
-    ).all()
-    
-    monthly_data = []
-    for result in results:
-        month_name = calendar.month_abbr[int(result.month)]
-        monthly_data.append({
-            'month': f"{month_name} {int(result.year)}",
-            'count': result.count
-        })
-    
+    # Results per month for the last 12 months, from the rollup table
+    monthly_data = [
+        {'month': period['label'], 'count': period['count']}
+        for period in results_timeseries(None, datetime.utcnow().date(), 'month')
+    ]
     return jsonify(monthly_data)
 
+@app.route('/api/results-timeseries')
+@login_required
+@admin_required
+@replica_reads
+@cached_json_response('reports')
+def api_results_timeseries():
+    granularity = request.args.get('granularity', 'month')
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        series = results_timeseries(start, end, granularity, request.args.get('subject_id', type=int))
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify(series)
+
+# Interactive reports over the columnar results snapshot (columnar.py); answers may lag
+# writes by up to ANALYTICS_MAX_AGE seconds and never query the results table
+
+@app.route('/api/analytics/groups')
+@login_required
+@admin_required
+def api_analytics_groups():
+    filters, pass_mark = snapshot_query()
+    try:
+        groups = group_results(request.args.getlist('group_by'), filters, pass_mark)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify({'snapshot': snapshot_info(), 'groups': groups})
+
+@app.route('/api/analytics/pivot')
+@login_required
+@admin_required
+def api_analytics_pivot():
+    filters, pass_mark = snapshot_query()
+    try:
+        table = pivot_results(request.args.get('rows', 'subject'), request.args.get('columns', 'semester'),
+                              request.args.get('metric', 'count'), filters, pass_mark)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify({'snapshot': snapshot_info(), **table})
+
+@app.route('/api/analytics/histogram')
+@login_required
+@admin_required
+def api_analytics_histogram():
+    filters, _ = snapshot_query()
+    try:
+        bins = percentage_histogram(request.args.get('bin_width', 10, type=int), filters)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify({'snapshot': snapshot_info(), 'bins': bins})
+
+@app.route('/api/rankings')
+@login_required
+@admin_required
+@replica_reads
+@cached_json_response('reports')
+def api_rankings():
+    rankings = cohort_rankings(*result_filters(**report_filters()))
+    limit = request.args.get('limit', type=int)
+    if limit:
+        rankings = rankings[:limit]
+    students = {
+        student.id: student
+        for student in User.query.filter(User.id.in_([entry['student_id'] for entry in rankings])).all()
+    }
+    for entry in rankings:
+        student = students.get(entry['student_id'])
+        entry['full_name'] = student.full_name if student else None
+        entry['roll_number'] = student.student_id if student else None
+    return jsonify(rankings)
+
+@app.route('/api/students/<int:id>/gpa')
+@login_required
+@admin_required
+@replica_reads
+@cached_json_response('reports')
+def api_student_gpa(id):
+    User.query.filter_by(id=id, role='student').first_or_404()
+    entry = student_gpa(id, *result_filters(**report_filters()))
+    return jsonify(entry or {'student_id': id, 'cgpa': 0.0, 'credits': 0, 'semesters': {},
+                             'rank': None, 'percentile': None})
+
+@app.route('/api/events')
+@login_required
+@admin_required
+def api_events():
+    # Server-sent events with dashboard deltas; the stream needs no request context, so the
+    # database session is released as soon as this view returns
+    subscription = subscribe(RESULTS_CHANNEL)
+    return Response(event_stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/report-jobs/<int:job_id>')
+@login_required
+@admin_required
+def api_report_job(job_id):
+    job = ReportJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+@app.route('/api/students')
+@login_required
+@admin_required
+@replica_reads
+def api_students():
+    page = student_listing_page(request.args.get('search', ''))
+    return jsonify(page_to_dict(page, [serialize_student(student) for student in page.items]))
+
+@app.route('/api/results')
+@login_required
+@admin_required
+@replica_reads
+def api_results():
+    page = result_listing_page(request.args.get('search', ''), request.args.get('semester', ''))
+    return jsonify(page_to_dict(page, [serialize_result(result) for result in page.items]))
+
+@app.route('/api/search/students')
+@login_required
+@admin_required
+def api_search_students():
+    term = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    ids = search_students(term, limit=limit, prefix=True) if term else []
+    labels = {
+        row.id: student_label(*row[1:])
+        for row in db.session.execute(select(*STUDENT_LABEL_COLUMNS).where(User.id.in_(ids)))
+    } if ids else {}
+    return jsonify([{'id': student_id, 'label': labels[student_id]} for student_id in ids if student_id in labels])
+
+@app.route('/api/search/subjects')
+@login_required
+@admin_required
+def api_search_subjects():
+    term = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    ids = search_subjects(term, limit=limit, prefix=True) if term else []
+    subjects = {subject.id: subject for subject in Subject.query.filter(Subject.id.in_(ids)).all()}
+    return jsonify([
+        {'id': subject_id, 'label': f"{subjects[subject_id].name} ({subjects[subject_id].code})"}
+        for subject_id in ids if subject_id in subjects
+    ])
+
 # Error Handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,117 @@
+import logging
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+from app import db
+from auth import hash_password
+from models import User, Result
+
+# Admin created by 'flask init-db' and the development server when none exists
+DEFAULT_ADMIN_EMAIL = 'admin@example.com'
+DEFAULT_ADMIN_PASSWORD = 'admin123'
+
+def missing_indexes(tables=None):
+    """Indexes declared on the models that do not exist in the connected database"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in tables or db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+def find_duplicate_results(limit=20):
+    """Result keys stored more than once, which block creating the unique index"""
+    key = (Result.student_id, Result.subject_id, Result.semester, Result.exam_type)
+    return db.session.execute(
+        select(*key, func.count(Result.id)).group_by(*key).having(func.count(Result.id) > 1).limit(limit)
+    ).all()
+
+def create_missing_indexes():
+    """Create declared indexes missing from an existing database, returning their names.
+
+    Raises ValueError listing offending keys if duplicate results would make the
+    unique index fail; resolve those rows first.
+    """
+    indexes = missing_indexes()
+    if any(index.table is Result.__table__ and index.unique for index in indexes):
+        duplicates = find_duplicate_results()
+        if duplicates:
+            keys = ', '.join(f'{row[:4]} x{row[4]}' for row in duplicates)
+            raise ValueError(f'duplicate results must be removed before adding the unique index: {keys}')
+
+    for index in indexes:
+        logging.info('Creating index %s on %s', index.name, index.table.name)
+        index.create(db.engine)
+    return [index.name for index in indexes]
+
+def create_missing_tables():
+    """Create tables declared on the models that do not exist yet, returning their names"""
+    existing = set(inspect(db.engine).get_table_names())
+    tables = [table for table in db.metadata.sorted_tables if table.name not in existing]
+    db.metadata.create_all(db.engine, tables=tables)
+    for table in tables:
+        logging.info('Created table %s', table.name)
+    return [table.name for table in tables]
+
+def add_missing_columns():
+    """Add columns declared on the models but missing from existing tables.
+
+    Only nullable columns can be added to tables that may hold rows; the rest are
+    returned unchanged for a manual migration. Returns (added, skipped) as
+    'table.column' names.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added, skipped = [], []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            name = f'{table.name}.{column.name}'
+            if not column.nullable or column.primary_key:
+                skipped.append(name)
+                continue
+            spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {spec}'))
+            logging.info('Added column %s', name)
+            added.append(name)
+    return added, skipped
+
+def init_db():
+    """Create the schema in an empty or partially created database, returning the new table names"""
+    return create_missing_tables()
+
+def migrate():
+    """Bring an existing database up to the models: new tables, nullable columns, then indexes.
+
+    Returns (tables, columns, skipped_columns, indexes) with the names of what
+    was created or could not be added automatically.
+    """
+    tables = create_missing_tables()
+    columns, skipped = add_missing_columns()
+    indexes = create_missing_indexes()
+    return tables, columns, skipped, indexes
+
+def seed_admin(email=DEFAULT_ADMIN_EMAIL, password=DEFAULT_ADMIN_PASSWORD, username='admin'):
+    """Create an admin account unless a user with email exists; returns (user, created)"""
+    user = User.query.filter_by(email=email).first()
+    if user is not None:
+        return user, False
+    user = User(
+        username=username,
+        email=email,
+        password_hash=hash_password(password),
+        role='admin',
+        first_name='System',
+        last_name='Administrator'
+    )
+    db.session.add(user)
+    db.session.commit()
+    logging.info('Admin user created: %s', email)
+    return user, True
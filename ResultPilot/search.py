@@ -0,0 +1,259 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import bindparam, func, or_, select, text
+from app import db
+from models import User, Subject
+
+# Seconds between checks for writes made by other worker processes
+FRESHNESS_CHECK_INTERVAL = 30
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Columns searched for each kind of document
+STUDENT_COLUMNS = (User.first_name, User.last_name, User.email, User.student_id)
+SUBJECT_COLUMNS = (Subject.name, Subject.code)
+
+def tokenize(value):
+    return TOKEN_PATTERN.findall(value.lower()) if value else []
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+class InvertedIndex:
+    """Token and trigram postings for substring and prefix search over short text fields"""
+
+    def __init__(self):
+        self.postings = {}         # token -> set of document ids
+        self.trigram_tokens = {}   # trigram -> set of tokens containing it
+        self.vocabulary = []       # sorted tokens, for prefix lookups
+        self.documents = {}        # document id -> set of tokens
+
+    def add(self, doc_id, values, keep_sorted=True):
+        """Index a document; bulk loads pass keep_sorted=False and call sort_vocabulary() once at the end"""
+        self.remove(doc_id)
+        tokens = {token for value in values for token in tokenize(value)}
+        self.documents[doc_id] = tokens
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                if keep_sorted:
+                    insort(self.vocabulary, token)
+                else:
+                    self.vocabulary.append(token)
+                for trigram in trigrams(token):
+                    self.trigram_tokens.setdefault(trigram, set()).add(token)
+            ids.add(doc_id)
+
+    def sort_vocabulary(self):
+        self.vocabulary.sort()
+
+    def remove(self, doc_id):
+        for token in self.documents.pop(doc_id, ()):
+            ids = self.postings[token]
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+                for trigram in trigrams(token):
+                    self.trigram_tokens[trigram].discard(token)
+
+    def _prefix_tokens(self, prefix):
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            yield self.vocabulary[position]
+            position += 1
+
+    def _matching_tokens(self, query_token, prefix):
+        if prefix:
+            return self._prefix_tokens(query_token)
+        if len(query_token) < 3:
+            # Too short for trigrams: scan the vocabulary, which is far smaller than the documents
+            return (token for token in self.vocabulary if query_token in token)
+        candidates = None
+        for trigram in trigrams(query_token):
+            tokens = self.trigram_tokens.get(trigram, set())
+            candidates = tokens if candidates is None else candidates & tokens
+            if not candidates:
+                return ()
+        return (token for token in candidates if query_token in token)
+
+    def search(self, term, limit=None, prefix=False):
+        """Ids of documents matching every word of term, best matches first (all of them without limit).
+
+        A word scores 3 on an exact token match, 2 on a token prefix and 1 on a
+        substring; prefix=True only considers prefixes, for typeahead.
+        """
+        scores = None
+        for query_token in set(tokenize(term)):
+            token_scores = {}
+            for token in self._matching_tokens(query_token, prefix):
+                score = 3 if token == query_token else 2 if token.startswith(query_token) else 1
+                for doc_id in self.postings[token]:
+                    if score > token_scores.get(doc_id, 0):
+                        token_scores[doc_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items()
+                          if doc_id in scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:limit]
+
+class LocalSearchIndex:
+    """In-process inverted index over one table, loaded lazily and kept current on writes.
+
+    Writes made through this process update the index directly. Writes made by
+    other worker processes are picked up by comparing a cheap table signature
+    at most every FRESHNESS_CHECK_INTERVAL seconds and reloading if it changed.
+    """
+
+    def __init__(self, model, columns, conditions, signature_column):
+        self.model = model
+        self.columns = columns
+        self.conditions = conditions
+        self.signature_column = signature_column
+        self.index = None
+        self.signature = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def _current_signature(self):
+        return db.session.execute(
+            select(func.count(), func.max(self.signature_column)).where(*self.conditions)
+        ).one()
+
+    def _load(self):
+        index = InvertedIndex()
+        rows = db.session.execute(
+            select(self.model.id, *self.columns).where(*self.conditions)
+            .execution_options(yield_per=5000)
+        )
+        for row in rows:
+            index.add(row[0], row[1:], keep_sorted=False)
+        index.sort_vocabulary()
+        self.index = index
+        logging.info('Loaded %s search index with %d documents', self.model.__tablename__, len(index.documents))
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self.index is not None and now - self.checked_at < FRESHNESS_CHECK_INTERVAL:
+            return
+        signature = tuple(self._current_signature())
+        if self.index is None or signature != self.signature:
+            self._load()
+        self.signature = signature
+        self.checked_at = now
+
+    def search(self, term, limit=None, prefix=False):
+        with self.lock:
+            self._ensure_fresh()
+            return self.index.search(term, limit, prefix)
+
+    def update(self, obj):
+        with self.lock:
+            if self.index is None:
+                return
+            self.index.add(obj.id, [getattr(obj, column.key) for column in self.columns])
+            self.signature = tuple(self._current_signature())
+
+    def remove(self, doc_id):
+        with self.lock:
+            if self.index is None:
+                return
+            self.index.remove(doc_id)
+            self.signature = tuple(self._current_signature())
+
+def _like_pattern(term, prefix):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%' if prefix else f'%{escaped}%'
+
+def _trigram_matches(model, columns, conditions, term, prefix=False):
+    """SELECT of the ids of matching rows; the ILIKE filters are served by the trigram GIN indexes"""
+    pattern = _like_pattern(term, prefix)
+    return select(model.id).where(*conditions, or_(*(column.ilike(pattern, escape='\\') for column in columns)))
+
+def _trigram_search(model, columns, conditions, term, limit, prefix):
+    """Rank rows by pg_trgm similarity"""
+    similarity = func.greatest(*(func.similarity(func.coalesce(column, ''), term) for column in columns))
+    return list(db.session.execute(
+        _trigram_matches(model, columns, conditions, term, prefix).order_by(similarity.desc(), model.id).limit(limit)
+    ).scalars())
+
+def _id_list(name, ids):
+    # Rendered inline, so a broad term is not held back by the database's bound parameter limit
+    return bindparam(name, ids, expanding=True, literal_execute=True)
+
+_student_index = LocalSearchIndex(User, STUDENT_COLUMNS, (User.role == 'student',), User.updated_at)
+_subject_index = LocalSearchIndex(Subject, SUBJECT_COLUMNS, (), Subject.id)
+_trigram_available = None
+
+def use_trigram_search():
+    """True on Postgres with the pg_trgm extension installed (see 'flask init-search')"""
+    global _trigram_available
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    if _trigram_available is None:
+        _trigram_available = db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _trigram_available
+
+def search_students(term, limit=None, prefix=False):
+    """Ids of students matching term by name, email or student ID, best first"""
+    if use_trigram_search():
+        return _trigram_search(User, STUDENT_COLUMNS, (User.role == 'student',), term, limit, prefix)
+    return _student_index.search(term, limit, prefix)
+
+def search_subjects(term, limit=None, prefix=False):
+    """Ids of subjects matching term by name or code, best first"""
+    if use_trigram_search():
+        return _trigram_search(Subject, SUBJECT_COLUMNS, (), term, limit, prefix)
+    return _subject_index.search(term, limit, prefix)
+
+def matching_student_ids(term):
+    """Every student matching term, as a subquery or id list for in_() in listing filters"""
+    if use_trigram_search():
+        return _trigram_matches(User, STUDENT_COLUMNS, (User.role == 'student',), term)
+    return _id_list('student_matches', _student_index.search(term))
+
+def matching_subject_ids(term):
+    """Every subject matching term, as a subquery or id list for in_() in listing filters"""
+    if use_trigram_search():
+        return _trigram_matches(Subject, SUBJECT_COLUMNS, (), term)
+    return _id_list('subject_matches', _subject_index.search(term))
+
+def student_changed(student):
+    if student.role == 'student' and not use_trigram_search():
+        _student_index.update(student)
+
+def student_removed(student_id):
+    if not use_trigram_search():
+        _student_index.remove(student_id)
+
+def subject_changed(subject):
+    if not use_trigram_search():
+        _subject_index.update(subject)
+
+def create_trigram_indexes():
+    """Install pg_trgm and the trigram GIN indexes backing search on Postgres"""
+    global _trigram_available
+    if db.engine.dialect.name != 'postgresql':
+        raise ValueError('trigram indexes need PostgreSQL; other databases use the in-process index')
+    db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    names = []
+    for column in STUDENT_COLUMNS + SUBJECT_COLUMNS:
+        name = f'ix_{column.table.name}_{column.key}_trgm'
+        db.session.execute(text(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {column.table.name} USING gin ({column.key} gin_trgm_ops)'
+        ))
+        names.append(name)
+    db.session.commit()
+    _trigram_available = True
+    return names
@@ -0,0 +1,149 @@
+from sqlalchemy import delete, event, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from cache import get_or_set, invalidate
+from models import Subject, Result, StudentSnapshot
+
+# Most recent results copied into a snapshot; the full history is in the transcript
+SNAPSHOT_RESULTS = 50
+RECENT_RESULTS = 5
+
+def _namespace(student_id):
+    return f'snapshot:{student_id}'
+
+# Students whose snapshots are built by one query
+SNAPSHOT_BATCH = 500
+
+def _snapshot_data(rows):
+    grade_counts = {}
+    for row in rows:
+        grade_counts[row.grade] = grade_counts.get(row.grade, 0) + 1
+    percentage_sum = sum(row.percentage for row in rows)
+
+    return {
+        'total_subjects': len({row.subject_id for row in rows}),
+        'total_exams': len(rows),
+        'avg_percentage': round(percentage_sum / len(rows), 2) if rows else 0,
+        'grade_distribution': grade_counts,
+        'results': [
+            {
+                'subject_name': row.name,
+                'subject_code': row.code,
+                'marks_obtained': row.marks_obtained,
+                'total_marks': row.total_marks,
+                'percentage': row.percentage,
+                'grade': row.grade,
+                'semester': row.semester,
+                'academic_year': row.academic_year,
+                'exam_type': row.exam_type,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows[:SNAPSHOT_RESULTS]
+        ],
+    }
+
+def build_snapshots(student_ids):
+    """{student id: dashboard summary and recent results}, with subject names denormalized"""
+    by_student = {student_id: [] for student_id in student_ids}
+    ids = list(by_student)
+    for start in range(0, len(ids), SNAPSHOT_BATCH):
+        batch = ids[start:start + SNAPSHOT_BATCH]
+        for row in db.session.execute(
+            select(Result.student_id, Result.subject_id, Subject.name, Subject.code, Result.marks_obtained,
+                   Result.total_marks, Result.percentage, Result.grade, Result.semester, Result.academic_year,
+                   Result.exam_type, Result.created_at)
+            .join(Subject, Result.subject_id == Subject.id)
+            .where(Result.student_id.in_(batch))
+            .order_by(Result.student_id, Result.created_at.desc(), Result.id.desc())
+        ):
+            by_student[row.student_id].append(row)
+    return {student_id: _snapshot_data(rows) for student_id, rows in by_student.items()}
+
+def build_snapshot(student_id):
+    """Dashboard summary and recent results of one student, with subject names denormalized"""
+    return build_snapshots([student_id])[student_id]
+
+def refresh_snapshot(student_id):
+    """Recompute and store a student's snapshot in the current transaction"""
+    return refresh_snapshots([student_id])[student_id]
+
+def refresh_snapshots(student_ids):
+    """Recompute and store the snapshots of many students in the current transaction"""
+    data = build_snapshots(student_ids)
+    ids = list(data)
+    stored = {}
+    for start in range(0, len(ids), SNAPSHOT_BATCH):
+        stored.update((snapshot.student_id, snapshot) for snapshot in db.session.execute(
+            select(StudentSnapshot).where(StudentSnapshot.student_id.in_(ids[start:start + SNAPSHOT_BATCH]))
+        ).scalars())
+    for student_id, snapshot_data in data.items():
+        snapshot = stored.get(student_id)
+        if snapshot is not None:
+            snapshot.data = snapshot_data
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(StudentSnapshot(student_id=student_id, data=snapshot_data))
+        except IntegrityError:
+            # Another writer stored it first; overwrite with what we computed
+            db.session.get(StudentSnapshot, student_id, populate_existing=True).data = snapshot_data
+    return data
+
+def _load_snapshot(student_id):
+    snapshot = db.session.get(StudentSnapshot, student_id)
+    if snapshot is not None:
+        return snapshot.data
+    # No row yet: the student has no results, or results that predate snapshots
+    # (backfilled by 'flask rebuild-stats'). Build it without writing on a read.
+    return build_snapshot(student_id)
+
+def rebuild_snapshots():
+    """Recompute every student's snapshot; the caller commits"""
+    db.session.execute(delete(StudentSnapshot))
+    student_ids = db.session.execute(select(Result.student_id).distinct()).scalars().all()
+    for student_id, data in build_snapshots(student_ids).items():
+        db.session.add(StudentSnapshot(student_id=student_id, data=data))
+    db.session.info.setdefault('changed_snapshots', set()).update(student_ids)
+    return len(student_ids)
+
+def get_snapshot(student_id):
+    """A student's dashboard snapshot, from the cache or its snapshot row"""
+    return get_or_set(_namespace(student_id), 'dashboard', lambda: _load_snapshot(student_id))
+
+def snapshot_stale(student_id):
+    """Refresh the student's snapshot when the current transaction commits"""
+    db.session.info.setdefault('stale_snapshots', set()).add(student_id)
+
+def snapshot_removed(student_id):
+    """Delete the snapshot of a student who is being deleted"""
+    snapshots_removed([student_id])
+
+def snapshots_removed(student_ids):
+    """Delete the snapshots of students who are being deleted, in one statement"""
+    db.session.info.setdefault('stale_snapshots', set()).difference_update(student_ids)
+    db.session.info.setdefault('changed_snapshots', set()).update(student_ids)
+    db.session.execute(delete(StudentSnapshot).where(StudentSnapshot.student_id.in_(student_ids)))
+
+# Savepoints (begin_nested) fire the commit events too; only the outer transaction counts
+
+@event.listens_for(db.session, 'before_commit')
+def _refresh_stale_snapshots(session):
+    if session.in_nested_transaction():
+        return
+    stale = session.info.pop('stale_snapshots', None)
+    if stale:
+        refresh_snapshots(stale)
+        session.info.setdefault('changed_snapshots', set()).update(stale)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_cached_snapshots(session):
+    if session.in_nested_transaction():
+        return
+    for student_id in session.info.pop('changed_snapshots', ()):
+        invalidate(_namespace(student_id))
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _forget_rolled_back_snapshots(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('stale_snapshots', None)
+        session.info.pop('changed_snapshots', None)
@@ -53,6 +53,9 @@ const defaultChartOptions = {
     }
 };
 
+// Dashboard chart instances, kept so live events can update them in place
+const dashboardCharts = {};
+
 // Initialize Dashboard Charts
 function initializeDashboardCharts() {
     // Load grade distribution chart
@@ -69,6 +72,7 @@ function initializeDashboardCharts() {
 function loadGradeDistributionChart() {
     const ctx = document.getElementById('gradeChart');
     if (!ctx) return;
+    if (dashboardCharts.grade) dashboardCharts.grade.destroy();
     
     fetch('/api/grade-distribution')
         .then(response => response.json())
@@ -90,7 +94,7 @@ function loadGradeDistributionChart() {
                 }
             });
             
-            new Chart(ctx, {
+            dashboardCharts.grade = new Chart(ctx, {
                 type: 'doughnut',
                 data: {
                     labels: filteredLabels,
@@ -135,14 +139,16 @@ function loadGradeDistributionChart() {
 function loadMonthlyResultsChart() {
     const ctx = document.getElementById('monthlyChart');
     if (!ctx) return;
+    if (dashboardCharts.monthly) dashboardCharts.monthly.destroy();
     
-    fetch('/api/monthly-results')
+    // Any window and granularity works: ?granularity=day|week|month|year&start=YYYY-MM-DD&end=YYYY-MM-DD
+    fetch('/api/results-timeseries?granularity=month')
         .then(response => response.json())
         .then(data => {
-            const labels = data.map(item => item.month);
+            const labels = data.map(item => item.label);
             const values = data.map(item => item.count);
             
-            new Chart(ctx, {
+            dashboardCharts.monthly = new Chart(ctx, {
                 type: 'line',
                 data: {
                     labels: labels,
@@ -433,6 +439,119 @@ function createClassComparisonChart(elementId, classData) {
     });
 }
 
+// Live dashboard updates over server-sent events
+function subscribeDashboardEvents() {
+    if (!window.EventSource || !document.getElementById('gradeChart')) return;
+    
+    const source = new EventSource('/api/events');
+    let reconnecting = false;
+    source.addEventListener('result', event => applyResultEvent(JSON.parse(event.data)));
+    // Changes too broad for a delta (re-grading, deleted students): reload everything
+    source.addEventListener('resync', () => location.reload());
+    source.onerror = () => { reconnecting = true; };
+    source.onopen = () => {
+        // Events sent while disconnected are lost; reload the aggregates once back online
+        if (reconnecting) location.reload();
+    };
+}
+
+function applyResultEvent(delta) {
+    // Stat cards: keep the count and recompute the average from its running sum
+    const totalElement = document.getElementById('statTotalResults');
+    const averageElement = document.getElementById('statAvgPercentage');
+    if (totalElement && averageElement) {
+        const oldTotal = parseInt(averageElement.dataset.total, 10) || 0;
+        const total = oldTotal + delta.count_delta;
+        const sum = (parseFloat(averageElement.dataset.average) || 0) * oldTotal + delta.percentage_delta;
+        const average = total > 0 ? sum / total : 0;
+        averageElement.dataset.total = total;
+        averageElement.dataset.average = average;
+        totalElement.textContent = total;
+        averageElement.textContent = `${average.toFixed(2)}%`;
+    }
+    
+    // Grade distribution doughnut
+    const gradeChart = dashboardCharts.grade;
+    if (gradeChart) {
+        const labels = gradeChart.data.labels;
+        const dataset = gradeChart.data.datasets[0];
+        Object.entries(delta.grade_delta).forEach(([grade, change]) => {
+            let index = labels.indexOf(grade);
+            if (index === -1) {
+                labels.push(grade);
+                dataset.data.push(0);
+                dataset.backgroundColor.push(gradeColors[grade] || '#6b7280');
+                index = labels.length - 1;
+            }
+            dataset.data[index] += change;
+            if (dataset.data[index] <= 0) {
+                labels.splice(index, 1);
+                dataset.data.splice(index, 1);
+                dataset.backgroundColor.splice(index, 1);
+            }
+        });
+        gradeChart.update();
+    }
+    
+    // Monthly line: new and imported results land in the current month, deletions in their own
+    const monthlyChart = dashboardCharts.monthly;
+    if (monthlyChart && delta.count_delta !== 0) {
+        const createdAt = delta.result && delta.result.created_at ? new Date(`${delta.result.created_at}Z`) : new Date();
+        const label = `${createdAt.toLocaleString('en-US', { month: 'short', timeZone: 'UTC' })} ${createdAt.getUTCFullYear()}`;
+        const index = monthlyChart.data.labels.indexOf(label);
+        if (index !== -1) {
+            monthlyChart.data.datasets[0].data[index] += delta.count_delta;
+            monthlyChart.update();
+        }
+    }
+    
+    if (delta.result) {
+        updateRecentResults(delta.kind, delta.result);
+    }
+}
+
+function updateRecentResults(kind, result) {
+    const list = document.getElementById('recentResults');
+    if (!list) return;
+    const existing = list.querySelector(`[data-result-id="${result.id}"]`);
+    
+    if (kind === 'deleted') {
+        if (existing) existing.remove();
+        return;
+    }
+    
+    const row = document.createElement('div');
+    row.className = 'flex items-center justify-between p-3 bg-gray-50 rounded-lg';
+    row.dataset.resultId = result.id;
+    row.innerHTML = `
+        <div>
+            <p class="font-medium text-gray-900"></p>
+            <p class="text-sm text-gray-600"></p>
+        </div>
+        <div class="text-right">
+            <span class="grade-badge"></span>
+            <p class="text-sm text-gray-600 mt-1"></p>
+        </div>
+    `;
+    const [name, subject, percentage] = row.querySelectorAll('p');
+    name.textContent = result.student_name;
+    subject.textContent = result.subject_name;
+    percentage.textContent = `${result.percentage.toFixed(1)}%`;
+    const badge = row.querySelector('.grade-badge');
+    badge.textContent = result.grade;
+    badge.classList.add(`grade-${(result.grade || '').toLowerCase().replace('+', '-plus')}`);
+    
+    if (existing) {
+        existing.replaceWith(row);
+    } else if (kind === 'added') {
+        const empty = list.querySelector('[data-empty]');
+        if (empty) empty.remove();
+        list.prepend(row);
+        const limit = parseInt(list.dataset.limit, 10) || 5;
+        while (list.children.length > limit) list.lastElementChild.remove();
+    }
+}
+
 // Error handling for charts
 function showChartError(ctx, message) {
     const container = ctx.parentElement;
@@ -511,6 +630,7 @@ function initializeResponsiveCharts() {
 // Export functions for global use
 window.Charts = {
     initializeDashboardCharts,
+    subscribeDashboardEvents,
     createSubjectPerformanceChart,
     createStudentProgressChart,
     createClassComparisonChart,
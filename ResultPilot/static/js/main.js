@@ -341,6 +341,66 @@ function initializeSearch() {
 // Initialize search on page load
 document.addEventListener('DOMContentLoaded', initializeSearch);
 
+// Typeahead: a text input that searches a JSON endpoint returning [{id, label}]
+// and stores the chosen id in a hidden input
+function initializeTypeahead() {
+    document.querySelectorAll('[data-typeahead]').forEach(container => {
+        const input = container.querySelector('[data-typeahead-input]');
+        const value = container.querySelector('[data-typeahead-value]');
+        const results = container.querySelector('[data-typeahead-results]');
+        let request = 0;
+
+        const choose = (item) => {
+            value.value = item.id;
+            input.value = item.label;
+            results.classList.add('hidden');
+        };
+
+        const search = debounce(() => {
+            const term = input.value.trim();
+            const current = ++request;
+            if (!term) {
+                results.classList.add('hidden');
+                return;
+            }
+            fetch(`${container.dataset.typeahead}?q=${encodeURIComponent(term)}&limit=10`)
+                .then(response => response.json())
+                .then(items => {
+                    // Ignore answers to searches the user has already typed past
+                    if (current !== request) return;
+                    results.innerHTML = '';
+                    if (!items.length) {
+                        const empty = document.createElement('li');
+                        empty.className = 'px-3 py-2 text-sm text-gray-500';
+                        empty.textContent = 'No matches';
+                        results.appendChild(empty);
+                    }
+                    items.forEach(item => {
+                        const option = document.createElement('li');
+                        option.className = 'px-3 py-2 text-sm text-gray-900 cursor-pointer hover:bg-blue-50';
+                        option.textContent = item.label;
+                        option.addEventListener('mousedown', (e) => {
+                            e.preventDefault();
+                            choose(item);
+                        });
+                        results.appendChild(option);
+                    });
+                    results.classList.remove('hidden');
+                })
+                .catch(() => results.classList.add('hidden'));
+        }, 200);
+
+        input.addEventListener('input', () => {
+            // Typing invalidates the previous choice until a new one is picked
+            value.value = '';
+            search();
+        });
+        input.addEventListener('blur', () => results.classList.add('hidden'));
+    });
+}
+
+document.addEventListener('DOMContentLoaded', initializeTypeahead);
+
 // Table Enhancement
 function initializeTableFeatures() {
     // Add row hover effects
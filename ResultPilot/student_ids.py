@@ -0,0 +1,87 @@
+from datetime import datetime
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from app import db
+from models import User, StudentIdCounter
+
+STUDENT_ID_PREFIX = 'STU'
+# Candidate IDs checked against existing students per query
+CHECK_BATCH = 500
+
+# Per-year sequences this process has already created (Postgres)
+_sequences = set()
+
+def format_student_id(year, number):
+    return f'{STUDENT_ID_PREFIX}{year}{number:04d}'
+
+def _highest_issued(year):
+    """Largest number in an existing STU<year> ID, so allocation continues after IDs issued before it"""
+    prefix = f'{STUDENT_ID_PREFIX}{year}'
+    numbers = [
+        int(student_id[len(prefix):])
+        for student_id in db.session.execute(
+            select(User.student_id).where(User.student_id.startswith(prefix))
+        ).scalars()
+        if student_id[len(prefix):].isdigit()
+    ]
+    return max(numbers, default=0)
+
+def _reserve_from_sequence(year, count):
+    # Sequences hand out numbers without locking; numbers of rolled back transactions are skipped
+    name = f'student_id_seq_{int(year)}'
+    if name not in _sequences:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(text(f'CREATE SEQUENCE IF NOT EXISTS {name} START WITH {_highest_issued(year) + 1}'))
+        except (IntegrityError, ProgrammingError):
+            # Created concurrently by another transaction
+            pass
+        _sequences.add(name)
+    return list(db.session.execute(
+        text(f"SELECT nextval('{name}') FROM generate_series(1, :count)"), {'count': count}
+    ).scalars())
+
+def _reserve_from_counter(year, count):
+    # The UPDATE locks the year's row (the whole database on SQLite) until the caller's
+    # transaction ends, so concurrent callers queue behind it and never read the same value
+    table = StudentIdCounter.__table__
+    updated = db.session.execute(
+        update(table).where(table.c.year == year).values(next_value=table.c.next_value + count)
+    ).rowcount
+    if updated:
+        end = db.session.execute(select(table.c.next_value).where(table.c.year == year)).scalar()
+        return list(range(end - count, end))
+
+    start = _highest_issued(year) + 1
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(year=year, next_value=start + count))
+    except IntegrityError:
+        # Another transaction created the year's counter first
+        return _reserve_from_counter(year, count)
+    return list(range(start, start + count))
+
+def allocate_student_ids(count=1, year=None):
+    """count new student IDs for year (default: the current one), unique among concurrent callers.
+
+    Postgres draws numbers from a per-year sequence; other databases from a
+    per-year counter row locked until the caller commits. Either starts after the
+    highest ID already issued that year, and IDs entered by hand are skipped. Call
+    in the transaction that stores the students.
+    """
+    year = year or datetime.now().year
+    reserve = _reserve_from_sequence if db.engine.dialect.name == 'postgresql' else _reserve_from_counter
+    student_ids = []
+    while len(student_ids) < count:
+        candidates = [format_student_id(year, number) for number in reserve(year, count - len(student_ids))]
+        taken = set()
+        for start in range(0, len(candidates), CHECK_BATCH):
+            taken.update(db.session.execute(
+                select(User.student_id).where(User.student_id.in_(candidates[start:start + CHECK_BATCH]))
+            ).scalars())
+        student_ids.extend(candidate for candidate in candidates if candidate not in taken)
+    return student_ids
+
+def next_student_id(year=None):
+    """One new student ID; see allocate_student_ids"""
+    return allocate_student_ids(1, year)[0]
@@ -0,0 +1,179 @@
+import random
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import insert, select
+from app import db
+from analytics import rebuild_stats
+from auth import hash_password
+from choices import students_changed, subjects_changed
+from grading import grade_schemes
+from models import User, Subject, Result, Semester
+from pagination import invalidate_counts
+
+# Every synthetic student logs in with this password
+SYNTHETIC_PASSWORD = 'student123'
+
+FIRST_NAMES = [
+    'Aarav', 'Aisha', 'Amara', 'Ben', 'Carlos', 'Chen', 'Chloe', 'Daniel', 'Elena', 'Fatima',
+    'Grace', 'Hana', 'Ibrahim', 'Isla', 'James', 'Jin', 'Kofi', 'Lena', 'Liam', 'Lucia',
+    'Maya', 'Mateo', 'Noah', 'Nia', 'Omar', 'Priya', 'Rahul', 'Sara', 'Tariq', 'Yuki',
+]
+LAST_NAMES = [
+    'Adeyemi', 'Ahmed', 'Brown', 'Chen', 'Costa', 'Dubois', 'Garcia', 'Gupta', 'Hassan', 'Ito',
+    'Johnson', 'Khan', 'Kim', 'Kowalski', 'Lee', 'Mensah', 'Miller', 'Nguyen', 'Novak', 'Okafor',
+    'Patel', 'Rossi', 'Santos', 'Schmidt', 'Silva', 'Singh', 'Smith', 'Tanaka', 'Wang', 'Williams',
+]
+SUBJECT_AREAS = [
+    ('Mathematics', 'MTH'), ('Physics', 'PHY'), ('Chemistry', 'CHM'), ('Biology', 'BIO'),
+    ('Computer Science', 'CSC'), ('English', 'ENG'), ('History', 'HIS'), ('Economics', 'ECO'),
+    ('Statistics', 'STA'), ('Philosophy', 'PHL'), ('Psychology', 'PSY'), ('Geography', 'GEO'),
+]
+# (term, first month, last month) of the two terms in a calendar year
+TERMS = [('Spring', 1, 5), ('Fall', 8, 11)]
+
+def semester_calendar(count, today=None):
+    """The last count terms as (name, academic year, start, end), oldest first, ending with the current one"""
+    today = today or date.today()
+    year, term = today.year, 0 if today.month < 8 else 1
+    semesters = []
+    for _ in range(count):
+        name, first_month, last_month = TERMS[term]
+        end = date(year, last_month + 1, 1) - timedelta(days=1)
+        semesters.append((f'{name} {year}', str(year), date(year, first_month, 1), end))
+        year, term = (year, 0) if term == 1 else (year - 1, 1)
+    return list(reversed(semesters))
+
+def _weighted_sample(rng, items, weights, k):
+    # Weighted sampling without replacement (Efraimidis-Spirakis keys)
+    keyed = sorted(items, key=lambda item: rng.random() ** (1.0 / weights[item]), reverse=True)
+    return keyed[:k]
+
+def _ensure_subjects(rng, count, now):
+    """Reuse or create count subjects cycling through SUBJECT_AREAS; returns ({id: difficulty}, created)"""
+    wanted = []
+    for i in range(count):
+        area, abbreviation = SUBJECT_AREAS[i % len(SUBJECT_AREAS)]
+        level = 101 + (i // len(SUBJECT_AREAS)) * 100
+        wanted.append((f'{area} {level}', f'{abbreviation}{level}'))
+    existing = dict(db.session.execute(
+        select(Subject.code, Subject.id).where(Subject.code.in_([code for _, code in wanted]))
+    ).all())
+    missing = [(name, code) for name, code in wanted if code not in existing]
+    if missing:
+        db.session.execute(insert(Subject), [
+            {'name': name, 'code': code, 'credits': rng.choice((2, 3, 3, 3, 4, 4, 5)),
+             'description': f'Synthetic course {code}', 'created_at': now}
+            for name, code in missing
+        ])
+        existing.update(db.session.execute(
+            select(Subject.code, Subject.id).where(Subject.code.in_([code for _, code in missing]))
+        ).all())
+    # Higher levels are harder; every course also gets its own offset
+    difficulty = {existing[code]: rng.gauss(0, 4) - 2 * (int(code[3:]) // 100 - 1) for _, code in wanted}
+    return difficulty, len(missing)
+
+def _ensure_semesters(calendar, now):
+    existing = set(db.session.execute(select(Semester.name)).scalars())
+    has_active = db.session.execute(select(Semester.id).where(Semester.is_active)).first() is not None
+    rows = [
+        {'name': name, 'start_date': start, 'end_date': end, 'created_at': now,
+         'is_active': not has_active and index == len(calendar) - 1}
+        for index, (name, _, start, end) in enumerate(calendar) if name not in existing
+    ]
+    if rows:
+        db.session.execute(insert(Semester), rows)
+    return len(rows)
+
+def _exam_time(rng, start, end, exam_type):
+    # Mid-terms fall mid-semester, finals in its last two weeks
+    if exam_type == 'Final':
+        day = end - timedelta(days=rng.randint(0, 13))
+    else:
+        day = start + (end - start) / 2 + timedelta(days=rng.randint(-10, 10))
+    return datetime.combine(day, time(rng.randint(8, 17), rng.randint(0, 59)))
+
+def seed_synthetic(students=1000, subjects=40, semesters=4, courses_per_semester=5, midterm_share=0.6,
+                   prefix='synth', seed=42, batch_size=5000):
+    """Fill the database with realistic synthetic students, subjects, semesters and results.
+
+    Each student has a latent ability; each subject a difficulty. Students join in
+    staggered cohorts, take courses_per_semester subjects per term (popular subjects
+    more often) with a final and, for midterm_share of them, a mid-term. Marks are
+    normally distributed around ability and difficulty, with a small tail of failed
+    or missed exams. Rows are written with bulk INSERTs in batches of batch_size, then
+    the summary tables and snapshots are rebuilt. Returns counts of the rows created.
+    """
+    if students < 1 or subjects < 1 or semesters < 1:
+        raise ValueError('students, subjects and semesters must be at least 1')
+    if db.session.execute(select(User.id).where(User.username == f'{prefix}_0')).first() is not None:
+        raise ValueError(f'synthetic students with prefix {prefix!r} already exist; choose another --prefix')
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    calendar = semester_calendar(semesters)
+    difficulty, created_subjects = _ensure_subjects(rng, subjects, now)
+    subject_ids = list(difficulty)
+    popularity = {subject_id: rng.paretovariate(1.5) for subject_id in subject_ids}
+    created_semesters = _ensure_semesters(calendar, now)
+
+    # Cohorts: most students have been enrolled since the first term, later terms add fewer
+    cohorts = [rng.choices(range(semesters), weights=[semesters - i for i in range(semesters)])[0]
+               for _ in range(students)]
+    password_hash = hash_password(SYNTHETIC_PASSWORD)
+    for offset in range(0, students, batch_size):
+        db.session.execute(insert(User), [
+            {'username': f'{prefix}_{i}', 'email': f'{prefix}_{i}@example.com', 'password_hash': password_hash,
+             'role': 'student', 'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+             'student_id': f'{prefix.upper()[:8]}{i:07d}',
+             'created_at': datetime.combine(calendar[cohorts[i]][2], time(9)), 'updated_at': now}
+            for i in range(offset, min(offset + batch_size, students))
+        ])
+    student_ids = dict(db.session.execute(
+        select(User.username, User.id).where(User.username.like(f'{prefix}_%'), User.role == 'student')
+    ).all())
+
+    schemes = grade_schemes()
+    courses = min(courses_per_semester, len(subject_ids))
+    batch, results = [], 0
+    for i in range(students):
+        student_id = student_ids[f'{prefix}_{i}']
+        ability = rng.gauss(0, 1)
+        for term in range(cohorts[i], semesters):
+            name, year, start, end = calendar[term]
+            # Students improve slightly with every term they have studied
+            growth = 1.5 * (term - cohorts[i])
+            for subject_id in _weighted_sample(rng, subject_ids, popularity, courses):
+                exams = ['Final', 'Mid-term'] if rng.random() < midterm_share else ['Final']
+                for exam_type in exams:
+                    taken_at = _exam_time(rng, start, end, exam_type)
+                    if taken_at > now:
+                        # The current term's later exams have not been sat yet
+                        continue
+                    total = 100.0 if exam_type == 'Final' else 50.0
+                    if rng.random() < 0.015:
+                        percentage = rng.uniform(0, 25)
+                    else:
+                        percentage = rng.gauss(68 + 10 * ability + difficulty[subject_id] + growth,
+                                               8 if exam_type == 'Final' else 11)
+                    marks = round(min(max(percentage, 0.0), 100.0) * total / 100 * 2) / 2
+                    batch.append({
+                        'student_id': student_id, 'subject_id': subject_id,
+                        'marks_obtained': marks, 'total_marks': total,
+                        'grade': schemes.grade(marks * 100.0 / total, subject_id, year),
+                        'semester': name, 'academic_year': year, 'exam_type': exam_type,
+                        'created_at': taken_at, 'updated_at': now,
+                    })
+        if len(batch) >= batch_size:
+            db.session.execute(insert(Result), batch)
+            results += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Result), batch)
+        results += len(batch)
+    db.session.commit()
+
+    rebuild_stats()
+    invalidate_counts('students')
+    invalidate_counts('results')
+    students_changed()
+    subjects_changed()
+    return {'students': students, 'subjects': created_subjects, 'semesters': created_semesters, 'results': results}
@@ -0,0 +1,76 @@
+"""Request every view with a query_budget against a small seeded database.
+
+With TESTING set the instrumentation raises AssertionError when a view issues
+more SQL statements than its budget, which fails the request here.
+"""
+import os
+import sys
+
+import pytest
+from flask import url_for
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# View endpoint -> whose session requests it
+BUDGETED_VIEWS = {
+    'admin_dashboard': 'admin',
+    'admin_results': 'admin',
+    'student_dashboard': 'student',
+}
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'budgets.db')
+    os.environ.setdefault('SESSION_SECRET', 'test')
+    os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    sys.path.insert(0, APP_DIR)
+    import main
+    from schema import init_db, seed_admin
+    main.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with main.app.app_context():
+        init_db()
+        seed_admin()
+    return main.app
+
+def login(client, email, password):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302
+
+@pytest.fixture(scope='module')
+def clients(app):
+    from models import User, Subject
+    admin = app.test_client()
+    login(admin, 'admin@example.com', 'admin123')
+    for i in range(3):
+        admin.post('/admin/students/add', data={'username': f'student{i}', 'email': f'student{i}@example.com',
+                                                'first_name': 'Student', 'last_name': str(i)})
+    for i in range(2):
+        admin.post('/admin/subjects/add', data={'name': f'Subject {i}', 'code': f'SUB{i}', 'credits': 3})
+    with app.app_context():
+        student_ids = [user.id for user in User.query.filter_by(role='student')]
+        subject_ids = [subject.id for subject in Subject.query]
+    for n, student_id in enumerate(student_ids):
+        for m, subject_id in enumerate(subject_ids):
+            admin.post('/admin/results/add', data={
+                'student_id': student_id, 'subject_id': subject_id, 'marks_obtained': 50 + 10 * n + 5 * m,
+                'total_marks': 100, 'semester': 'Fall 2025', 'academic_year': '2025-2026', 'exam_type': 'Final',
+            })
+    student = app.test_client()
+    login(student, 'student0@example.com', 'student123')
+    return {'admin': admin, 'student': student}
+
+def test_every_budgeted_view_is_covered(app):
+    budgeted = {endpoint for endpoint, view in app.view_functions.items() if hasattr(view, 'query_budget')}
+    assert budgeted == set(BUDGETED_VIEWS)
+
+def test_seeded_rows(app, clients):
+    from models import Result
+    with app.app_context():
+        assert Result.query.count() == 6
+
+@pytest.mark.parametrize('endpoint', sorted(BUDGETED_VIEWS))
+def test_view_within_budget(app, clients, endpoint):
+    with app.test_request_context():
+        url = url_for(endpoint)
+    response = clients[BUDGETED_VIEWS[endpoint]].get(url)
+    assert response.status_code == 200
@@ -1,8 +1,17 @@
 from functools import wraps
-from flask import abort
+from flask import abort, request
 from flask_login import current_user
-from sqlalchemy import func
-from models import User, Subject, Result
+from sqlalchemy import func, and_
+from app import db
+from models import User, Subject, Result, load_profile
+from analytics import get_summary_totals
+from pagination import keyset_paginate
+from search import matching_student_ids, matching_subject_ids
+from cache import cached
+from replicas import replica_reads
+from ranking import top_performers
+from grading import grade_schemes
+from columnar import DIMENSIONS as SNAPSHOT_DIMENSIONS, DEFAULT_PASS_MARK
 
 def admin_required(f):
     @wraps(f)
@@ -12,74 +21,197 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+@replica_reads
+@cached('reports')
 def get_dashboard_stats():
     """Get dashboard statistics for admin"""
     total_students = User.query.filter_by(role='student').count()
     total_subjects = Subject.query.count()
-    total_results = Result.query.count()
     
-    # Average performance
-    avg_percentage = Result.query.with_entities(
-        func.avg(Result.marks_obtained / Result.total_marks * 100)
-    ).scalar() or 0
+    # Totals and average performance from the maintained summary tables
+    total_results, avg_percentage = get_summary_totals()
     
     # Recent results
-    recent_results = Result.query.order_by(Result.created_at.desc()).limit(5).all()
-    
-    # Top performers
-    top_performers = User.query.join(Result).group_by(User.id).order_by(
-        func.avg(Result.marks_obtained / Result.total_marks * 100).desc()
+    recent_results = Result.query.options(*load_profile('with_student_and_subject')).order_by(
+        Result.created_at.desc()
     ).limit(5).all()
     
+    # Top performers by average percentage from the indexed summary table, with their CGPA
+    rankings = top_performers(5)
+    students = {
+        student.id: student
+        for student in User.query.filter(User.id.in_([entry['student_id'] for entry in rankings])).all()
+    }
+    
     return {
         'total_students': total_students,
         'total_subjects': total_subjects,
         'total_results': total_results,
         'avg_percentage': round(avg_percentage, 2),
-        'recent_results': recent_results,
-        'top_performers': top_performers
+        'recent_results': [serialize_result(result) for result in recent_results],
+        'top_performers': [
+            dict(serialize_student(students[entry['student_id']]), avg_percentage=entry['avg_percentage'],
+                 cgpa=entry['cgpa'], rank=entry['rank'])
+            for entry in rankings if entry['student_id'] in students
+        ]
+    }
+
+def result_filters(semester=None, academic_year=None, exam_type=None):
+    """Build filter conditions on Result for the optional report filters"""
+    conditions = []
+    if semester:
+        conditions.append(Result.semester == semester)
+    if academic_year:
+        conditions.append(Result.academic_year == academic_year)
+    if exam_type:
+        conditions.append(Result.exam_type == exam_type)
+    return conditions
+
+def student_search_conditions(search=''):
+    """Filter conditions for the admin students search box"""
+    conditions = [User.role == 'student']
+    if search:
+        conditions.append(User.id.in_(matching_student_ids(search)))
+    return conditions
+
+@replica_reads
+def student_listing_page(search='', per_page=10):
+    """Students ordered by last name, paginated by the after/before cursors in the query string"""
+    query = User.query.filter(*student_search_conditions(search))
+    return keyset_paginate(
+        query, [User.last_name, User.id], per_page,
+        after=request.args.get('after'), before=request.args.get('before'),
+        count_key=('students', search)
+    )
+
+@replica_reads
+def result_listing_page(search='', semester='', per_page=15):
+    """Results newest first, paginated by the after/before cursors in the query string"""
+    query = Result.query.join(User).join(Subject).filter(
+        *result_search_conditions(search, semester)
+    ).options(*load_profile('joined_listing'))
+    return keyset_paginate(
+        query, [Result.created_at, Result.id], per_page,
+        after=request.args.get('after'), before=request.args.get('before'),
+        descending=True, count_key=('results', search, semester)
+    )
+
+def page_to_dict(page, items):
+    """JSON body for a keyset page of already serialized items"""
+    return {
+        'items': items,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'total': page.total,
+    }
+
+def serialize_student(student):
+    return {
+        'id': student.id,
+        'student_id': student.student_id,
+        'username': student.username,
+        'full_name': student.full_name,
+        'first_name': student.first_name,
+        'last_name': student.last_name,
+        'email': student.email,
+        'phone': student.phone,
+        'created_at': student.created_at.isoformat() if student.created_at else None,
+    }
+
+def serialize_result(result):
+    return {
+        'id': result.id,
+        'student': {'id': result.student.id, 'full_name': result.student.full_name,
+                    'student_id': result.student.student_id},
+        'subject': {'id': result.subject.id, 'name': result.subject.name, 'code': result.subject.code},
+        'marks_obtained': result.marks_obtained,
+        'total_marks': result.total_marks,
+        'percentage': round(result.percentage, 2),
+        'grade': result.grade,
+        'semester': result.semester,
+        'academic_year': result.academic_year,
+        'exam_type': result.exam_type,
+        'created_at': result.created_at.isoformat() if result.created_at else None,
+    }
+
+def result_search_conditions(search='', semester=''):
+    """Filter conditions for the admin results search box and semester filter"""
+    conditions = []
+    if search:
+        conditions.append(
+            Result.student_id.in_(matching_student_ids(search)) |
+            Result.subject_id.in_(matching_subject_ids(search))
+        )
+    if semester:
+        conditions.append(Result.semester == semester)
+    return conditions
+
+def report_filters():
+    """Read the optional report filters from the query string"""
+    return {
+        'semester': request.args.get('semester', ''),
+        'academic_year': request.args.get('academic_year', ''),
+        'exam_type': request.args.get('exam_type', ''),
     }
 
-def get_grade_distribution():
+def snapshot_query():
+    """Filters ({dimension: [values]}, each repeatable in the query string) and pass mark of an analytics API call"""
+    filters = {dimension: request.args.getlist(dimension) for dimension in SNAPSHOT_DIMENSIONS
+               if request.args.getlist(dimension)}
+    return filters, request.args.get('pass_mark', DEFAULT_PASS_MARK, type=int)
+
+@replica_reads
+def aggregate_results(group_column, all_subjects=False, **filters):
+    """Count and average percentage of results per value of group_column in one query.
+
+    With all_subjects, the query starts from subjects and outer joins the
+    filtered results, so subjects without results come back with a zero count.
+    """
+    conditions = result_filters(**filters)
+    query = db.session.query(
+        group_column,
+        func.count(Result.id),
+        func.avg(Result.percentage)
+    )
+    if all_subjects:
+        query = query.select_from(Subject).outerjoin(
+            Result, and_(Result.subject_id == Subject.id, *conditions)
+        )
+    else:
+        query = query.filter(*conditions)
+    return {
+        key: (count, avg_percentage or 0)
+        for key, count, avg_percentage in query.group_by(group_column).all()
+    }
+
+def get_grade_distribution(**filters):
     """Get grade distribution for charts"""
-    grades = ['A+', 'A', 'B+', 'B', 'C+', 'C', 'F']
-    distribution = {}
-    
-    for grade in grades:
-        count = Result.query.filter_by(grade=grade).count()
-        distribution[grade] = count
-    
-    return distribution
+    counts = aggregate_results(Result.grade, **filters)
+    return {grade: counts.get(grade, (0, 0))[0] for grade in grade_schemes().grade_letters()}
 
-def get_subject_performance():
+def get_subject_performance(**filters):
     """Get average performance by subject"""
-    subjects = Subject.query.all()
-    performance = {}
-    
-    for subject in subjects:
-        avg_marks = Result.query.filter_by(subject_id=subject.id).with_entities(
-            func.avg(Result.marks_obtained / Result.total_marks * 100)
-        ).scalar() or 0
-        performance[subject.name] = round(avg_marks, 2)
-    
-    return performance
+    averages = aggregate_results(Subject.name, all_subjects=True, **filters)
+    return {name: round(avg_percentage, 2) for name, (count, avg_percentage) in averages.items()}
 
 def calculate_gpa(results):
     """Calculate GPA based on results"""
     if not results:
         return 0.0
     
-    grade_points = {
-        'A+': 4.0, 'A': 3.7, 'B+': 3.3, 'B': 3.0,
-        'C+': 2.7, 'C': 2.3, 'F': 0.0
-    }
+    # Fetch credits for all subjects at once instead of lazy loading result.subject per row
+    subject_ids = {result.subject_id for result in results}
+    subject_credits = dict(
+        db.session.query(Subject.id, Subject.credits).filter(Subject.id.in_(subject_ids)).all()
+    )
     
+    schemes = grade_schemes()
     total_points = 0
     total_credits = 0
     
     for result in results:
-        points = grade_points.get(result.grade, 0.0)
-        credits = result.subject.credits
+        points = schemes.points(result.grade, result.subject_id, result.academic_year)
+        credits = subject_credits.get(result.subject_id) or 0
         total_points += points * credits
         total_credits += credits
     